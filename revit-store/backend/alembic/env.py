@@ -15,7 +15,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 # Імпортуємо Base та всі моделі
 from app.database import Base
-from app.models import user, product, order, subscription
+from app.models import user, product, order, subscription, broadcast, media, stats
 
 # this is the Alembic Config object
 config = context.config
@@ -0,0 +1,55 @@
+"""Add product search vectors
+
+Revision ID: 4f1c2a9e7b31
+Revises: '735aef9e011c'
+Create Date: 2026-10-17 09:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9e7b31'
+down_revision = '735aef9e011c'
+branch_labels = None
+depends_on = None
+
+
+# Мова -> конфігурація full-text search (як у SearchService.SEARCH_CONFIGS)
+LANGUAGES = {'en': 'english', 'ua': 'simple', 'ru': 'russian'}
+
+
+def _vector_sql(language: str, config: str) -> str:
+    return (
+        f"setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(title->>'{language}', title->>'en', '')), 'A') || "
+        f"setweight(to_tsvector('{config}', coalesce(description->>'{language}', description->>'en', '')), 'B')"
+    )
+
+
+def upgrade() -> None:
+    for language in LANGUAGES:
+        op.add_column('products', sa.Column(f'search_vector_{language}', postgresql.TSVECTOR(), nullable=True))
+
+    # Заповнюємо вектори для вже існуючих товарів
+    assignments = ", ".join(
+        f"search_vector_{language} = {_vector_sql(language, config)}"
+        for language, config in LANGUAGES.items()
+    )
+    op.execute(f"UPDATE products SET {assignments}")
+
+    for language in LANGUAGES:
+        op.create_index(
+            f'ix_products_search_vector_{language}',
+            'products',
+            [f'search_vector_{language}'],
+            postgresql_using='gin'
+        )
+
+
+def downgrade() -> None:
+    for language in LANGUAGES:
+        op.drop_index(f'ix_products_search_vector_{language}', table_name='products')
+        op.drop_column('products', f'search_vector_{language}')
@@ -0,0 +1,59 @@
+"""Normalize product tags
+
+Revision ID: 8d2e5b7c1a40
+Revises: '4f1c2a9e7b31'
+Create Date: 2026-10-17 09:30:00.000000+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e5b7c1a40'
+down_revision = '4f1c2a9e7b31'
+branch_labels = None
+depends_on = None
+
+
+# Теги з JSON-поля products.tags (ігноруємо не-масиви та порожні значення)
+PRODUCT_TAGS_SQL = """
+    SELECT p.id AS product_id, trim(t.value) AS tag, left(lower(trim(t.value)), 50) AS slug
+    FROM products p
+    CROSS JOIN LATERAL json_array_elements_text(
+        CASE WHEN json_typeof(p.tags) = 'array' THEN p.tags ELSE '[]'::json END
+    ) AS t(value)
+    WHERE trim(t.value) <> ''
+"""
+
+
+def upgrade() -> None:
+    # Прибираємо дублікати та неповні зв'язки перед створенням первинного ключа
+    op.execute("DELETE FROM product_tags WHERE product_id IS NULL OR tag_id IS NULL")
+    op.execute("""
+        DELETE FROM product_tags a
+        USING product_tags b
+        WHERE a.ctid < b.ctid AND a.product_id = b.product_id AND a.tag_id = b.tag_id
+    """)
+    op.create_primary_key('product_tags_pkey', 'product_tags', ['product_id', 'tag_id'])
+    op.create_index('ix_product_tags_tag_id', 'product_tags', ['tag_id'])
+
+    # Переносимо теги з JSON у таблиці tags / product_tags
+    op.execute(f"""
+        INSERT INTO tags (name, slug, created_at)
+        SELECT DISTINCT ON (slug) json_build_object('en', tag), slug, now()
+        FROM ({PRODUCT_TAGS_SQL}) src
+        ORDER BY slug, tag
+        ON CONFLICT (slug) DO NOTHING
+    """)
+    op.execute(f"""
+        INSERT INTO product_tags (product_id, tag_id)
+        SELECT DISTINCT src.product_id, tags.id
+        FROM ({PRODUCT_TAGS_SQL}) src
+        JOIN tags ON tags.slug = src.slug
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_tags_tag_id', table_name='product_tags')
+    op.drop_constraint('product_tags_pkey', 'product_tags', type_='primary')
@@ -0,0 +1,46 @@
+"""Add broadcast jobs
+
+Revision ID: b3e8f1d64c27
+Revises: '8d2e5b7c1a40'
+Create Date: 2026-10-17 10:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f1d64c27'
+down_revision = '8d2e5b7c1a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'broadcast_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_by_id', sa.Integer(), nullable=True),
+        sa.Column('target', sa.String(length=50), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('parse_mode', sa.String(length=20), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('sent', sa.Integer(), nullable=True),
+        sa.Column('failed', sa.Integer(), nullable=True),
+        sa.Column('retries', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_broadcast_jobs_id', 'broadcast_jobs', ['id'])
+    op.create_index('ix_broadcast_jobs_status', 'broadcast_jobs', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_broadcast_jobs_status', table_name='broadcast_jobs')
+    op.drop_index('ix_broadcast_jobs_id', table_name='broadcast_jobs')
+    op.drop_table('broadcast_jobs')
@@ -0,0 +1,51 @@
+"""Add media blobs
+
+Revision ID: c71a9e2f5d08
+Revises: 'b3e8f1d64c27'
+Create Date: 2026-10-17 10:30:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71a9e2f5d08'
+down_revision = 'b3e8f1d64c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'media_blobs',
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('path')
+    )
+    op.create_index('ix_media_blobs_sha256', 'media_blobs', ['sha256'])
+
+    # Початкові лічильники посилань з існуючих товарів
+    op.execute("""
+        INSERT INTO media_blobs (path, ref_count, created_at, updated_at)
+        SELECT path, count(*), now(), now()
+        FROM (
+            SELECT file_url AS path FROM products WHERE file_url IS NOT NULL AND file_url <> ''
+            UNION ALL
+            SELECT img.value
+            FROM products p
+            CROSS JOIN LATERAL json_array_elements_text(
+                CASE WHEN json_typeof(p.preview_images) = 'array' THEN p.preview_images ELSE '[]'::json END
+            ) AS img(value)
+        ) refs
+        GROUP BY path
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_media_blobs_sha256', table_name='media_blobs')
+    op.drop_table('media_blobs')
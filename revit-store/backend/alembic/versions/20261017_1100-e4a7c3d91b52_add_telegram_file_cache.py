@@ -0,0 +1,40 @@
+"""Add telegram file cache
+
+Revision ID: e4a7c3d91b52
+Revises: 'c71a9e2f5d08'
+Create Date: 2026-10-17 11:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c3d91b52'
+down_revision = 'c71a9e2f5d08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'telegram_file_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('file_id', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('product_id', 'kind', name='uq_telegram_file_cache_product_kind')
+    )
+    op.create_index('ix_telegram_file_cache_id', 'telegram_file_cache', ['id'])
+    op.create_index('ix_telegram_file_cache_path', 'telegram_file_cache', ['path'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_telegram_file_cache_path', table_name='telegram_file_cache')
+    op.drop_index('ix_telegram_file_cache_id', table_name='telegram_file_cache')
+    op.drop_table('telegram_file_cache')
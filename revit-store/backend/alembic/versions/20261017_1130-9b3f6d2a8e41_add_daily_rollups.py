@@ -0,0 +1,60 @@
+"""Add daily rollups
+
+Revision ID: 9b3f6d2a8e41
+Revises: 'e4a7c3d91b52'
+Create Date: 2026-10-17 11:30:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3f6d2a8e41'
+down_revision = 'e4a7c3d91b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_stats',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('orders_created', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('orders_completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('new_users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active_users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('subscriptions_paid', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('subscription_revenue', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('date')
+    )
+
+    op.create_table(
+        'daily_product_sales',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('sales', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('date', 'product_id')
+    )
+    op.create_index('ix_daily_product_sales_product_id', 'daily_product_sales', ['product_id'])
+
+    op.create_table(
+        'daily_active_users',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('date', 'user_id')
+    )
+
+    # Історію заповнює backfill_rollups.py (перерахунок з orders / users / subscriptions)
+
+
+def downgrade() -> None:
+    op.drop_table('daily_active_users')
+    op.drop_index('ix_daily_product_sales_product_id', table_name='daily_product_sales')
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_stats')
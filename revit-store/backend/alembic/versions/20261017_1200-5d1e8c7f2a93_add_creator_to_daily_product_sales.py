@@ -0,0 +1,39 @@
+"""Add creator to daily product sales
+
+Revision ID: 5d1e8c7f2a93
+Revises: '9b3f6d2a8e41'
+Create Date: 2026-10-17 12:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1e8c7f2a93'
+down_revision = '9b3f6d2a8e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('daily_product_sales', sa.Column('creator_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_daily_product_sales_creator_id', 'daily_product_sales', 'users',
+        ['creator_id'], ['id'], ondelete='SET NULL'
+    )
+
+    # Наявні агрегати отримують поточного автора товару
+    op.execute("""
+        UPDATE daily_product_sales s SET creator_id = p.creator_id
+        FROM products p
+        WHERE p.id = s.product_id
+    """)
+
+    op.create_index('ix_daily_product_sales_creator_date', 'daily_product_sales', ['creator_id', 'date'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_daily_product_sales_creator_date', table_name='daily_product_sales')
+    op.drop_constraint('fk_daily_product_sales_creator_id', 'daily_product_sales', type_='foreignkey')
+    op.drop_column('daily_product_sales', 'creator_id')
@@ -0,0 +1,76 @@
+"""Add hot path indexes
+
+Revision ID: a6c4e9d0b7f2
+Revises: '5d1e8c7f2a93'
+Create Date: 2026-10-17 12:30:00.000000+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c4e9d0b7f2'
+down_revision = '5d1e8c7f2a93'
+branch_labels = None
+depends_on = None
+
+
+# (назва, таблиця, колонки)
+INDEXES = [
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_orders_payment_id', 'orders', ['payment_id']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_order_items_product_id', 'order_items', ['product_id']),
+    ('ix_subscriptions_user_id_expires_at', 'subscriptions', ['user_id', 'expires_at']),
+    ('ix_subscriptions_payment_id', 'subscriptions', ['payment_id']),
+    ('ix_subscription_history_user_id', 'subscription_history', ['user_id']),
+    ('ix_daily_bonuses_user_id_claimed_at', 'daily_bonuses', ['user_id', 'claimed_at']),
+    ('ix_wheel_spins_user_id_spun_at', 'wheel_spins', ['user_id', 'spun_at']),
+    ('ix_users_referred_by_id_created_at', 'users', ['referred_by_id', 'created_at']),
+    ('ix_products_creator_id', 'products', ['creator_id']),
+    ('ix_products_catalog', 'products', ['is_active', 'is_approved', 'created_at']),
+    ('ix_collections_user_id', 'collections', ['user_id']),
+]
+
+
+def upgrade() -> None:
+    # Дублікати в кошику (гонка перевірки "вже в кошику") - лишаємо найстаріший запис
+    op.execute("""
+        DELETE FROM cart_items c
+        USING cart_items older
+        WHERE older.user_id = c.user_id
+          AND older.product_id = c.product_id
+          AND older.id < c.id
+    """)
+
+    # CREATE INDEX CONCURRENTLY не блокує запис, але не може виконуватись у транзакції.
+    # Якщо побудова перервалась, індекс лишається INVALID - його треба видалити вручну
+    # (DROP INDEX CONCURRENTLY ...) і повторити міграцію.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+        op.create_index(
+            'uq_cart_items_user_product', 'cart_items', ['user_id', 'product_id'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+    # Унікальний індекс стає обмеженням без повторного сканування таблиці
+    # (на нових базах init_db вже створив обмеження)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_cart_items_user_product') THEN
+                ALTER TABLE cart_items ADD CONSTRAINT uq_cart_items_user_product
+                    UNIQUE USING INDEX uq_cart_items_user_product;
+            END IF;
+        END $$;
+    """)
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_cart_items_user_product', 'cart_items', type_='unique')
+
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
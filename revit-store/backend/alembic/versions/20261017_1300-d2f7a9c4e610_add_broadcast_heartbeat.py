@@ -0,0 +1,24 @@
+"""Add broadcast heartbeat
+
+Revision ID: d2f7a9c4e610
+Revises: 'a6c4e9d0b7f2'
+Create Date: 2026-10-17 13:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f7a9c4e610'
+down_revision = 'a6c4e9d0b7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('broadcast_jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('broadcast_jobs', 'heartbeat_at')
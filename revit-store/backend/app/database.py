@@ -4,8 +4,16 @@
 """
 
 import os
-from sqlalchemy import text, create_engine, func
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Dict
+
+from sqlalchemy import text, create_engine, func, exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
 
@@ -20,12 +28,146 @@ DATABASE_URL = (
     f"@{os.getenv('DB_HOST', 'postgres')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME')}"
 )
 
+# Той самий URL для асинхронного драйвера asyncpg
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# ====== НАЛАШТУВАННЯ ПУЛУ З'ЄДНАНЬ ======
+# Значення за замовчуванням розраховані на 1 uvicorn worker та Postgres з max_connections=100.
+# DB_POOL_SIZE / DB_MAX_OVERFLOW - спільний бюджет воркера на обидва движки (sync та async):
+# async отримує DB_ASYNC_POOL_SIZE / DB_ASYNC_MAX_OVERFLOW (за замовчуванням 3/4), sync - решту.
+# Sync лишився лише в адмінці, кабінеті автора та перебудові рейтингів.
+# Максимум з'єднань воркера = DB_POOL_SIZE + DB_MAX_OVERFLOW.
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # Постійні з'єднання на воркер
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # Додаткові з'єднання під час піків
+DB_ASYNC_POOL_SIZE = min(int(os.getenv("DB_ASYNC_POOL_SIZE", str(DB_POOL_SIZE * 3 // 4))), DB_POOL_SIZE - 1)
+DB_ASYNC_MAX_OVERFLOW = min(int(os.getenv("DB_ASYNC_MAX_OVERFLOW", str(DB_MAX_OVERFLOW * 3 // 4))), DB_MAX_OVERFLOW)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # Скільки чекати на вільне з'єднання (сек)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Перевідкривати з'єднання старші за N сек
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)  # Перевіряти з'єднання перед видачею
+
+# Режим PgBouncer (transaction pooling): пулом керує PgBouncer, а asyncpg
+# не повинен використовувати prepared statements, що живуть між транзакціями
+DB_PGBOUNCER = _env_bool("DB_PGBOUNCER", False)
+
+
+class PoolMetrics:
+    """
+    Метрики пулу з'єднань: час очікування з'єднання (гістограма) та таймаути.
+    Поточний стан пулу (checked out, overflow) береться з самого пулу.
+    """
+
+    # Межі кошиків гістограми часу очікування, мс
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.wait_sum_ms = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+
+    def observe_wait(self, wait_ms: float) -> None:
+        with self._lock:
+            self.wait_counts[bisect_left(self.BUCKETS_MS, wait_ms)] += 1
+            self.wait_sum_ms += wait_ms
+            self.checkouts += 1
+
+    def observe_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            buckets = {f"le_{bound}ms": count for bound, count in zip(self.BUCKETS_MS, self.wait_counts)}
+            buckets["le_inf"] = self.wait_counts[-1]
+            return {
+                "checkouts_total": self.checkouts,
+                "timeouts_total": self.timeouts,
+                "wait_ms_sum": round(self.wait_sum_ms, 3),
+                "wait_ms_histogram": buckets
+            }
+
+
+class _TimedPoolMixin:
+    """
+    Вимірює, скільки запит чекав на з'єднання з пулу
+    """
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.observe_timeout()
+            raise
+        self.metrics.observe_wait((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+def _pool_options(poolclass, pool_size: int, max_overflow: int) -> Dict:
+    """
+    Параметри пулу для create_engine / create_async_engine
+    """
+    if DB_PGBOUNCER:
+        # З'єднання тримає PgBouncer, застосунок не кешує їх у себе
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": poolclass,
+        "pool_size": max(pool_size, 1),
+        "max_overflow": max(max_overflow, 0),
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+
 # Створюємо движок бази даних
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_pool_options(
+    TimedQueuePool, DB_POOL_SIZE - DB_ASYNC_POOL_SIZE, DB_MAX_OVERFLOW - DB_ASYNC_MAX_OVERFLOW
+))
+
+# Асинхронний движок: запити не блокують event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    # Для PgBouncer вимикаємо кеш prepared statements asyncpg, а імена prepared statements
+    # робимо унікальними: інакше інше серверне з'єднання PgBouncer може вже мати
+    # statement з таким самим ім'ям (DuplicatePreparedStatementError)
+    connect_args={
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__"
+    } if DB_PGBOUNCER else {},
+    **_pool_options(TimedAsyncQueuePool, DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW)
+)
 
 # Створюємо фабрику сесій
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Фабрика асинхронних сесій.
+# expire_on_commit=False - після commit атрибути доступні без нового запиту
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Додаємо атрибут func до сесії, щоб виправити помилки в інших файлах
 SessionLocal.func = func
 
@@ -39,6 +181,37 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Асинхронна сесія БД для роутерів, переведених на AsyncSession
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _pool_status(pool, metrics: PoolMetrics, max_overflow: int) -> Dict:
+    if isinstance(pool, NullPool):
+        return {"mode": "pgbouncer"}
+    return {
+        "mode": "queue",
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": max_overflow,
+        "timeout": DB_POOL_TIMEOUT,
+        **metrics.snapshot()
+    }
+
+
+def get_pool_metrics() -> Dict:
+    """
+    Стан пулів з'єднань (sync та async движки) для моніторингу
+    """
+    return {
+        "sync": _pool_status(engine.pool, TimedQueuePool.metrics, DB_MAX_OVERFLOW - DB_ASYNC_MAX_OVERFLOW),
+        "async": _pool_status(async_engine.sync_engine.pool, TimedAsyncQueuePool.metrics, DB_ASYNC_MAX_OVERFLOW)
+    }
+
 def check_db_connection():
     try:
         with engine.connect() as connection:
@@ -50,6 +223,6 @@ def check_db_connection():
         return False
 
 def init_db():
-    from app.models import user, product, order, subscription, collection
+    from app.models import user, product, order, subscription, collection, broadcast, media, stats
     Base.metadata.create_all(bind=engine)
     print("✅ База даних ініціалізована (PostgreSQL)")
\ No newline at end of file
@@ -2,7 +2,7 @@
 Головний файл FastAPI додатку OhMyRevit
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
@@ -15,7 +15,12 @@ load_dotenv()
 
 # Імпортуємо роутери
 from app.routers import auth, products, bonuses, orders, subscriptions, referrals, creators, admin, collections
+from app.routers.admin import get_admin_user
 from app.services.local_file_service import local_file_service
+from app.services.http_clients import http_clients
+from app.services.counter_service import counter_service
+from app.services.leaderboard_service import leaderboard_service
+from app.services.broadcast_service import broadcast_service
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -36,10 +41,32 @@ async def lifespan(app: FastAPI):
     else:
         print("❌ Не вдалося підключитися до БД")
 
+    # Пулені HTTP клієнти для Telegram та Cryptomus
+    await http_clients.startup()
+
+    # Періодичний запис лічильників переглядів / завантажень
+    counter_service.start()
+
+    # Рейтинги: перебудова з БД при старті та періодично
+    leaderboard_service.start()
+
+    # Розсилки, перервані попереднім рестартом / деплоєм
+    try:
+        interrupted = await broadcast_service.fail_stale_jobs()
+        if interrupted:
+            print(f"⚠️ Перервано незавершених розсилок: {interrupted}")
+    except Exception as e:
+        print(f"❌ Не вдалося перевірити незавершені розсилки: {e}")
+
     yield
 
     # Shutdown
     print("👋 Зупинка OhMyRevit API...")
+    await counter_service.stop()
+    await leaderboard_service.stop()
+    await http_clients.shutdown()
+    from app.database import async_engine
+    await async_engine.dispose()
 
 
 # Створюємо FastAPI додаток
@@ -92,6 +119,20 @@ async def health_check():
     }
 
 
+@app.get("/api/health/db", dependencies=[Depends(get_admin_user)])
+async def db_pool_metrics():
+    """Стан пулів з'єднань з БД: зайняті, overflow, час очікування (лише для адмінів)"""
+    from app.database import get_pool_metrics
+
+    return get_pool_metrics()
+
+
+@app.get("/api/health/http", dependencies=[Depends(get_admin_user)])
+async def http_client_metrics():
+    """Повторне використання з'єднань до Telegram та Cryptomus (лише для адмінів)"""
+    return http_clients.get_metrics()
+
+
 # ====== ПІДКЛЮЧЕННЯ РОУТЕРІВ ======
 app.include_router(auth.router, tags=["Auth"])
 app.include_router(bonuses.router, tags=["Bonuses"])
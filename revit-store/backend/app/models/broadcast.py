@@ -0,0 +1,55 @@
+"""
+Модель розсилки для OhMyRevit
+Зберігає прогрес масових розсилок через Telegram
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from app.database import Base
+
+
+class BroadcastJob(Base):
+    """Модель задачі розсилки"""
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_by_id = Column(Integer, ForeignKey('users.id', ondelete="SET NULL"), nullable=True)
+
+    # Що та кому відправляємо
+    target = Column(String(50), nullable=False)  # all, users, creators, subscribers
+    message = Column(Text, nullable=False)
+    parse_mode = Column(String(20), default="HTML")
+
+    # Прогрес
+    status = Column(String(20), default="pending", index=True)  # pending, running, completed, failed, interrupted
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    retries = Column(Integer, default=0)  # Повторні спроби (429 / мережеві помилки)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # Останнє збереження прогресу працюючою задачею
+
+    def __repr__(self):
+        return f"<BroadcastJob {self.id}: {self.status} {self.sent}/{self.total}>"
+
+    def to_dict(self) -> dict:
+        """Стан задачі для адмін-панелі"""
+        processed = (self.sent or 0) + (self.failed or 0)
+        return {
+            "id": self.id,
+            "target": self.target,
+            "status": self.status,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "progress_percent": round(processed * 100 / self.total, 1) if self.total else 100.0,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
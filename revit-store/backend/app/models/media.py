@@ -0,0 +1,52 @@
+"""
+Модель файлів медіа-сховища для OhMyRevit
+Облік посилань на файли (content-addressed) з товарів
+та кеш Telegram file_id для відправки архівів ботом
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, ForeignKey, UniqueConstraint
+from app.database import Base
+
+
+class MediaBlob(Base):
+    """
+    Файл у сховищі та кількість товарів, що на нього посилаються
+    (Product.file_url та Product.preview_images)
+    """
+    __tablename__ = "media_blobs"
+
+    path = Column(String(500), primary_key=True)  # /media/archives/ab/ab12...ef.zip
+    sha256 = Column(String(64), nullable=True, index=True)
+    size = Column(BigInteger, default=0)
+    ref_count = Column(Integer, default=0, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MediaBlob {self.path} refs={self.ref_count}>"
+
+
+class TelegramFileCache(Base):
+    """
+    file_id, який Telegram повернув після першого завантаження файлу товару.
+    Повторні відправки використовують file_id замість повторного завантаження.
+    Запис дійсний лише поки path збігається з поточним файлом товару.
+    """
+    __tablename__ = "telegram_file_cache"
+    __table_args__ = (
+        UniqueConstraint('product_id', 'kind', name='uq_telegram_file_cache_product_kind'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    kind = Column(String(20), nullable=False)  # archive, preview
+    path = Column(String(500), nullable=False, index=True)  # /media/... (шлях за SHA-256 вмісту)
+    file_id = Column(String(255), nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TelegramFileCache product={self.product_id} {self.kind}>"
@@ -3,7 +3,7 @@
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, JSON, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, JSON, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -11,6 +11,9 @@ from app.database import Base
 class Order(Base):
     """Модель замовлення"""
     __tablename__ = "orders"
+    __table_args__ = (
+        Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),  # Історія замовлень користувача
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String(50), unique=True, nullable=False)  # Унікальний номер замовлення
@@ -27,7 +30,7 @@ class Order(Base):
     # Оплата
     payment_method = Column(String(50), nullable=True)  # crypto, bonuses
     payment_status = Column(String(50), default='pending')  # pending, processing, completed, failed, refunded
-    payment_id = Column(String(255), nullable=True)  # ID транзакції в платіжній системі
+    payment_id = Column(String(255), nullable=True, index=True)  # ID транзакції в платіжній системі
 
     # Криптовалюта (якщо оплата крипто)
     crypto_currency = Column(String(10), nullable=True)  # BTC, ETH, USDT
@@ -82,8 +85,8 @@ class OrderItem(Base):
     id = Column(Integer, primary_key=True, index=True)
 
     # Зв'язки
-    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
-    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False, index=True)
 
     # Інформація про товар на момент покупки
     product_title = Column(String(255), nullable=False)  # Збережена назва
@@ -109,6 +112,9 @@ class OrderItem(Base):
 class CartItem(Base):
     """Модель товару в кошику"""
     __tablename__ = "cart_items"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='uq_cart_items_user_product'),  # Також індекс кошика
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
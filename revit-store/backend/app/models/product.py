@@ -3,7 +3,8 @@
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON, Table
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Float, JSON, Table, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from app.database import Base
 from app.models.collection import collection_products
@@ -12,8 +13,8 @@ from app.models.collection import collection_products
 product_tags = Table(
     'product_tags',
     Base.metadata,
-    Column('product_id', Integer, ForeignKey('products.id', ondelete='CASCADE')),
-    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'))
+    Column('product_id', Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True, index=True)
 )
 
 
@@ -56,24 +57,37 @@ class Product(Base):
     requires_subscription = Column(Boolean, default=False)  # Чи потрібна підписка
 
     # Для творців
-    creator_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    creator_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     is_approved = Column(Boolean, default=False)  # Чи схвалений адміном
     approved_at = Column(DateTime, nullable=True)
     approved_by_id = Column(Integer, nullable=True)  # ID адміна який схвалив
     rejection_reason = Column(Text, nullable=True)  # Причина відхилення
 
     # Метадані
-    tags = Column(JSON, default=[])  # Список тегів ["modern", "classic", etc.]
+    tags = Column(JSON, default=[])  # Список тегів для відображення (джерело істини - product_tags)
     meta = Column(JSON, default={})  # Додаткова інформація
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     released_at = Column(DateTime, default=datetime.utcnow)  # Дата релізу для підписників
 
+    # Пошукові вектори по мовах (оновлюються через search_service)
+    search_vector_en = Column(TSVECTOR, nullable=True)
+    search_vector_ua = Column(TSVECTOR, nullable=True)
+    search_vector_ru = Column(TSVECTOR, nullable=True)
+
+    __table_args__ = (
+        Index('ix_products_search_vector_en', 'search_vector_en', postgresql_using='gin'),
+        Index('ix_products_search_vector_ua', 'search_vector_ua', postgresql_using='gin'),
+        Index('ix_products_search_vector_ru', 'search_vector_ru', postgresql_using='gin'),
+        Index('ix_products_catalog', 'is_active', 'is_approved', 'created_at'),  # Каталог: активні та схвалені
+    )
+
     # Відносини
     creator = relationship("User", back_populates="products")
     collections = relationship("Collection", secondary="collection_products", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
     cart_items = relationship("CartItem", back_populates="product")
+    tag_items = relationship("Tag", secondary=product_tags)  # Нормалізовані теги (синхронізуються tag_service)
     #reviews = relationship("Review", back_populates="product", cascade="all, delete-orphan")
 
     def __repr__(self):
@@ -102,22 +116,9 @@ class Product(Base):
         """Чи безкоштовний продукт"""
         return self.price == 0
 
-    def can_download(self, user, subscription=None):
-        """Чи може користувач завантажити продукт"""
-        # Безкоштовні доступні всім
-        if self.is_free():
-            return True
-
-        # Перевірка чи куплений
-        # TODO: Додати перевірку в таблиці покупок
-
-        # Перевірка підписки для преміум товарів
-        if self.requires_subscription and subscription:
-            # Якщо товар вийшов під час активної підписки
-            if subscription.is_active() and self.released_at >= subscription.started_at:
-                return True
-
-        return False
+    def can_download(self, entitlements):
+        """Чи може користувач завантажити продукт (entitlements - entitlement_service.get)"""
+        return entitlements.can_download(self)
 
 
 class Tag(Base):
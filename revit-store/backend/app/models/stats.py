@@ -0,0 +1,63 @@
+"""
+Моделі щоденної статистики для OhMyRevit
+Агрегати по днях, що оновлюються інкрементально (rollup_service)
+та читаються адмін-дашбордом замість повних таблиць
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class DailyStats(Base):
+    """Загальні показники платформи за день (UTC)"""
+    __tablename__ = "daily_stats"
+
+    date = Column(Date, primary_key=True)
+
+    # Замовлення
+    orders_created = Column(Integer, default=0, nullable=False)
+    orders_completed = Column(Integer, default=0, nullable=False)
+    revenue = Column(Integer, default=0, nullable=False)  # Сума завершених замовлень (в центах)
+
+    # Користувачі
+    new_users = Column(Integer, default=0, nullable=False)
+    active_users = Column(Integer, default=0, nullable=False)  # Унікальні входи за день
+
+    # Підписки
+    subscriptions_paid = Column(Integer, default=0, nullable=False)
+    subscription_revenue = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailyStats {self.date} revenue={self.revenue}>"
+
+
+class DailyProductSales(Base):
+    """Продажі товару за день (також основа статистики творця)"""
+    __tablename__ = "daily_product_sales"
+    __table_args__ = (
+        Index('ix_daily_product_sales_creator_date', 'creator_id', 'date'),
+    )
+
+    date = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True, index=True)
+    creator_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)  # Автор товару на момент продажу
+
+    sales = Column(Integer, default=0, nullable=False)  # Кількість проданих позицій
+    revenue = Column(Integer, default=0, nullable=False)  # Сума final_price (в центах)
+
+    def __repr__(self):
+        return f"<DailyProductSales {self.date} product={self.product_id} sales={self.sales}>"
+
+
+class DailyActiveUser(Base):
+    """Факт входу користувача в конкретний день (для унікальних активних користувачів)"""
+    __tablename__ = "daily_active_users"
+
+    date = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+
+    def __repr__(self):
+        return f"<DailyActiveUser {self.date} user={self.user_id}>"
@@ -3,7 +3,7 @@
 """
 
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -11,6 +11,9 @@ from app.database import Base
 class Subscription(Base):
     """Модель підписки користувача"""
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        Index('ix_subscriptions_user_id_expires_at', 'user_id', 'expires_at'),  # Активна підписка користувача
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -27,7 +30,7 @@ class Subscription(Base):
 
     # Оплата
     payment_method = Column(String(50), nullable=True)  # crypto, bonuses
-    payment_id = Column(String(255), nullable=True)  # ID транзакції
+    payment_id = Column(String(255), nullable=True, index=True)  # ID транзакції
     payment_status = Column(String(50), default='pending')  # pending, completed, failed
 
     # Статус
@@ -118,7 +121,7 @@ class SubscriptionHistory(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     subscription_id = Column(Integer, ForeignKey('subscriptions.id'), nullable=False)
 
     action = Column(String(50), nullable=False)  # created, renewed, cancelled, expired
@@ -133,6 +136,9 @@ class SubscriptionHistory(Base):
 class DailyBonus(Base):
     """Модель щоденних бонусів"""
     __tablename__ = "daily_bonuses"
+    __table_args__ = (
+        Index('ix_daily_bonuses_user_id_claimed_at', 'user_id', 'claimed_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -175,6 +181,9 @@ class DailyBonus(Base):
 class WheelSpin(Base):
 
     __tablename__ = "wheel_spins"
+    __table_args__ = (
+        Index('ix_wheel_spins_user_id_spun_at', 'user_id', 'spun_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
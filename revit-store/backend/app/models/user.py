@@ -3,7 +3,7 @@
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Boolean, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Boolean, Text, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -11,6 +11,9 @@ from app.database import Base
 class User(Base):
     """Модель користувача"""
     __tablename__ = "users"
+    __table_args__ = (
+        Index('ix_users_referred_by_id_created_at', 'referred_by_id', 'created_at'),  # Реферали користувача
+    )
 
     # Основні поля
     id = Column(Integer, primary_key=True, index=True)
@@ -122,12 +125,6 @@ class User(Base):
         else:
             self.vip_level = 0  # None
 
-    def has_active_subscription(self, db: "Session") -> bool:  # <--- Додайте цей метод
-        """Перевіряє, чи є у користувача активна підписка."""
-        for sub in self.subscriptions:
-            if sub.is_valid():
-                return True
-        return False
 
 class CreatorApplication(Base):
     __tablename__ = "creator_applications"
@@ -7,17 +7,29 @@ from fastapi import APIRouter, HTTPException, Depends, Query, Body, UploadFile,
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_, or_, cast, String
 from typing import List, Optional, Dict
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
 
 from app.database import get_db
 from app.models.user import User, CreatorApplication
 from app.models.product import Product
-from app.models.order import Order, PromoCode, OrderItem
+from app.models.order import PromoCode
 from app.models.subscription import Subscription
+from app.models.broadcast import BroadcastJob
+from app.models.stats import DailyStats, DailyProductSales, DailyActiveUser
 from app.routers.auth import get_current_active_user
 from app.services.telegram_bot import bot_service
+from app.services.broadcast_service import broadcast_service
 from app.services.local_file_service import local_file_service
+from app.services.blob_service import blob_service
+from app.services.identity_service import identity_service
+from app.services.entitlement_service import entitlement_service
+from app.services.rollup_service import rollup_service
+from app.services.cache_service import cache_service
+from app.services.search_service import search_service
+from app.services.tag_service import tag_service
+from app.services.home_feed_service import home_feed_service
+from app.utils.pagination import keyset_paginate, cached_count, cursor_pagination_info
 
 # Створюємо роутер
 router = APIRouter(
@@ -44,28 +56,22 @@ async def get_admin_user(
 
 # ====== DASHBOARD СТАТИСТИКА ======
 
-@router.get("/dashboard")
-async def get_dashboard_stats(
-    admin: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
-) -> Dict:
-    """
-    Отримати статистику для дашборду
+# Як довго кешуються лічильники поточного стану (ролі користувачів, модерація)
+DASHBOARD_LIVE_TTL = 60
 
-    Returns:
-        Загальна статистика платформи
+
+def _dashboard_live_counts(db: Session) -> Dict:
+    """
+    Поточний стан, який не є подією дня: користувачі, творці, заблоковані, товари, активні підписки.
+    Кількість користувачів - count(users), а не сума new_users: агрегати покривають
+    лише дні після backfill, а видалення користувача їх не зменшує
     """
-    # Статистика користувачів
     users_stats = db.query(
         func.count(User.id).label('total_users'),
         func.count(User.id).filter(User.is_creator == True).label('creators'),
-        func.count(User.id).filter(User.is_blocked == True).label('blocked'),
-        func.count(User.id).filter(
-            User.last_login >= datetime.utcnow() - timedelta(days=7)
-        ).label('active_week')
+        func.count(User.id).filter(User.is_blocked == True).label('blocked')
     ).first()
 
-    # Статистика продуктів
     products_stats = db.query(
         func.count(Product.id).label('total_products'),
         func.count(Product.id).filter(Product.is_active == True).label('active'),
@@ -76,94 +82,138 @@ async def get_dashboard_stats(
         func.sum(Product.downloads_count).label('total_downloads')
     ).first()
 
-    # Статистика замовлень
-    orders_stats = db.query(
-        func.count(Order.id).label('total_orders'),
-        func.count(Order.id).filter(Order.status == 'completed').label('completed'),
-        func.sum(Order.total).filter(Order.status == 'completed').label('total_revenue')
-    ).first()
+    active_subscriptions = db.query(func.count(Subscription.id)).filter(
+        Subscription.is_active == True,
+        Subscription.expires_at > datetime.utcnow()
+    ).scalar()
 
-    # Статистика підписок
-    subscriptions_stats = db.query(
-        func.count(Subscription.id).filter(
-            Subscription.is_active == True,
-            Subscription.expires_at > datetime.utcnow()
-        ).label('active_subscriptions'),
-        func.sum(Subscription.plan_price).filter(
-            Subscription.payment_status == 'completed'
-        ).label('subscription_revenue')
+    return {
+        "total_users": users_stats.total_users,
+        "creators": users_stats.creators,
+        "blocked": users_stats.blocked,
+        "total_products": products_stats.total_products,
+        "active_products": products_stats.active,
+        "pending_moderation": products_stats.pending_moderation,
+        "total_downloads": products_stats.total_downloads or 0,
+        "active_subscriptions": active_subscriptions or 0
+    }
+
+
+@router.get("/dashboard")
+async def get_dashboard_stats(
+    date_from: Optional[date] = Query(None, description="Початок періоду (UTC), за замовчуванням - 7 днів тому"),
+    date_to: Optional[date] = Query(None, description="Кінець періоду включно (UTC), за замовчуванням - сьогодні"),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    Отримати статистику для дашборду.
+    Події (замовлення, доходи, нові та активні користувачі, продажі товарів)
+    читаються з щоденних агрегатів (rollup_service), а не з повних таблиць.
+
+    Returns:
+        Загальна статистика платформи та показники за період
+    """
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=6)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+
+    # Підсумки за весь час - сума по одному рядку на день
+    totals = db.query(
+        func.coalesce(func.sum(DailyStats.orders_created), 0).label('total_orders'),
+        func.coalesce(func.sum(DailyStats.orders_completed), 0).label('completed'),
+        func.coalesce(func.sum(DailyStats.revenue), 0).label('total_revenue'),
+        func.coalesce(func.sum(DailyStats.subscription_revenue), 0).label('subscription_revenue')
     ).first()
 
-    # Останні 7 днів - графік доходів
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    daily_revenue = db.query(
-        func.date(Order.created_at).label('date'),
-        func.sum(Order.total).label('revenue'),
-        func.count(Order.id).label('orders')
-    ).filter(
-        Order.status == 'completed',
-        Order.created_at >= week_ago
-    ).group_by(
-        func.date(Order.created_at)
-    ).all()
+    # Унікальні активні користувачі за останні 7 днів
+    active_week = db.query(func.count(func.distinct(DailyActiveUser.user_id))).filter(
+        DailyActiveUser.date > datetime.utcnow().date() - timedelta(days=7)
+    ).scalar()
+
+    live = await cache_service.get_or_set(
+        "admin_dashboard_live",
+        lambda: _dashboard_live_counts(db),
+        DASHBOARD_LIVE_TTL
+    )
 
-    # Топ продукти за тиждень (ВИПРАВЛЕНО)
-    top_products = db.query(
-        Product.id,
-        Product.sku,
-        Product.title,
-        func.count(Order.id).label('sales')
-    ).join(
-        OrderItem, Product.id == OrderItem.product_id
-    ).join(
-        Order, OrderItem.order_id == Order.id
+    # Показники за період
+    daily = db.query(DailyStats).filter(
+        DailyStats.date.between(date_from, date_to)
+    ).order_by(DailyStats.date).all()
+
+    top_sales = db.query(
+        DailyProductSales.product_id,
+        func.sum(DailyProductSales.sales).label('sales'),
+        func.sum(DailyProductSales.revenue).label('revenue')
     ).filter(
-        Order.status == 'completed',
-        Order.created_at >= week_ago
+        DailyProductSales.date.between(date_from, date_to)
     ).group_by(
-        Product.id, Product.sku, cast(Product.title, String)
+        DailyProductSales.product_id
     ).order_by(
         desc('sales')
     ).limit(5).all()
 
+    top_products_info = {
+        p.id: p for p in db.query(Product.id, Product.sku, Product.title).filter(
+            Product.id.in_([row.product_id for row in top_sales])
+        )
+    } if top_sales else {}
+
     return {
+        "period": {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "revenue": sum(day.revenue for day in daily),
+            "orders": sum(day.orders_completed for day in daily),
+            "new_users": sum(day.new_users for day in daily),
+            "subscription_revenue": sum(day.subscription_revenue for day in daily)
+        },
         "users": {
-            "total": users_stats.total_users,
-            "creators": users_stats.creators,
-            "blocked": users_stats.blocked,
-            "active_week": users_stats.active_week
+            "total": live["total_users"],
+            "creators": live["creators"],
+            "blocked": live["blocked"],
+            "active_week": active_week or 0
         },
         "products": {
-            "total": products_stats.total_products,
-            "active": products_stats.active,
-            "pending_moderation": products_stats.pending_moderation,
-            "total_downloads": products_stats.total_downloads or 0
+            "total": live["total_products"],
+            "active": live["active_products"],
+            "pending_moderation": live["pending_moderation"],
+            "total_downloads": live["total_downloads"]
         },
         "orders": {
-            "total": orders_stats.total_orders,
-            "completed": orders_stats.completed,
-            "total_revenue": orders_stats.total_revenue or 0
+            "total": totals.total_orders,
+            "completed": totals.completed,
+            "total_revenue": totals.total_revenue
         },
         "subscriptions": {
-            "active": subscriptions_stats.active_subscriptions or 0,
-            "revenue": subscriptions_stats.subscription_revenue or 0
+            "active": live["active_subscriptions"],
+            "revenue": totals.subscription_revenue
         },
         "revenue_chart": [
             {
                 "date": day.date.isoformat(),
-                "revenue": day.revenue or 0,
-                "orders": day.orders
+                "revenue": day.revenue,
+                "orders": day.orders_completed,
+                "new_users": day.new_users,
+                "active_users": day.active_users
             }
-            for day in daily_revenue
+            for day in daily
         ],
         "top_products": [
             {
-                "id": p.id,
-                "sku": p.sku,
-                "title": p.title.get('en') if isinstance(p.title, dict) else p.title,
-                "sales": p.sales
+                "id": row.product_id,
+                "sku": top_products_info[row.product_id].sku,
+                "title": (
+                    top_products_info[row.product_id].title.get('en')
+                    if isinstance(top_products_info[row.product_id].title, dict)
+                    else top_products_info[row.product_id].title
+                ),
+                "sales": row.sales,
+                "revenue": row.revenue
             }
-            for p in top_products
+            for row in top_sales if row.product_id in top_products_info
         ]
     }
 
@@ -288,6 +338,8 @@ async def update_user(
 
     db.commit()
     db.refresh(user)
+    # Ролі та блокування кешуються в get_optional_current_user
+    await identity_service.invalidate(user.telegram_id)
 
     return {
         "success": True,
@@ -350,7 +402,9 @@ async def grant_subscription(
     )
 
     db.add(subscription)
+    rollup_service.record_subscription_paid(db, subscription)
     db.commit()
+    await entitlement_service.invalidate(user_id)
 
     return {
         "success": True,
@@ -384,8 +438,10 @@ async def delete_user(
     # перепризначення його товарів або анонімізацію даних.
     # Для простоти - просто видаляємо.
 
+    telegram_id = user_to_delete.telegram_id
     db.delete(user_to_delete)
     db.commit()
+    await identity_service.invalidate(telegram_id)
 
     return {"success": True, "message": f"Користувач ID:{user_id} був повністю видалений з БД."}
 
@@ -457,6 +513,7 @@ async def approve_product(
     product.rejection_reason = None
 
     db.commit()
+    await home_feed_service.invalidate()
 
     # Повідомляємо творця через Telegram
     if product.creator:
@@ -499,6 +556,7 @@ async def reject_product(
     product.approved_by_id = admin.id
 
     db.commit()
+    await home_feed_service.invalidate()
 
     # Повідомляємо творця
     if product.creator:
@@ -543,6 +601,7 @@ async def send_for_revision(
     product.approved_by_id = admin.id
 
     db.commit()
+    await home_feed_service.invalidate()
 
     # Повідомляємо творця
     if product.creator:
@@ -767,6 +826,7 @@ async def approve_creator_application(
     if user_to_promote:
         user_to_promote.is_creator = True
         db.commit()
+        await identity_service.invalidate(user_to_promote.telegram_id)
         await bot_service.send_message(
             user_to_promote.telegram_id,
             "🎉 Вітаємо! Вашу заявку на статус творця було схвалено. Тепер вам доступний 'Кабінет творця' у профілі."
@@ -786,13 +846,14 @@ async def send_broadcast(
     db: Session = Depends(get_db)
 ) -> Dict:
     """
-    Відправити масову розсилку через Telegram
+    Запустити масову розсилку через Telegram у фоні.
+    Прогрес доступний через GET /broadcast/{job_id}
 
     Returns:
-        Результат розсилки
+        Створена задача розсилки
     """
     # Визначаємо цільову аудиторію
-    query = db.query(User)
+    query = db.query(User.telegram_id).filter(User.is_blocked == False)
 
     if target == "creators":
         query = query.filter(User.is_creator == True)
@@ -807,25 +868,69 @@ async def send_broadcast(
         query = query.filter(User.is_creator == False, User.is_admin == False)
     # else: all users
 
-    users = query.all()
+    telegram_ids = [row.telegram_id for row in query.all()]
 
-    # Відправляємо повідомлення
-    telegram_ids = [user.telegram_id for user in users]
-    stats = await bot_service.broadcast(telegram_ids, message)
+    job = BroadcastJob(
+        created_by_id=admin.id,
+        target=target,
+        message=message,
+        total=len(set(telegram_ids))
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    broadcast_service.start_job(job.id, telegram_ids)
 
     return {
         "success": True,
-        "message": "Broadcast sent",
-        "stats": stats
+        "message": "Broadcast started",
+        "job_id": job.id,
+        "stats": job.to_dict()
     }
 
 
+@router.get("/broadcast")
+async def get_broadcasts(
+    limit: int = Query(20, ge=1, le=100),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    Останні розсилки
+    """
+    jobs = db.query(BroadcastJob).order_by(desc(BroadcastJob.created_at)).limit(limit).all()
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+
+@router.get("/broadcast/{job_id}")
+async def get_broadcast_status(
+    job_id: int,
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    Прогрес розсилки
+    """
+    job = db.query(BroadcastJob).filter(BroadcastJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Розсилку не знайдено")
+
+    # Задача, яку ніхто не виконує (рестарт посеред розсилки), не лишається "running" назавжди
+    if broadcast_service.is_stale(job):
+        broadcast_service.mark_interrupted(job)
+        db.commit()
+
+    return job.to_dict()
+
+
 # ====== УПРАВЛІННЯ ТОВАРАМИ (АДМІН) ======
 
 @router.get("/products", response_model=Dict)
 async def admin_get_products(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="Курсор наступної сторінки (порожній рядок - перша сторінка)"),
         search: Optional[str] = None,
         admin: User = Depends(get_admin_user),
         db: Session = Depends(get_db)
@@ -835,16 +940,25 @@ async def admin_get_products(
     """
     query = db.query(Product)
     if search:
-        search_term = f"%{search.lower()}%"
-        query = query.filter(
-            or_(
-                Product.title.cast(String).ilike(search_term),
-                Product.sku.ilike(search_term)
-            )
-        )
+        search_clause = search_service.build_search_clause(search)
+        if search_clause is not None:
+            query = query.filter(search_clause[0])
 
-    total = query.count()
-    products = query.order_by(desc(Product.created_at)).offset((page - 1) * limit).limit(limit).all()
+    if cursor is not None:
+        products, next_cursor = keyset_paginate(
+            query, "created_at", Product.created_at, Product.id, cursor, limit
+        )
+        total = await cached_count(query.count, "admin_products", {"search": search})
+        pagination = cursor_pagination_info(limit, next_cursor, total)
+    else:
+        total = query.count()
+        products = query.order_by(desc(Product.created_at)).offset((page - 1) * limit).limit(limit).all()
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": (total + limit - 1) // limit
+        }
 
     return {
         "products": [
@@ -858,12 +972,7 @@ async def admin_get_products(
                 "creator_id": p.creator_id
             } for p in products
         ],
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": (total + limit - 1) // limit
-        }
+        "pagination": pagination
     }
 
 
@@ -881,14 +990,24 @@ async def admin_update_product(
     if not product:
         raise HTTPException(status_code=404, detail="Товар не знайдено")
 
+    old_paths = blob_service.product_paths(product)
+
     # Оновлюємо поля, які були передані
     for key, value in data.items():
-        if hasattr(product, key):
+        if key == 'tags':
+            tag_service.sync_product_tags(db, product, value)
+        elif hasattr(product, key):
             setattr(product, key, value)
 
     product.updated_at = datetime.utcnow()
+    db.flush()
+    # Якщо замінено архів або превʼю - переносимо посилання на файли
+    orphans = blob_service.replace_refs(db, old_paths, blob_service.product_paths(product))
+    search_service.refresh_product_search(db, product.id)
     db.commit()
     db.refresh(product)
+    blob_service.delete_files(db, orphans)
+    await home_feed_service.invalidate()
 
     return {"success": True, "message": "Товар успішно оновлено"}
 
@@ -906,11 +1025,13 @@ async def admin_delete_product(
     if not product:
         raise HTTPException(status_code=404, detail="Товар не знайдено")
 
-    # Тут можна додати логіку видалення файлів з S3/локального сховища
-    # Наприклад: file_service.delete_file(product.file_url)
+    # Файли видаляються лише якщо їх не використовують інші товари
+    orphans = blob_service.release_refs(db, blob_service.product_paths(product))
 
     db.delete(product)
     db.commit()
+    blob_service.delete_files(db, orphans)
+    await home_feed_service.invalidate()
 
     return {"success": True, "message": "Товар успішно видалено"}
 
@@ -960,14 +1081,17 @@ async def admin_create_product(
     """
     Створити новий товар з адмін-панелі.
     """
+    uploads = []
     try:
-        archive_result = await file_service.upload_file(archive_file, 'archives')
+        archive_result = await local_file_service.upload_file(archive_file, 'archives')
+        uploads.append(archive_result)
 
         preview_urls = []
         for image_file in preview_images:
-            image_result = await file_service.upload_file(image_file, 'previews')
+            image_result = await local_file_service.upload_file(image_file, 'previews')
             if image_result['success']:
                 preview_urls.append(image_result['file_url'])
+                uploads.append(image_result)
 
         title_json = {"en": title_en, "ua": title_en, "ru": title_en}
         description_json = {"en": description_en, "ua": description_en, "ru": description_en}
@@ -983,17 +1107,27 @@ async def admin_create_product(
             file_url=archive_result['s3_key'],
             file_size=archive_result['file_size'],
             preview_images=preview_urls,
-            tags=tags_list,
             is_active=True,
             is_approved=True,  # Адмінські товари одразу схвалені
             creator_id=None  # Можна додати логіку вибору творця
         )
 
         db.add(product)
+        db.flush()
+        blob_service.add_refs(db, blob_service.product_paths(product), uploads)
+        tag_service.sync_product_tags(db, product, tags_list)
+        search_service.refresh_product_search(db, product.id)
         db.commit()
+        # Посилання вже враховані - файли можна переносити на місце
+        for upload in uploads:
+            local_file_service.publish_upload(upload)
+        await home_feed_service.invalidate()
 
         return {"success": True, "message": "Товар успішно створено"}
     except Exception as e:
         print(f"!!! CRITICAL ERROR while creating product: {e}")  # Додаємо логування
-        # Тут можна додати логіку видалення файлів у разі помилки
+        # Завантажені файли ще не перенесені на місце - видаляємо тимчасові копії
+        db.rollback()
+        for upload in uploads:
+            local_file_service.discard_upload(upload)
         raise HTTPException(status_code=500, detail=f"Помилка створення товару: {str(e)}")
\ No newline at end of file
@@ -2,16 +2,25 @@
 Роутер для автентифікації користувачів через Telegram Web App
 """
 
+import os
+
 from fastapi import APIRouter, HTTPException, Depends, Body, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, update, case, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from datetime import datetime
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models.user import User
 from app.services.telegram_auth import TelegramAuth
+from app.services.identity_service import identity_service, CurrentUser
+from app.services.entitlement_service import entitlement_service
+from app.services.rollup_service import rollup_service
+from app.services.leaderboard_service import leaderboard_service
 from app.utils.security import (
     create_access_token,
     verify_access_token,
@@ -27,22 +36,22 @@ router = APIRouter(
 # Ініціалізуємо Telegram Auth
 telegram_auth = TelegramAuth()
 
+# Бонус за реєстрацію за реферальним посиланням (новачку і тому, хто запросив)
+REFERRAL_REGISTRATION_BONUS = int(os.getenv("REFERRAL_REGISTRATION_BONUS", "30"))
+
 # Security схема для Bearer токенів
 security = HTTPBearer(auto_error=False)
 
 
 # ====== HELPER ФУНКЦІЇ (ВИПРАВЛЕНО) ======
 
-async def get_optional_current_user(
+def _get_token_telegram_id(
         request: Request,
-        credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-        db: Session = Depends(get_db)
-) -> Optional[User]:
+        credentials: Optional[HTTPAuthorizationCredentials]
+) -> Optional[int]:
     """
-    Допоміжна функція для отримання користувача, ЯКЩО він авторизований.
-    Якщо токен відсутній або невалідний, функція просто поверне None, не викликаючи помилку.
-    Це дозволяє використовувати її для публічних сторінок (маркетплейс, сторінка товару),
-    які мають додатковий функціонал для залогінених користувачів (наприклад, кнопка "в обране").
+    Дістати telegram_id з токена запиту.
+    Повертає None, якщо токена немає або він невалідний.
     """
     token = None
     # Спочатку пробуємо отримати токен зі стандартного заголовка Authorization
@@ -66,18 +75,70 @@ async def get_optional_current_user(
     if not telegram_id:
         return None # Неправильний формат токена
 
-    # Шукаємо користувача в базі даних
-    user = db.query(User).filter(User.telegram_id == int(telegram_id)).first()
+    return int(telegram_id)
+
+
+async def get_optional_current_user(
+        request: Request,
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+        db: Session = Depends(get_db)
+) -> Optional[User]:
+    """
+    Допоміжна функція для отримання користувача, ЯКЩО він авторизований.
+    Якщо токен відсутній або невалідний, функція просто поверне None, не викликаючи помилку.
+    Це дозволяє використовувати її для публічних сторінок (маркетплейс, сторінка товару),
+    які мають додатковий функціонал для залогінених користувачів (наприклад, кнопка "в обране").
+
+    Повертає CurrentUser: id, ролі та блокування беруться з кешу ідентичності,
+    ORM User завантажується в сесію ендпоінта лише при зверненні до інших полів.
+    """
+    telegram_id = _get_token_telegram_id(request, credentials)
+    if telegram_id is None:
+        return None
 
-    # Якщо користувача не знайдено або він заблокований, вважаємо його анонімом
-    if not user or user.is_blocked:
+    snapshot = await identity_service.get(telegram_id)
+    user = None
+    if snapshot is None:
+        # Шукаємо користувача в базі даних
+        user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        if not user:
+            return None
+        snapshot = await identity_service.set(user)
+
+    # Якщо користувач заблокований, вважаємо його анонімом
+    if snapshot["is_blocked"]:
         return None
 
-    return user
+    return CurrentUser(snapshot, db, user)
+
 
-    # Оновлюємо час останнього входу
-    user.last_login = datetime.utcnow()
-    db.commit()
+async def get_optional_current_user_async(
+        request: Request,
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+        db: AsyncSession = Depends(get_async_db)
+) -> Optional[CurrentUser]:
+    """
+    Те саме, що get_optional_current_user, але для роутерів на AsyncSession.
+    Без await current_user.load() доступні лише поля знімка (SNAPSHOT_FIELDS),
+    інші поля та методи User потребують завантаження.
+    """
+    telegram_id = _get_token_telegram_id(request, credentials)
+    if telegram_id is None:
+        return None
+
+    snapshot = await identity_service.get(telegram_id)
+    user = None
+    if snapshot is None:
+        result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalars().first()
+        if not user:
+            return None
+        snapshot = await identity_service.set(user)
+
+    if snapshot["is_blocked"]:
+        return None
+
+    return CurrentUser(snapshot, db, user)
 
 
 async def get_current_active_user(
@@ -97,6 +158,39 @@ async def get_current_active_user(
     return current_user
 
 
+async def get_current_active_user_async(
+    current_user: Optional[CurrentUser] = Depends(get_optional_current_user_async)
+) -> CurrentUser:
+    """
+    Те саме, що get_current_active_user, але для роутерів на AsyncSession.
+    """
+    if not current_user:
+        raise HTTPException(
+            status_code=401,
+            detail="Необхідна авторизація для цієї дії"
+        )
+    return current_user
+
+
+async def get_current_user_for_update(
+    current_user: CurrentUser = Depends(get_current_active_user)
+) -> User:
+    """
+    ORM User для ендпоінтів, які змінюють користувача (баланс, профіль)
+    і працюють з ним як з обʼєктом сесії (db.refresh тощо).
+    """
+    return current_user.orm()
+
+
+async def get_current_user_for_update_async(
+    current_user: CurrentUser = Depends(get_current_active_user_async)
+) -> User:
+    """
+    Те саме, що get_current_user_for_update, але для роутерів на AsyncSession
+    """
+    return await current_user.load()
+
+
 # ====== СХЕМИ ДАНИХ (Pydantic моделі) ======
 
 class TelegramAuthRequest(BaseModel):
@@ -138,10 +232,65 @@ class UserResponse:
 
 # ====== ЕНДПОІНТИ ======
 
+async def _upsert_telegram_user(db: AsyncSession, telegram_id: int, user_data: Dict) -> Tuple[User, bool]:
+    """
+    Створити або оновити користувача одним INSERT ... ON CONFLICT ... RETURNING.
+    Реферальний бонус нараховується лише тому запиту, який справді створив рядок,
+    тому паралельні перші входи не створюють дублікатів і не нараховують бонус двічі.
+
+    Returns:
+        (користувач, чи був він щойно створений)
+    """
+    now = datetime.utcnow()
+    referral_code = user_data.get('start_param') or None
+
+    # Хто запросив - підзапит у тому ж INSERT
+    referrer_id = select(User.id).where(User.referral_code == referral_code).scalar_subquery()
+
+    stmt = insert(User).values(
+        telegram_id=telegram_id,
+        username=user_data.get('username'),
+        first_name=user_data.get('first_name'),
+        last_name=user_data.get('last_name'),
+        language=(user_data.get('language_code') or 'en')[:2],
+        photo_url=user_data.get('photo_url'),
+        referral_code=generate_referral_code(telegram_id),
+        referred_by_id=referrer_id if referral_code else None,
+        # Новачку бонус, лише якщо реферальний код справжній
+        balance=case((referrer_id.is_not(None), REFERRAL_REGISTRATION_BONUS), else_=0) if referral_code else 0,
+        created_at=now,
+        last_login=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "last_login": now,
+            # Оновлюємо дані лише якщо Telegram їх передав
+            "username": func.coalesce(stmt.excluded.username, User.username),
+            "first_name": func.coalesce(stmt.excluded.first_name, User.first_name),
+            "last_name": func.coalesce(stmt.excluded.last_name, User.last_name),
+            "photo_url": func.coalesce(stmt.excluded.photo_url, User.photo_url),
+        }
+    ).returning(User, literal_column("xmax = 0").label("inserted"))
+
+    user, inserted = (await db.execute(stmt, execution_options={"populate_existing": True})).one()
+
+    if inserted and user.referred_by_id:
+        # Атомарне нарахування тому, хто запросив
+        await db.execute(
+            update(User).where(User.id == user.referred_by_id).values(
+                balance=User.balance + REFERRAL_REGISTRATION_BONUS,
+                referral_earnings=User.referral_earnings + REFERRAL_REGISTRATION_BONUS
+            ).execution_options(synchronize_session=False)
+        )
+
+    return user, bool(inserted)
+
+
 @router.post("/telegram", response_model=Dict)
 async def telegram_login(
         request_body: TelegramAuthRequest,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Автентифікація через Telegram Web App
@@ -185,99 +334,65 @@ async def telegram_login(
             detail="Відсутній Telegram ID"
         )
 
-    # Шукаємо користувача в БД
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-
-    if not user:
-        # Новий користувач - створюємо
-        user = User(
-            telegram_id=telegram_id,
-            username=user_data.get('username'),
-            first_name=user_data.get('first_name'),
-            last_name=user_data.get('last_name'),
-            language=user_data.get('language_code', 'en')[:2],
-            photo_url=user_data.get('photo_url'),
-            referral_code=generate_referral_code(telegram_id),
-            created_at=datetime.utcnow(),
-            last_login=datetime.utcnow()
-        )
-
-        # Перевіряємо реферальний код (start_param)
-        referral_code = user_data.get('start_param', '')
-        if referral_code:
-            # Шукаємо хто запросив
-            referrer = db.query(User).filter(
-                User.referral_code == referral_code
-            ).first()
-
-            if referrer:
-                # Встановлюємо хто запросив
-                user.referred_by_id = referrer.id
-
-                # Нараховуємо бонуси за реєстрацію
-                user.balance = 30  # Новачку 30 бонусів
-                referrer.balance += 30  # Тому хто запросив теж 30
-                referrer.referral_earnings += 30
-
-                db.add(referrer)
-
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-        print(f"✅ Створено нового користувача: {user.get_full_name()}")
-    else:
-        # Існуючий користувач - оновлюємо дані
-        user.last_login = datetime.utcnow()
-
-        # Оновлюємо дані якщо змінилися
-        if user_data.get('username'):
-            user.username = user_data.get('username')
-        if user_data.get('first_name'):
-            user.first_name = user_data.get('first_name')
-        if user_data.get('last_name'):
-            user.last_name = user_data.get('last_name')
-        if user_data.get('photo_url'):
-            user.photo_url = user_data.get('photo_url')
-
-        db.commit()
-        print(f"✅ Користувач увійшов: {user.get_full_name()}")
+    user, inserted = await _upsert_telegram_user(db, telegram_id, user_data)
+    await db.run_sync(rollup_service.record_login, user.id, inserted)
 
     # Крок 5: Створюємо JWT токен
     access_token = create_access_token(
         data={"sub": str(telegram_id)}
     )
 
-    # Крок 6: Формуємо відповідь
+    # Крок 6: Формуємо відповідь (до commit - атрибути ще завантажені з RETURNING)
+    user_response = {
+        "id": user.id,
+        "telegram_id": user.telegram_id,
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "full_name": user.get_full_name(),
+        "language": user.language,
+        "theme": user.theme,
+        "balance": user.balance,
+        "vip_level": user.vip_level,
+        "vip_level_name": user.get_vip_level_name(),
+        "is_creator": user.is_creator,
+        "is_admin": user.is_admin,
+        "daily_streak": user.daily_streak,
+        "referral_code": user.referral_code,
+        # Заповнюється після commit (нижче)
+        "has_subscription": False,
+        "photo_url": user.photo_url
+    }
+    snapshot = identity_service.snapshot(user)
+    referred_by_id = user.referred_by_id
+    await db.commit()
+
+    # Після commit: upsert тримає блокування рядків users, між ним і commit не повинно бути await.
+    # Новий користувач ще не може мати підписки
+    if not inserted:
+        user_response["has_subscription"] = (
+            await entitlement_service.get(db, user.id)
+        ).has_active_subscription()
+
+    # Знімок для get_optional_current_user - наступні запити без SELECT users
+    await identity_service.set_snapshot(snapshot)
+
+    if inserted:
+        print(f"✅ Створено нового користувача: {user_response['full_name']}")
+        if referred_by_id:
+            await leaderboard_service.record_referral(referred_by_id)
+
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "telegram_id": user.telegram_id,
-            "username": user.username,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "full_name": user.get_full_name(),
-            "language": user.language,
-            "theme": user.theme,
-            "balance": user.balance,
-            "vip_level": user.vip_level,
-            "vip_level_name": user.get_vip_level_name(),
-            "is_creator": user.is_creator,
-            "is_admin": user.is_admin,
-            "daily_streak": user.daily_streak,
-            "referral_code": user.referral_code,
-            "has_subscription": user.has_active_subscription(db),
-            "photo_url": user.photo_url
-        }
+        "user": user_response
     }
 
 
 @router.post("/widget-login")
 async def widget_login(
         user_data: Dict = Body(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Авторизація через Telegram Login Widget (для веб-версії)
@@ -288,7 +403,7 @@ async def widget_login(
 
     # Отримуємо або створюємо користувача
     telegram_id = user_data.get("id")
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = (await db.execute(select(User).where(User.telegram_id == telegram_id))).scalars().first()
 
     if not user:
         user = User(
@@ -297,10 +412,10 @@ async def widget_login(
             first_name=user_data.get("first_name"),
             last_name=user_data.get("last_name"),
             photo_url=user_data.get("photo_url"),
-            referral_code=generate_referral_code()
+            referral_code=generate_referral_code(telegram_id)
         )
         db.add(user)
-        db.commit()
+        await db.commit()
 
     # Створюємо токен
     access_token = create_access_token(data={"sub": str(telegram_id)})
@@ -320,7 +435,7 @@ async def widget_login(
 @router.post("/telegram-widget", response_model=Dict)
 async def telegram_widget_login(
         widget_user: TelegramWidgetUser,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Автентифікація через Telegram Login Widget на сайті
@@ -336,7 +451,7 @@ async def telegram_widget_login(
         )
 
     # Крок 2: Отримуємо або створюємо користувача
-    user = db.query(User).filter(User.telegram_id == widget_user.id).first()
+    user = (await db.execute(select(User).where(User.telegram_id == widget_user.id))).scalars().first()
 
     if not user:
         # Новий користувач - створюємо
@@ -350,8 +465,10 @@ async def telegram_widget_login(
             last_login=datetime.utcnow()
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.flush()
+        await db.run_sync(rollup_service.record_login, user.id, True)
+        await db.commit()
+        await db.refresh(user)
     else:
         # Існуючий користувач - оновлюємо дані
         user.last_login = datetime.utcnow()
@@ -359,7 +476,10 @@ async def telegram_widget_login(
         user.first_name = widget_user.first_name
         user.last_name = widget_user.last_name
         user.photo_url = widget_user.photo_url
-        db.commit()
+        await db.run_sync(rollup_service.record_login, user.id)
+        await db.commit()
+
+    await identity_service.set(user)
 
     # Крок 3: Створюємо JWT токен
     access_token = create_access_token(
@@ -386,7 +506,7 @@ async def telegram_widget_login(
             "is_admin": user.is_admin,
             "daily_streak": user.daily_streak,
             "referral_code": user.referral_code,
-            "has_subscription": user.has_active_subscription(db),
+            "has_subscription": (await entitlement_service.get(db, user.id)).has_active_subscription(),
             "photo_url": user.photo_url
         }
     }
@@ -394,24 +514,16 @@ async def telegram_widget_login(
 
 @router.get("/me")
 async def get_current_user(
-        user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Отримати дані поточного користувача
 
     Потрібен Bearer токен в заголовку Authorization
     """
-    active_subscription = None
-    for sub in user.subscriptions:
-        if sub.is_valid():
-            active_subscription = {
-                "plan_type": sub.plan_type,
-                "expires_at": sub.expires_at.isoformat(),
-                "days_remaining": sub.days_remaining(),
-                "auto_renew": sub.auto_renew
-            }
-            break
+    user = await current_user.load()
+    active_subscription = (await entitlement_service.get(db, user.id)).subscription_summary()
 
     return {
         "id": user.id,
@@ -443,8 +555,8 @@ async def get_current_user(
 @router.put("/me")
 async def update_current_user(
         update_data: Dict,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: User = Depends(get_current_user_for_update_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Оновити дані поточного користувача
@@ -459,20 +571,12 @@ async def update_current_user(
             setattr(current_user, field, value)
 
     current_user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    await identity_service.invalidate(current_user.telegram_id)
 
     # Повертаємо оновлені дані, аналогічно до get_current_user
-    active_subscription = None
-    for sub in current_user.subscriptions:
-        if sub.is_valid():
-            active_subscription = {
-                "plan_type": sub.plan_type,
-                "expires_at": sub.expires_at.isoformat(),
-                "days_remaining": sub.days_remaining(),
-                "auto_renew": sub.auto_renew
-            }
-            break
+    active_subscription = (await entitlement_service.get(db, current_user.id)).subscription_summary()
 
     return {
         "id": current_user.id,
@@ -494,10 +598,10 @@ async def update_current_user(
         "free_spins_today": current_user.free_spins_today,
         "referral_code": current_user.referral_code,
         "referral_earnings": current_user.referral_earnings,
-        "total_spent": user.total_spent,
+        "total_spent": current_user.total_spent,
         "subscription": active_subscription,
-        "created_at": user.created_at.isoformat(),
-        "photo_url": user.photo_url
+        "created_at": current_user.created_at.isoformat(),
+        "photo_url": current_user.photo_url
     }
 
 
@@ -2,19 +2,26 @@
 Роутер для системи бонусів та колеса фортуни
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import random
 import json
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User
 from app.models.subscription import DailyBonus, WheelSpin
-from app.routers.auth import get_current_active_user
+from app.routers.auth import (
+    get_current_active_user_async,
+    get_current_user_for_update_async,
+    get_optional_current_user_async
+)
 from app.services.bonus_service import BonusService
+from app.services.entitlement_service import entitlement_service
+from app.services.identity_service import CurrentUser
+from app.services.leaderboard_service import leaderboard_service
 
 router = APIRouter(
     prefix="/api/bonuses",
@@ -49,17 +56,19 @@ WHEEL_SECTORS = [
 
 @router.get("/daily/status")
 async def get_daily_bonus_status(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """Отримати статус щоденного бонусу"""
 
     today = datetime.utcnow().date()
 
     # Знаходимо останній бонус користувача
-    last_bonus = db.query(DailyBonus).filter(
-        DailyBonus.user_id == current_user.id
-    ).order_by(DailyBonus.claimed_at.desc()).first()
+    last_bonus = (await db.execute(
+        select(DailyBonus).where(
+            DailyBonus.user_id == current_user.id
+        ).order_by(DailyBonus.claimed_at.desc()).limit(1)
+    )).scalars().first()
 
     # Розраховуємо стрік
     current_streak = 1
@@ -94,8 +103,8 @@ async def get_daily_bonus_status(
 
 @router.post("/daily/claim")
 async def claim_daily_bonus(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_for_update_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """Отримати щоденний бонус"""
 
@@ -129,7 +138,7 @@ async def claim_daily_bonus(
     #)
     #db.add(history)
 
-    db.commit()
+    await db.commit()
 
     return {
         "success": True,
@@ -150,18 +159,20 @@ async def get_wheel_config() -> Dict:
 
 @router.get("/wheel/status")
 async def get_wheel_status(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
 
     today = datetime.utcnow().date()
 
-    spins_today = db.query(func.count(WheelSpin.id)).filter(
-        WheelSpin.user_id == current_user.id,
-        func.date(WheelSpin.spun_at) == today
-    ).scalar() or 0
+    spins_today = (await db.execute(
+        select(func.count(WheelSpin.id)).where(
+            WheelSpin.user_id == current_user.id,
+            func.date(WheelSpin.spun_at) == today
+        )
+    )).scalar() or 0
 
-    has_subscription = current_user.has_active_subscription(db)
+    has_subscription = (await entitlement_service.get(db, current_user.id)).has_active_subscription()
     free_spins = 3 if has_subscription else 1
 
     return {
@@ -175,8 +186,8 @@ async def get_wheel_status(
 @router.post("/wheel/spin")
 async def spin_wheel(
     use_bonus: bool = False,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_for_update_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """Крутити колесо фортуни"""
 
@@ -226,8 +237,9 @@ async def spin_wheel(
     if selected_sector["value"] > 0:
         current_user.balance += selected_sector["value"]
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    await leaderboard_service.record_wheel_win(current_user.id, selected_sector["value"])
 
     return {
         "success": True,
@@ -243,14 +255,18 @@ async def spin_wheel(
 
 @router.get("/statistics")
 async def get_user_statistics(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отримати статистику бонусів для користувача."""
-    bonus_service = BonusService()
     # Це спрощена версія, для повної реалізації потрібен сервісний шар
-    daily_stats = db.query(DailyBonus).filter(DailyBonus.user_id == current_user.id).count()
-    wheel_stats = bonus_service.get_wheel_statistics(current_user.id, db)
+    daily_stats = (await db.execute(
+        select(func.count(DailyBonus.id)).where(DailyBonus.user_id == current_user.id)
+    )).scalar()
+    wheel_stats = await db.run_sync(
+        lambda session: BonusService.get_wheel_statistics(current_user.id, session)
+    )
+    current_user = await current_user.load()
     return {
         "current_balance": current_user.balance,
         "total_earned": current_user.balance, # Поки що заглушка
@@ -259,14 +275,27 @@ async def get_user_statistics(
         "referrals": {"total_earned": current_user.referral_earnings}
     }
 
+@router.get("/wheel/leaderboard")
+async def get_wheel_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    current_user: Optional[CurrentUser] = Depends(get_optional_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Топ користувачів по виграшах у колесі та позиція поточного користувача."""
+    result = await BonusService.get_leaderboard(db, limit, current_user.id if current_user else None)
+    result["updated_at"] = datetime.utcnow().isoformat()
+    return result
+
 @router.get("/wheel/history")
 async def get_wheel_history(
     limit: int = 10,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отримати історію обертань колеса."""
-    history = db.query(WheelSpin).filter(WheelSpin.user_id == current_user.id).order_by(WheelSpin.spun_at.desc()).limit(limit).all()
+    history = (await db.execute(
+        select(WheelSpin).where(WheelSpin.user_id == current_user.id).order_by(WheelSpin.spun_at.desc()).limit(limit)
+    )).scalars().all()
     return {
         "history": [
             {
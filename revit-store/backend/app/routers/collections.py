@@ -2,14 +2,17 @@
 Роутер для роботи з колекціями користувачів
 """
 from fastapi import APIRouter, HTTPException, Depends, Body
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Dict
 from datetime import datetime
-from app.database import get_db
-from app.models.user import User
+from app.database import get_async_db
 from app.models.product import Product
 from app.models.collection import Collection
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user_async
+from app.services.collection_service import collection_service
+from app.services.identity_service import CurrentUser
 
 router = APIRouter(
     prefix="/api/collections",
@@ -19,11 +22,14 @@ router = APIRouter(
 
 @router.get("/")
 async def get_user_collections(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отримати всі колекції поточного користувача."""
-    collections = db.query(Collection).filter(Collection.user_id == current_user.id).order_by(Collection.created_at.desc()).all()
+    collections = (await db.execute(
+        select(Collection).where(Collection.user_id == current_user.id)
+        .order_by(Collection.created_at.desc()).options(selectinload(Collection.products))
+    )).scalars().all()
     return [{
         "id": c.id,
         "name": c.name,
@@ -36,8 +42,8 @@ async def get_user_collections(
 @router.post("/")
 async def create_collection(
     data: Dict,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Створити нову колекцію."""
     name = data.get("name")
@@ -45,18 +51,18 @@ async def create_collection(
     if not name:
         raise HTTPException(status_code=400, detail="Назва колекції є обов'язковою")
 
-    new_collection = Collection(user_id=current_user.id, name=name, icon=icon) # Додаємо іконку при створенні
-    db.add(new_collection)
-    db.commit()
-    db.refresh(new_collection)
+    new_collection = Collection(user_id=current_user.id, name=name, icon=icon, products=[]) # Додаємо іконку при створенні
 
-    # Якщо передано product_id, одразу додаємо його до нової колекції
+    # Якщо передано product_id, одразу додаємо його до нової колекції (тим самим commit)
     product_id = data.get("product_id")
-    if product_id:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if product:
-            new_collection.products.append(product)
-            db.commit()
+    product = await db.get(Product, product_id) if product_id else None
+    if product:
+        new_collection.products.append(product)
+
+    db.add(new_collection)
+    await db.commit()
+    if product:
+        await collection_service.invalidate_user(current_user.id)
 
     return {"id": new_collection.id, "name": new_collection.name, "product_count": len(new_collection.products)}
 
@@ -64,16 +70,18 @@ async def create_collection(
 @router.post("/products/toggle")
 async def toggle_product_in_collection(
         data: Dict,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Додати або видалити продукт з колекції."""
     collection_id = data.get("collection_id")
     product_id = data.get("product_id")
 
-    collection = db.query(Collection).filter(Collection.id == collection_id,
-                                             Collection.user_id == current_user.id).first()
-    product = db.query(Product).filter(Product.id == product_id).first()
+    collection = (await db.execute(
+        select(Collection).where(Collection.id == collection_id, Collection.user_id == current_user.id)
+        .options(selectinload(Collection.products))
+    )).scalars().first()
+    product = await db.get(Product, product_id) if product_id else None
 
     if not collection or not product:
         raise HTTPException(status_code=404, detail="Колекцію або продукт не знайдено")
@@ -85,7 +93,8 @@ async def toggle_product_in_collection(
         collection.products.append(product)
         action = "added"
 
-    db.commit()
+    await db.commit()
+    await collection_service.invalidate_user(current_user.id)
     return {"status": "success", "action": action}
 
 
@@ -93,12 +102,13 @@ async def toggle_product_in_collection(
 async def update_collection(
         collection_id: int,
         data: Dict,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Оновити назву та іконку колекції."""
-    collection = db.query(Collection).filter(Collection.id == collection_id,
-                                             Collection.user_id == current_user.id).first()
+    collection = (await db.execute(
+        select(Collection).where(Collection.id == collection_id, Collection.user_id == current_user.id)
+    )).scalars().first()
     if not collection:
         raise HTTPException(status_code=404, detail="Колекцію не знайдено")
 
@@ -108,43 +118,48 @@ async def update_collection(
         collection.icon = data["icon"]
 
     collection.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    await collection_service.invalidate_user(current_user.id)
     return {"status": "success", "message": "Колекцію оновлено"}
 
 
 @router.delete("/{collection_id}")
 async def delete_collection(
         collection_id: int,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Видалити колекцію."""
-    collection = db.query(Collection).filter(Collection.id == collection_id,
-                                             Collection.user_id == current_user.id).first()
+    collection = (await db.execute(
+        select(Collection).where(Collection.id == collection_id, Collection.user_id == current_user.id)
+    )).scalars().first()
     if not collection:
         raise HTTPException(status_code=404, detail="Колекцію не знайдено")
 
-    db.delete(collection)
-    db.commit()
+    await db.delete(collection)
+    await db.commit()
+    await collection_service.invalidate_user(current_user.id)
     return {"status": "success", "message": "Колекцію видалено"}
 
 
 @router.get("/product-status/{product_id}")
 async def get_product_collection_status(
         product_id: int,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Перевірити, в яких колекціях знаходиться товар, і повернути іконку."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Продукт не знайдено")
 
     # Знаходимо першу колекцію користувача, в якій є цей товар
-    collection = db.query(Collection).filter(
-        Collection.user_id == current_user.id,
-        Collection.products.any(id=product.id)
-    ).first()
+    collection = (await db.execute(
+        select(Collection).where(
+            Collection.user_id == current_user.id,
+            Collection.products.any(id=product.id)
+        ).limit(1)
+    )).scalars().first()
 
     if collection:
         return {"in_collection": True, "icon": collection.icon}
@@ -156,12 +171,14 @@ async def get_product_collection_status(
 async def get_collection_details(
         collection_id: int,
         language: str = "en",
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Отримати детальний вміст колекції."""
-    collection = db.query(Collection).filter(Collection.id == collection_id,
-                                             Collection.user_id == current_user.id).first()
+    collection = (await db.execute(
+        select(Collection).where(Collection.id == collection_id, Collection.user_id == current_user.id)
+        .options(selectinload(Collection.products))
+    )).scalars().first()
     if not collection:
         raise HTTPException(status_code=404, detail="Колекцію не знайдено")
 
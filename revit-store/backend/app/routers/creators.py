@@ -14,11 +14,17 @@ import json
 from app.database import get_db
 from app.models.user import User
 from app.models.product import Product
-from app.models.order import Order, OrderItem
+from app.models.order import OrderItem
+from app.models.stats import DailyProductSales
 from app.routers.auth import get_current_active_user
 #from app.services.s3_service import s3_service
 from app.services.local_file_service import local_file_service as file_service
+from app.services.blob_service import blob_service
+from app.services.search_service import search_service
+from app.services.tag_service import tag_service
+from app.services.home_feed_service import home_feed_service
 from app.utils.security import generate_order_number
+from app.utils.pagination import keyset_paginate, cached_count, cursor_pagination_info
 from app.services.telegram_bot import bot_service
 
 # Створюємо роутер
@@ -112,6 +118,7 @@ async def apply_to_become_creator(
 async def get_creator_products(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор наступної сторінки (порожній рядок - перша сторінка)"),
     status: Optional[str] = Query(None, description="pending, approved, rejected"),
     creator: User = Depends(get_creator_user),
     db: Session = Depends(get_db)
@@ -140,9 +147,22 @@ async def get_creator_products(
             query = query.filter(Product.rejection_reason != None)
 
     # Пагінація
-    total = query.count()
-    offset = (page - 1) * limit
-    products = query.order_by(desc(Product.created_at)).offset(offset).limit(limit).all()
+    if cursor is not None:
+        products, next_cursor = keyset_paginate(
+            query, "created_at", Product.created_at, Product.id, cursor, limit
+        )
+        total = await cached_count(query.count, "creator_products", {"creator_id": creator.id, "status": status})
+        pagination = cursor_pagination_info(limit, next_cursor, total)
+    else:
+        total = query.count()
+        offset = (page - 1) * limit
+        products = query.order_by(desc(Product.created_at)).offset(offset).limit(limit).all()
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": (total + limit - 1) // limit
+        }
 
     # Формуємо відповідь
     return {
@@ -163,12 +183,7 @@ async def get_creator_products(
             }
             for p in products
         ],
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": (total + limit - 1) // limit
-        }
+        "pagination": pagination
     }
 
 
@@ -200,6 +215,7 @@ async def create_product(
     Returns:
         Інформація про створений товар
     """
+    uploads = []
     try:
         # Валідація кількості превʼю
         if len(preview_images) < 1 or len(preview_images) > 5:
@@ -224,6 +240,7 @@ async def create_product(
                 status_code=500,
                 detail="Failed to upload archive file"
             )
+        uploads.append(archive_result)
 
         # Завантажуємо превʼю зображення
         preview_urls = []
@@ -240,6 +257,7 @@ async def create_product(
 
             if image_result['success']:
                 preview_urls.append(image_result['file_url'])
+                uploads.append(image_result)
 
         # Формуємо мультимовні дані
         title_json = {
@@ -270,7 +288,6 @@ async def create_product(
             file_url=archive_result['s3_key'],  # Зберігаємо S3 ключ
             file_size=archive_result['file_size'],
             preview_images=preview_urls,
-            tags=tags_list,
             creator_id=creator.id,
             is_active=False,  # Неактивний до модерації
             is_approved=False,  # Потребує схвалення
@@ -278,7 +295,14 @@ async def create_product(
         )
 
         db.add(product)
+        db.flush()
+        blob_service.add_refs(db, blob_service.product_paths(product), uploads)
+        tag_service.sync_product_tags(db, product, tags_list)
+        search_service.refresh_product_search(db, product.id)
         db.commit()
+        # Посилання вже враховані - файли можна переносити на місце
+        for upload in uploads:
+            file_service.publish_upload(upload)
         db.refresh(product)
 
         return {
@@ -294,13 +318,10 @@ async def create_product(
 
     except Exception as e:
         print(f"Error creating product: {e}")
-        # Видаляємо завантажені файли якщо щось пішло не так
-        if 'archive_result' in locals():
-            file_service.delete_file(archive_result['s3_key'])
-        if 'preview_urls' in locals():
-            for url in preview_urls:
-                # Видаляємо превʼю
-                pass
+        # Завантажені файли ще не перенесені на місце - видаляємо тимчасові копії
+        db.rollback()
+        for upload in uploads:
+            file_service.discard_upload(upload)
 
         raise HTTPException(
             status_code=500,
@@ -348,14 +369,17 @@ async def update_product(
     if price is not None:
         product.price = price
     if tags is not None:
-        product.tags = tags
+        tag_service.sync_product_tags(db, product, tags)
     if is_active is not None and product.is_approved:
         product.is_active = is_active
 
     product.updated_at = datetime.utcnow()
 
+    db.flush()
+    search_service.refresh_product_search(db, product.id)
     db.commit()
     db.refresh(product)
+    await home_feed_service.invalidate()
 
     return {
         "success": True,
@@ -405,6 +429,7 @@ async def delete_product(
         # Не видаляємо, а деактивуємо
         product.is_active = False
         db.commit()
+        await home_feed_service.invalidate()
 
         return {
             "success": True,
@@ -412,13 +437,14 @@ async def delete_product(
             "deactivated": True
         }
 
-    # Видаляємо файли з S3
-    if product.file_url:
-        file_service.delete_file(product.file_url)
+    # Файли видаляються лише якщо їх не використовують інші товари
+    orphans = blob_service.release_refs(db, blob_service.product_paths(product))
 
     # Видаляємо продукт
     db.delete(product)
     db.commit()
+    blob_service.delete_files(db, orphans)
+    await home_feed_service.invalidate()
 
     return {
         "success": True,
@@ -429,6 +455,16 @@ async def delete_product(
 
 # ====== СТАТИСТИКА ======
 
+# Скільки календарних днів (UTC, включно з сьогодні) охоплює кожен період статистики
+STATISTICS_PERIOD_DAYS = {
+    "day": 1,
+    "week": 7,
+    "month": 30,
+    "year": 365,
+    "all": None
+}
+
+
 @router.get("/statistics")
 async def get_creator_statistics(
     period: str = Query("month", description="day, week, month, year, all"),
@@ -436,7 +472,9 @@ async def get_creator_statistics(
     db: Session = Depends(get_db)
 ) -> Dict:
     """
-    Отримати статистику продажів
+    Отримати статистику продажів.
+    Продажі читаються з щоденних агрегатів daily_product_sales (rollup_service),
+    які оновлюються в момент завершення замовлення.
 
     Args:
         period: Період статистики
@@ -444,71 +482,45 @@ async def get_creator_statistics(
     Returns:
         Детальна статистика
     """
-    # Визначаємо період
-    now = datetime.utcnow()
-    if period == "day":
-        start_date = now - timedelta(days=1)
-    elif period == "week":
-        start_date = now - timedelta(weeks=1)
-    elif period == "month":
-        start_date = now - timedelta(days=30)
-    elif period == "year":
-        start_date = now - timedelta(days=365)
-    else:  # all
-        start_date = datetime(2020, 1, 1)
-
-    # Отримуємо продукти творця
-    creator_products = db.query(Product.id).filter(
-        Product.creator_id == creator.id
-    ).subquery()
+    today = datetime.utcnow().date()
+    period_days = STATISTICS_PERIOD_DAYS.get(period)
 
-    # Рахуємо продажі
-    sales_query = db.query(
-        func.count(OrderItem.id).label('total_sales'),
-        func.sum(OrderItem.final_price).label('total_revenue')
-    ).join(
-        Order, OrderItem.order_id == Order.id
-    ).filter(
-        OrderItem.product_id.in_(creator_products),
-        Order.status == 'completed',
-        Order.created_at >= start_date
-    )
+    creator_sales = [DailyProductSales.creator_id == creator.id]
+    period_filter = list(creator_sales)
+    if period_days:
+        period_filter.append(DailyProductSales.date > today - timedelta(days=period_days))
 
-    sales_data = sales_query.first()
+    # Рахуємо продажі
+    sales_data = db.query(
+        func.sum(DailyProductSales.sales).label('total_sales'),
+        func.sum(DailyProductSales.revenue).label('total_revenue')
+    ).filter(*period_filter).first()
 
     # Топ продукти
-    top_products = db.query(
-        Product.id,
-        Product.sku,
-        Product.title,
-        func.count(OrderItem.id).label('sales_count'),
-        func.sum(OrderItem.final_price).label('revenue')
-    ).join(
-        OrderItem, Product.id == OrderItem.product_id
-    ).join(
-        Order, OrderItem.order_id == Order.id
+    top_sales = db.query(
+        DailyProductSales.product_id,
+        func.sum(DailyProductSales.sales).label('sales_count'),
+        func.sum(DailyProductSales.revenue).label('revenue')
     ).filter(
-        Product.creator_id == creator.id,
-        Order.status == 'completed',
-        Order.created_at >= start_date
+        *period_filter
     ).group_by(
-        Product.id, Product.sku, Product.title
+        DailyProductSales.product_id
     ).order_by(
         desc('sales_count')
     ).limit(5).all()
 
-    # Статистика по продуктах
+    top_products_info = {
+        p.id: p for p in db.query(Product.id, Product.sku, Product.title).filter(
+            Product.id.in_([row.product_id for row in top_sales])
+        )
+    } if top_sales else {}
+
+    # Статистика по продуктах, переглядах та завантаженнях
     products_stats = db.query(
         func.count(Product.id).label('total_products'),
         func.count(Product.id).filter(Product.is_active == True).label('active_products'),
         func.count(Product.id).filter(Product.is_approved == True).label('approved_products'),
-        func.count(Product.id).filter(Product.is_approved == False, Product.rejection_reason == None).label('pending_products')
-    ).filter(
-        Product.creator_id == creator.id
-    ).first()
-
-    # Загальна статистика переглядів та завантажень
-    views_downloads = db.query(
+        func.count(Product.id).filter(Product.is_approved == False, Product.rejection_reason == None).label('pending_products'),
         func.sum(Product.views_count).label('total_views'),
         func.sum(Product.downloads_count).label('total_downloads'),
         func.avg(Product.rating).label('average_rating')
@@ -517,21 +529,17 @@ async def get_creator_statistics(
     ).first()
 
     # Графік продажів по днях (останні 30 днів)
-    thirty_days_ago = now - timedelta(days=30)
     daily_sales = db.query(
-        func.date(Order.created_at).label('date'),
-        func.count(OrderItem.id).label('sales'),
-        func.sum(OrderItem.final_price).label('revenue')
-    ).join(
-        OrderItem, Order.id == OrderItem.order_id
+        DailyProductSales.date,
+        func.sum(DailyProductSales.sales).label('sales'),
+        func.sum(DailyProductSales.revenue).label('revenue')
     ).filter(
-        OrderItem.product_id.in_(creator_products),
-        Order.status == 'completed',
-        Order.created_at >= thirty_days_ago
+        *creator_sales,
+        DailyProductSales.date > today - timedelta(days=30)
     ).group_by(
-        func.date(Order.created_at)
+        DailyProductSales.date
     ).order_by(
-        func.date(Order.created_at)
+        DailyProductSales.date
     ).all()
 
     return {
@@ -549,23 +557,27 @@ async def get_creator_statistics(
             "pending": products_stats.pending_products or 0
         },
         "engagement": {
-            "total_views": views_downloads.total_views or 0,
-            "total_downloads": views_downloads.total_downloads or 0,
-            "average_rating": round(views_downloads.average_rating or 0, 2),
+            "total_views": products_stats.total_views or 0,
+            "total_downloads": products_stats.total_downloads or 0,
+            "average_rating": round(products_stats.average_rating or 0, 2),
             "conversion_rate": round(
-                ((views_downloads.total_downloads or 0) / (views_downloads.total_views or 1)) * 100,
+                ((products_stats.total_downloads or 0) / (products_stats.total_views or 1)) * 100,
                 2
             )
         },
         "top_products": [
             {
-                "id": p.id,
-                "sku": p.sku,
-                "title": p.title.get('en') if isinstance(p.title, dict) else p.title,
-                "sales": p.sales_count,
-                "revenue": p.revenue
+                "id": row.product_id,
+                "sku": top_products_info[row.product_id].sku,
+                "title": (
+                    top_products_info[row.product_id].title.get('en')
+                    if isinstance(top_products_info[row.product_id].title, dict)
+                    else top_products_info[row.product_id].title
+                ),
+                "sales": row.sales_count,
+                "revenue": row.revenue
             }
-            for p in top_products
+            for row in top_sales if row.product_id in top_products_info
         ],
         "daily_chart": [
             {
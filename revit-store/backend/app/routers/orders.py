@@ -3,20 +3,27 @@
 """
 
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Dict, List, Optional
 from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db
 from app.models.user import User
 from app.models.product import Product
 from app.models.order import Order, OrderItem, CartItem, PromoCode
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user_async, get_current_user_for_update_async
+from app.services.entitlement_service import entitlement_service
+from app.services.identity_service import CurrentUser
 from app.services.payment_service import PaymentService, PromoCodeService
+from app.services.rollup_service import rollup_service
 from app.utils.security import generate_order_number
+from app.utils.pagination import keyset_paginate_async, count_rows, cached_count, cursor_pagination_info
 
 # Створюємо роутер
 router = APIRouter(
@@ -31,18 +38,30 @@ promo_service = PromoCodeService()
 
 # ====== КОШИК ======
 
+async def _cart_count(db: AsyncSession, user_id: int) -> int:
+    """
+    Кількість товарів у кошику користувача
+    """
+    result = await db.execute(
+        select(func.count()).select_from(CartItem).where(CartItem.user_id == user_id)
+    )
+    return result.scalar_one()
+
+
 @router.get("/cart")
 async def get_cart(
     language: str = "en",
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати вміст кошика користувача
     """
-    cart_items = db.query(CartItem).filter(
-        CartItem.user_id == current_user.id
-    ).all()
+    cart_items = (await db.execute(
+        select(CartItem).options(selectinload(CartItem.product)).where(
+            CartItem.user_id == current_user.id
+        )
+    )).scalars().all()
 
     items = []
     subtotal = 0
@@ -65,104 +84,116 @@ async def get_cart(
 
         subtotal += current_price
 
+    # Баланс та VIP рівень не входять у знімок ідентичності
+    user = await current_user.load()
+
     # Рахуємо можливий кешбек
-    cashback_percent = current_user.get_cashback_percent()
+    cashback_percent = user.get_cashback_percent()
 
     # Якщо є підписка - додаємо 5%
-    for sub in current_user.subscriptions:
-        if sub.is_valid():
-            cashback_percent += 5
-            break
+    entitlements = await entitlement_service.get(db, user.id)
+    if entitlements.has_active_subscription():
+        cashback_percent += 5
 
     return {
         "items": items,
         "count": len(items),
         "subtotal": subtotal,
-        "max_bonuses_use": min(current_user.balance, int(subtotal * 0.7)),  # Макс 70%
+        "max_bonuses_use": min(user.balance, int(subtotal * 0.7)),  # Макс 70%
         "cashback_amount": int(subtotal * cashback_percent / 100),
-        "user_balance": current_user.balance
+        "user_balance": user.balance
     }
 
 
 @router.post("/cart/add")
 async def add_to_cart(
     product_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Додати товар в кошик
     """
     # Перевіряємо чи існує продукт
-    product = db.query(Product).filter(
-        Product.id == product_id,
-        Product.is_active == True
-    ).first()
+    product = (await db.execute(
+        select(Product.id).where(
+            Product.id == product_id,
+            Product.is_active == True
+        )
+    )).first()
 
     if not product:
         raise HTTPException(status_code=404, detail="Продукт не знайдено")
 
     # Перевіряємо чи вже в кошику
-    existing = db.query(CartItem).filter(
-        CartItem.user_id == current_user.id,
-        CartItem.product_id == product_id
-    ).first()
+    existing = (await db.execute(
+        select(CartItem.id).where(
+            CartItem.user_id == current_user.id,
+            CartItem.product_id == product_id
+        )
+    )).first()
 
     if existing:
         raise HTTPException(status_code=400, detail="Товар вже в кошику")
 
-    # Додаємо в кошик
+    # Додаємо в кошик (одночасне додавання того ж товару відсікає uq_cart_items_user_product)
     cart_item = CartItem(
         user_id=current_user.id,
         product_id=product_id
     )
     db.add(cart_item)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Товар вже в кошику")
 
     return {
         "success": True,
         "message": "Товар додано в кошик",
-        "cart_count": db.query(CartItem).filter(CartItem.user_id == current_user.id).count()
+        "cart_count": await _cart_count(db, current_user.id)
     }
 
 
 @router.delete("/cart/{item_id}")
 async def remove_from_cart(
     item_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Видалити товар з кошика
     """
-    cart_item = db.query(CartItem).filter(
-        CartItem.id == item_id,
-        CartItem.user_id == current_user.id
-    ).first()
+    cart_item = (await db.execute(
+        select(CartItem).where(
+            CartItem.id == item_id,
+            CartItem.user_id == current_user.id
+        )
+    )).scalars().first()
 
     if not cart_item:
         raise HTTPException(status_code=404, detail="Товар не знайдено в кошику")
 
-    db.delete(cart_item)
-    db.commit()
+    await db.delete(cart_item)
+    await db.commit()
 
     return {
         "success": True,
         "message": "Товар видалено з кошика",
-        "cart_count": db.query(CartItem).filter(CartItem.user_id == current_user.id).count()
+        "cart_count": await _cart_count(db, current_user.id)
     }
 
 
 @router.delete("/cart")
 async def clear_cart(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Очистити кошик
     """
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
-    db.commit()
+    await db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
+    await db.commit()
 
     return {
         "success": True,
@@ -175,13 +206,13 @@ async def clear_cart(
 @router.post("/promo/validate")
 async def validate_promo_code(
     code: str,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Перевірити промокод
     """
-    promo = promo_service.validate_promo_code(code, db)
+    promo = await db.run_sync(lambda session: promo_service.validate_promo_code(code, session))
 
     if not promo:
         raise HTTPException(status_code=400, detail="Невірний або прострочений промокод")
@@ -197,12 +228,39 @@ async def validate_promo_code(
 
 # ====== ЗАМОВЛЕННЯ ======
 
+async def _change_balance(db: AsyncSession, user_id: int, amount: int, **increments: int) -> bool:
+    """
+    Атомарно змінити баланс користувача (без commit).
+    Списання (amount < 0) виконується лише якщо бонусів вистачає.
+    increments - інші лічильники User, що збільшуються тим самим UPDATE (total_spent).
+
+    Returns:
+        False якщо бонусів недостатньо
+    """
+    if not amount and not any(increments.values()):
+        return True
+
+    statement = update(User).where(User.id == user_id)
+    if amount < 0:
+        statement = statement.where(User.balance >= -amount)
+
+    values = {"balance": User.balance + amount}
+    for field, delta in increments.items():
+        values[field] = func.coalesce(getattr(User, field), 0) + delta
+
+    # fetch - оновлює current_user у сесії значеннями з RETURNING
+    result = (await db.execute(
+        statement.values(**values).returning(User.id).execution_options(synchronize_session="fetch")
+    )).first()
+    return result is not None
+
+
 @router.post("/")
 async def create_order(
     order_data: Dict,
     background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_for_update_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Створити замовлення
@@ -218,31 +276,44 @@ async def create_order(
     items = order_data.get("items", [])
     if not items:
         # Беремо з кошика
-        cart_items = db.query(CartItem).filter(
-            CartItem.user_id == current_user.id
-        ).all()
+        cart_items = (await db.execute(
+            select(CartItem).where(CartItem.user_id == current_user.id)
+        )).scalars().all()
 
         if not cart_items:
             raise HTTPException(status_code=400, detail="Кошик порожній")
 
         items = [{"product_id": item.product_id} for item in cart_items]
 
+    payment_method = order_data.get("payment_method", "crypto")
+    if payment_method not in ("bonuses", "subscription", "crypto"):
+        raise HTTPException(status_code=400, detail="Невірний метод оплати")
+
     # Створюємо замовлення
     order = Order(
         order_number=generate_order_number(),
         user_id=current_user.id,
-        payment_method=order_data.get("payment_method", "crypto"),
+        payment_method=payment_method,
         email=order_data.get("email"),
-        status="pending"
+        status="pending",
+        discount_amount=0
     )
 
+    # Завантажуємо всі товари одним запитом
+    products = {
+        product.id: product for product in (await db.execute(
+            select(Product).where(
+                Product.id.in_([item_data["product_id"] for item_data in items]),
+                Product.is_active == True
+            )
+        )).scalars()
+    }
+
     # Рахуємо суму
     subtotal = 0
+    now = datetime.utcnow()
     for item_data in items:
-        product = db.query(Product).filter(
-            Product.id == item_data["product_id"],
-            Product.is_active == True
-        ).first()
+        product = products.get(item_data["product_id"])
 
         if not product:
             continue
@@ -254,7 +325,7 @@ async def create_order(
             product_id=product.id,
             product_title=product.get_title("en"),
             product_price=product.price,
-            discount_percent=product.discount_percent if product.discount_ends_at and product.discount_ends_at > datetime.utcnow() else 0,
+            discount_percent=product.discount_percent if product.discount_ends_at and product.discount_ends_at > now else 0,
             final_price=current_price
         )
         order.items.append(order_item)
@@ -263,12 +334,34 @@ async def create_order(
 
     order.subtotal = subtotal
 
-    # Застосовуємо промокод
+    # Права доступу - до claim_promo_code: між UPDATE промокоду (блокування рядка)
+    # та commit не повинно бути await
+    entitlements = await entitlement_service.get(db, current_user.id)
+    has_valid_subscription = entitlements.has_active_subscription()
+
+    if payment_method == "subscription":
+        if not has_valid_subscription:
+            raise HTTPException(
+                status_code=400,
+                detail="У вас немає активної підписки"
+            )
+
+        # Перевіряємо чи всі товари доступні по підписці (реліз з дати підписки)
+        for item in order.items:
+            if not entitlements.covers(products[item.product_id]):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Товар {item.product_title} не доступний по підписці"
+                )
+
+    # Застосовуємо промокод: перевірка та лічильник використань - один атомарний UPDATE
     promo_code = order_data.get("promo_code")
     if promo_code:
-        promo = promo_service.validate_promo_code(promo_code, db)
+        promo = await db.run_sync(
+            lambda session: promo_service.claim_promo_code(promo_code, subtotal, session)
+        )
 
-        if promo and subtotal >= promo["min_order_amount"]:
+        if promo:
             order.promo_code = promo["code"]
 
             if promo["discount_type"] == "percent":
@@ -277,15 +370,12 @@ async def create_order(
             else:
                 order.discount_amount = promo["discount_value"]
 
-            # Збільшуємо лічильник використань
-            promo_service.apply_promo_code(promo["id"], db)
-
     # Використовуємо бонуси
-    bonuses_to_use = min(
+    bonuses_to_use = max(0, min(
         order_data.get("bonuses_used", 0),
         current_user.balance,
-        int((subtotal - order.discount_amount) * 0.7)  # Макс 70%
-    )
+        int((subtotal - (order.discount_amount or 0)) * 0.7)  # Макс 70%
+    ))
     order.bonuses_used = bonuses_to_use
 
     # Рахуємо фінальну суму
@@ -293,51 +383,52 @@ async def create_order(
 
     # Рахуємо кешбек
     cashback_percent = current_user.get_cashback_percent()
-    for sub in current_user.subscriptions:
-        if sub.is_valid():
-            cashback_percent += 5
-            break
+    if has_valid_subscription:
+        cashback_percent += 5
 
     order.calculate_cashback(cashback_percent)
 
+    # Перевірки способу оплати - до запису, щоб не лишати зайвих замовлень
+    if payment_method == "bonuses" and order.total > 0:
+        await db.rollback()  # Повертаємо використання промокоду
+        raise HTTPException(
+            status_code=400,
+            detail="Недостатньо бонусів для повної оплати"
+        )
+
+    # Списуємо бонуси атомарно: одночасні замовлення не підуть у мінус
+    if not await _change_balance(db, current_user.id, -order.bonuses_used):
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Недостатньо бонусів")
+
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    await db.run_sync(rollup_service.record_order_created, order)
+    # expire_on_commit=False: order (разом з items) лишається завантаженим після commit
+    await db.commit()
 
     # Обробка оплати
     if order.payment_method == "bonuses":
-        # Оплата тільки бонусами
-        if order.total > 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Недостатньо бонусів для повної оплати"
-            )
-
-        # Списуємо бонуси
-        current_user.balance -= order.bonuses_used
-
         # Завершуємо замовлення
         order.status = "completed"
         order.payment_status = "completed"
         order.completed_at = datetime.utcnow()
 
-        # Нараховуємо кешбек
+        # Нараховуємо кешбек та оновлюємо VIP статус
         if order.cashback_amount > 0:
-            current_user.balance += order.cashback_amount
             order.cashback_credited = True
-
-        # Оновлюємо VIP статус
-        current_user.total_spent += order.total
+        await _change_balance(db, current_user.id, order.cashback_amount, total_spent=order.total)
         current_user.update_vip_level()
 
         # Очищаємо кошик
-        db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
+        await db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
 
-        db.commit()
+        await db.run_sync(rollup_service.record_order_completed, order)
+        await db.commit()
+        await entitlement_service.invalidate(current_user.id)
 
         # Відправляємо email якщо вказано
         if order.email:
-            background_tasks.add_task(send_order_email, order, db)
+            background_tasks.add_task(send_order_email, order)
 
         return {
             "success": True,
@@ -347,31 +438,6 @@ async def create_order(
         }
 
     elif order.payment_method == "subscription":
-        # Перевіряємо підписку
-        has_valid_subscription = False
-        for sub in current_user.subscriptions:
-            if sub.is_valid():
-                has_valid_subscription = True
-                break
-
-        if not has_valid_subscription:
-            raise HTTPException(
-                status_code=400,
-                detail="У вас немає активної підписки"
-            )
-
-        # Перевіряємо чи всі товари доступні по підписці
-        for item in order.items:
-            if not item.product.requires_subscription:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Товар {item.product_title} не доступний по підписці"
-                )
-
-        # Списуємо використані бонуси
-        if order.bonuses_used > 0:
-            current_user.balance -= order.bonuses_used
-
         # Завершуємо замовлення
         order.status = "completed"
         order.payment_status = "subscription"
@@ -379,13 +445,15 @@ async def create_order(
 
         # Нараховуємо кешбек
         if order.cashback_amount > 0:
-            current_user.balance += order.cashback_amount
             order.cashback_credited = True
+            await _change_balance(db, current_user.id, order.cashback_amount)
 
         # Очищаємо кошик
-        db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
+        await db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
 
-        db.commit()
+        await db.run_sync(rollup_service.record_order_completed, order)
+        await db.commit()
+        await entitlement_service.invalidate(current_user.id)
 
         return {
             "success": True,
@@ -394,18 +462,14 @@ async def create_order(
             "message": "Товари доступні по підписці"
         }
 
-    elif order.payment_method == "crypto":
+    else:
         # Створюємо платіж
         crypto_currency = order_data.get("crypto_currency", "USDT")
 
-        # Списуємо використані бонуси
-        if order.bonuses_used > 0:
-            current_user.balance -= order.bonuses_used
-
         # Конвертуємо центи в долари
         amount_usd = order.total / 100
 
-        payment_data = payment_service.create_payment(
+        payment_data = await payment_service.create_payment(
             amount=amount_usd,
             currency=crypto_currency,
             order_id=order.order_number,
@@ -419,14 +483,13 @@ async def create_order(
             order.crypto_amount = payment_data.get("amount_crypto", "")
             order.crypto_address = payment_data.get("address", "")
 
-            db.commit()
+            await db.commit()
 
-            # Плануємо перевірку статусу
+            # Плануємо перевірку статусу (власна сесія - сесія запиту вже закрита)
             background_tasks.add_task(
                 check_order_payment_status,
                 order.id,
-                payment_data["payment_id"],
-                db
+                payment_data["payment_id"]
             )
 
             return {
@@ -442,36 +505,52 @@ async def create_order(
         else:
             order.status = "failed"
             order.payment_status = "failed"
-            db.commit()
+            # Повертаємо списані бонуси
+            await _change_balance(db, current_user.id, order.bonuses_used)
+            await db.commit()
 
             raise HTTPException(
                 status_code=500,
                 detail="Помилка створення платежу"
             )
 
-    else:
-        raise HTTPException(status_code=400, detail="Невірний метод оплати")
-
 
 @router.get("/")
 async def get_orders(
     page: int = 1,
     limit: int = 20,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати історію замовлень
+
+    cursor: курсор наступної сторінки (порожній рядок - перша сторінка курсорного режиму)
     """
-    offset = (page - 1) * limit
+    query = select(Order).where(Order.user_id == current_user.id)
+    # items_count - без лінивого завантаження (AsyncSession)
+    list_query = query.options(selectinload(Order.items))
 
-    orders = db.query(Order).filter(
-        Order.user_id == current_user.id
-    ).order_by(
-        Order.created_at.desc()
-    ).offset(offset).limit(limit).all()
+    if cursor is not None:
+        orders, next_cursor = await keyset_paginate_async(
+            db, list_query, "created_at", Order.created_at, Order.id, cursor, limit
+        )
+        total = await cached_count(lambda: count_rows(db, query), "orders", {"user_id": current_user.id})
+        pagination = cursor_pagination_info(limit, next_cursor, total)
+    else:
+        offset = (page - 1) * limit
+        orders = (await db.execute(
+            list_query.order_by(Order.created_at.desc()).offset(offset).limit(limit)
+        )).scalars().all()
 
-    total = db.query(Order).filter(Order.user_id == current_user.id).count()
+        total = await count_rows(db, query)
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": (total + limit - 1) // limit
+        }
 
     orders_data = []
     for order in orders:
@@ -489,12 +568,7 @@ async def get_orders(
 
     return {
         "orders": orders_data,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": (total + limit - 1) // limit
-        }
+        "pagination": pagination
     }
 
 
@@ -502,16 +576,18 @@ async def get_orders(
 async def get_order_details(
     order_id: int,
     language: str = "en",
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати детальну інформацію про замовлення
     """
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.user_id == current_user.id
-    ).first()
+    order = (await db.execute(
+        select(Order).where(
+            Order.id == order_id,
+            Order.user_id == current_user.id
+        ).options(selectinload(Order.items).selectinload(OrderItem.product))
+    )).scalars().first()
 
     if not order:
         raise HTTPException(status_code=404, detail="Замовлення не знайдено")
@@ -548,16 +624,23 @@ async def get_order_details(
     }
 
 
-async def check_order_payment_status(order_id: int, payment_id: str, db: Session):
+async def check_order_payment_status(order_id: int, payment_id: str):
     """
     Фонова задача для перевірки статусу оплати
     """
-    order = db.query(Order).filter(Order.id == order_id).first()
-
-    if order and order.payment_status == "pending":
-        status = payment_service.check_payment_status(payment_id)
+    # Статус платежу - до відкриття сесії, щоб не тримати з'єднання під час HTTP запиту
+    status = await payment_service.check_payment_status(payment_id)
+    if status != "paid":
+        return
+
+    async with AsyncSessionLocal() as db:
+        order = (await db.execute(
+            select(Order).where(Order.id == order_id).options(
+                selectinload(Order.user), selectinload(Order.items)
+            )
+        )).scalars().first()
 
-        if status == "paid":
+        if order and order.payment_status == "pending":
             order.payment_status = "completed"
             order.status = "completed"
             order.completed_at = datetime.utcnow()
@@ -572,12 +655,14 @@ async def check_order_payment_status(order_id: int, payment_id: str, db: Session
             order.user.update_vip_level()
 
             # Очищаємо кошик
-            db.query(CartItem).filter(CartItem.user_id == order.user_id).delete()
+            await db.execute(delete(CartItem).where(CartItem.user_id == order.user_id))
 
-            db.commit()
+            await db.run_sync(rollup_service.record_order_completed, order)
+            await db.commit()
+            await entitlement_service.invalidate(order.user_id)
 
 
-async def send_order_email(order: Order, db: Session):
+async def send_order_email(order: Order):
     """
     Відправити email з деталями замовлення
     """
@@ -2,20 +2,29 @@
 Роутер для роботи з продуктами (архівами Revit)
 """
 import os
-from fastapi.responses import FileResponse
-from fastapi import APIRouter, HTTPException, Depends, Query, Response
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc, asc
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, and_, desc, asc, func, select
 from typing import List, Optional, Dict
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models.product import Product
 from app.models.user import User
-from app.models.collection import Collection
 from app.services.local_file_service import local_file_service
-from app.routers.auth import get_optional_current_user, get_current_active_user
+from app.services.collection_service import collection_service
+from app.services.home_feed_service import home_feed_service
+from app.services.search_service import search_service
+from app.services.tag_service import tag_service
+from app.routers.auth import get_current_active_user, get_optional_current_user_async, get_current_active_user_async
+from app.utils.pagination import keyset_paginate_async, count_rows, cached_count, cursor_pagination_info
 from app.services.telegram_bot import bot_service
+from app.services.download_service import download_service
+from app.services.counter_service import counter_service
+from app.services.entitlement_service import entitlement_service
+from app.services.library_service import library_service, LIBRARY_SOURCES
+from app.services.identity_service import CurrentUser
 
 # Створюємо роутер
 router = APIRouter(
@@ -31,6 +40,7 @@ async def get_products(
         # Параметри пагінації
         page: int = Query(1, ge=1, description="Номер сторінки"),
         limit: int = Query(20, ge=1, le=100, description="Кількість товарів на сторінці"),
+        cursor: Optional[str] = Query(None, description="Курсор наступної сторінки (порожній рядок - перша сторінка курсорного режиму)"),
 
         # Фільтри
         category: Optional[str] = Query(None, description="Категорія: free, premium, creator"),
@@ -45,26 +55,27 @@ async def get_products(
         # Пошук
         search: Optional[str] = Query(None, description="Пошук по назві та опису"),
         tags: Optional[str] = Query(None, description="Теги через кому: modern,classic"),
+        tags_mode: str = Query("all", description="all - всі теги (AND), any - будь-який з тегів (OR)"),
 
         # Сортування
-        sort_by: str = Query("created_at", description="Поле сортування: price, rating, downloads, created_at"),
+        sort_by: Optional[str] = Query(None, description="Поле сортування: relevance, price, rating, downloads, created_at"),
         sort_order: str = Query("desc", description="Порядок: asc або desc"),
 
         # Мова
         language: str = Query("en", description="Мова для назв: en, uk, ru"),
 
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 
         # --- ВИПРАВЛЕНО ТУТ ---
         # Використовуємо опціональну перевірку користувача.
         # Якщо користувач не залогінений, current_user буде None, але помилки не виникне.
-        current_user: Optional[User] = Depends(get_optional_current_user)
+        current_user: Optional[CurrentUser] = Depends(get_optional_current_user_async)
 ):
     """
     Отримати список продуктів з фільтрацією та пагінацією
     """
     # Базовий запит
-    query = db.query(Product).filter(Product.is_active == True, Product.is_approved == True)
+    query = select(Product).where(Product.is_active == True, Product.is_approved == True)
 
     # === ФІЛЬТРИ ===
 
@@ -106,51 +117,90 @@ async def get_products(
             )
         )
 
-    # Пошук по назві та опису
+    # Пошук по назві, опису та SKU (повнотекстовий індекс)
+    rank_expression = None
     if search:
-        search_term = f"%{search.lower()}%"
-        query = query.filter(
-            or_(
-                Product.title.cast(db.String).ilike(search_term),
-                Product.description.cast(db.String).ilike(search_term),
-                Product.sku.ilike(search_term)
-            )
-        )
+        search_clause = search_service.build_search_clause(search)
+        if search_clause is not None:
+            search_filter, rank_expression = search_clause
+            query = query.filter(search_filter)
 
-    # Фільтр по тегах
-    if tags:
-        tag_list = [tag.strip() for tag in tags.split(',')]
-        for tag in tag_list:
-            query = query.filter(Product.tags.cast(db.String).contains(tag))
+    # Фільтр по тегах (точний збіг через product_tags)
+    tag_slugs = tag_service.parse_tags_param(tags)
+    if tag_slugs:
+        query = query.filter(await tag_service.build_tag_filter(db, tag_slugs, tags_mode))
 
     # === СОРТУВАННЯ ===
 
-    order_column = {
-        'price': Product.price,
-        'rating': Product.rating,
-        'downloads': Product.downloads_count,
+    # Колонки без NOT NULL - через coalesce: NULL не проходить порівняння курсора
+    sort_columns = {
+        'price': func.coalesce(Product.price, 0),
+        'rating': func.coalesce(Product.rating, 0.0),
+        'downloads': func.coalesce(Product.downloads_count, 0),
         'created_at': Product.created_at
-    }.get(sort_by, Product.created_at)
+    }
+    if rank_expression is not None:
+        sort_columns['relevance'] = rank_expression
 
-    if sort_order == 'asc':
-        query = query.order_by(asc(order_column))
-    else:
-        query = query.order_by(desc(order_column))
+    # Для пошукових запитів за замовчуванням сортуємо за релевантністю
+    if not sort_by:
+        sort_by = 'relevance' if rank_expression is not None else 'created_at'
+    if sort_by not in sort_columns:
+        sort_by = 'created_at'
+
+    order_column = sort_columns[sort_by]
+    descending = sort_order != 'asc' or sort_by == 'relevance'
 
     # === ПАГІНАЦІЯ ===
 
-    total = query.count()
-    offset = (page - 1) * limit
-    products = query.offset(offset).limit(limit).all()
+    if cursor is not None:
+        # Курсорний режим: без OFFSET та без точного COUNT на кожен запит.
+        # Значення курсора - той самий вираз, що в ORDER BY та умові курсора
+        page_query = query.add_columns(order_column.label('sort_value'))
+        rows, next_cursor = await keyset_paginate_async(
+            db, page_query, sort_by, order_column, Product.id, cursor, limit, descending,
+            value_getter=lambda row: row.sort_value,
+            id_getter=lambda row: row.Product.id
+        )
+        products = [row.Product for row in rows]
+        total = await cached_count(lambda: count_rows(db, query), "products", {
+            "category": category, "product_type": product_type,
+            "min_price": min_price, "max_price": max_price, "is_free": is_free,
+            "is_featured": is_featured, "is_new": is_new, "has_discount": has_discount,
+            "search": search, "tags": tag_slugs, "tags_mode": tags_mode
+        })
+        pagination = cursor_pagination_info(limit, next_cursor, total)
+    else:
+        if descending:
+            query = query.order_by(desc(order_column), desc(Product.id))
+        else:
+            query = query.order_by(asc(order_column), asc(Product.id))
+
+        total = await count_rows(db, query)
+        offset = (page - 1) * limit
+        products = (await db.execute(query.offset(offset).limit(limit))).scalars().all()
+
+        total_pages = (total + limit - 1) // limit
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
 
     # === ФОРМУВАННЯ ВІДПОВІДІ ===
     user_collections_products = {}
+    entitlements = None
+    purchased_ids = set()
     if current_user:
-        user_collections = db.query(Collection).filter(Collection.user_id == current_user.id).all()
-        for coll in user_collections:
-            for prod in coll.products:
-                if prod.id not in user_collections_products:
-                    user_collections_products[prod.id] = coll.icon
+        user_collections_products = await collection_service.get_collection_icons(
+            db, current_user.id, [p.id for p in products]
+        )
+        # Куплені товари сторінки - одна перевірка по кешованому запису
+        entitlements = await entitlement_service.get(db, current_user.id)
+        purchased_ids = entitlements.owned(p.id for p in products)
 
     products_data = []
     for product in products:
@@ -170,31 +220,27 @@ async def get_products(
             "preview_images": product.preview_images or [],
             "rating": product.rating,
             "ratings_count": product.ratings_count,
-            "downloads_count": product.downloads_count,
+            "downloads_count": counter_service.live(product, "downloads_count"),
             "tags": product.tags or [],
             "requires_subscription": product.requires_subscription,
             "file_size": product.file_size,
             "created_at": product.created_at.isoformat(),
-            "collection_icon": user_collections_products.get(product.id, "🤍")
+            "collection_icon": user_collections_products.get(product.id, "🤍"),
+            "is_purchased": product.id in purchased_ids,
+            "can_download": product.can_download(entitlements) if entitlements else product.is_free()
         }
         products_data.append(product_data)
 
-    total_pages = (total + limit - 1) // limit
     return {
         "products": products_data,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
-        },
+        "pagination": pagination,
         "filters_applied": {
             "category": category,
             "product_type": product_type,
             "search": search,
-            "tags": tags
+            "tags": tags,
+            "tags_mode": tags_mode,
+            "sort_by": sort_by
         }
     }
 
@@ -203,25 +249,36 @@ async def get_products(
 async def get_product(
         product_id: int,
         language: str = Query("en", description="Мова: en, ua, ru"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Optional[CurrentUser] = Depends(get_optional_current_user_async)
 ):
     """
     Отримати детальну інформацію про продукт
     """
-    product = db.query(Product).filter(
-        Product.id == product_id,
-        Product.is_active == True,
-        Product.is_approved == True
-    ).first()
+    result = await db.execute(
+        select(Product).options(selectinload(Product.creator)).where(
+            Product.id == product_id,
+            Product.is_active == True,
+            Product.is_approved == True
+        )
+    )
+    product = result.scalars().first()
 
     if not product:
         raise HTTPException(status_code=404, detail="Продукт не знайдено")
 
-    product.views_count += 1
-    db.commit()
+    # Запис у БД - пакетом у фоні (counter_service), без блокування рядка товару
+    counter_service.increment(product.id, "views_count")
 
     can_download = product.is_free()
-    is_purchased = False # Тут буде логіка перевірки покупок
+    is_purchased = False
+    if current_user:
+        if current_user.is_admin or product.creator_id == current_user.id:
+            can_download = True
+        else:
+            entitlements = await entitlement_service.get(db, current_user.id)
+            is_purchased = entitlements.owns(product.id)
+            can_download = product.can_download(entitlements)
 
     creator_info = None
     if product.creator:
@@ -249,8 +306,8 @@ async def get_product(
         "preview_images": product.preview_images or [],
         "rating": product.rating,
         "ratings_count": product.ratings_count,
-        "downloads_count": product.downloads_count,
-        "views_count": product.views_count,
+        "downloads_count": counter_service.live(product, "downloads_count"),
+        "views_count": counter_service.live(product, "views_count"),
         "tags": product.tags or [],
         "requires_subscription": product.requires_subscription,
         "file_size": product.file_size,
@@ -265,44 +322,12 @@ async def get_product(
 @router.get("/featured/home", response_model=Dict)
 async def get_home_products(
         language: str = Query("en"),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Отримати продукти для головної сторінки
     """
-    new_products = db.query(Product).filter(
-        Product.is_active == True, Product.is_approved == True, Product.is_new == True
-    ).order_by(desc(Product.created_at)).limit(8).all()
-
-    featured_products = db.query(Product).filter(
-        Product.is_active == True, Product.is_approved == True, Product.is_featured == True
-    ).order_by(desc(Product.downloads_count)).limit(8).all()
-
-    product_of_week = db.query(Product).filter(
-        Product.is_active == True, Product.is_approved == True,
-        Product.discount_percent > 0,
-        Product.discount_ends_at > datetime.utcnow()
-    ).order_by(desc(Product.discount_percent)).first()
-
-    def format_product_short(p):
-        if not p: return None
-        return {
-            "id": p.id,
-            "sku": p.sku,
-            "title": p.get_title(language),
-            "price": p.price,
-            "current_price": p.get_current_price(),
-            "discount_percent": p.discount_percent if p.discount_ends_at and p.discount_ends_at > datetime.utcnow() else 0,
-            "preview_images": p.preview_images or [],
-            "rating": p.rating,
-            "is_free": p.is_free()
-        }
-
-    return {
-        "new_products": [format_product_short(p) for p in new_products],
-        "featured_products": [format_product_short(p) for p in featured_products],
-        "product_of_week": format_product_short(product_of_week)
-    }
+    return await home_feed_service.get_home_feed(db, language)
 
 
 @router.post("/{product_id}/favorite")
@@ -358,50 +383,52 @@ async def get_user_favorites(
 @router.get("/user/downloads")
 async def get_user_downloads(
         language: str = Query("uk"),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        source: Optional[str] = Query(None, description="Джерело: free, purchased, subscription (порожньо - всі)"),
+        cursor: Optional[str] = Query(None, description="Курсор наступної сторінки"),
+        limit: int = Query(20, ge=1, le=100, description="Кількість товарів на сторінці"),
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Отримати всі товари, доступні користувачу для завантаження.
+    Бібліотека користувача: безкоштовні, куплені та доступні по підписці товари.
+    Спочатку нещодавно куплені / додані; курсорна пагінація.
     """
-    downloads = {
-        "free": [],
-        "purchased": [],
-        "subscription": []
-    }
+    if source is not None and source not in LIBRARY_SOURCES:
+        raise HTTPException(status_code=400, detail="Невідоме джерело: free, purchased або subscription")
 
-    # 1. Знаходимо всі безкоштовні товари
-    free_products = db.query(Product).filter(Product.is_active == True, Product.price == 0).all()
-    for p in free_products:
-        downloads["free"].append({
-            "id": p.id,
-            "title": p.get_title(language),
-            "description": p.get_description(language),
-            "preview_image": p.preview_images[0] if p.preview_images else None
-        })
+    entitlements = await entitlement_service.get(db, current_user.id)
+    return await library_service.get_page(db, current_user.id, entitlements, source, cursor, limit, language)
 
-    # 2. TODO: Знаходимо всі куплені товари
-    # 3. TODO: Знаходимо товари, доступні по підписці
 
-    return downloads
+async def _user_can_download(db: AsyncSession, user: CurrentUser, product: Product) -> bool:
+    """
+    Чи має користувач доступ до архіву товару
+    """
+    if product.is_free() or user.is_admin or product.creator_id == user.id:
+        return True
+
+    return product.can_download(await entitlement_service.get(db, user.id))
 
 
 @router.get("/{product_id}/download")
 async def download_product_archive(
     product_id: int,
+    request: Request,
     via_bot: bool = False,
     language: str = Query("uk"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_active_user_async)
 ):
     """
     Надає файл архіву для завантаження або відправляє його через бота.
+    Підтримується докачка (Range / If-Range / ETag); сам файл може віддавати nginx.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Товар не знайдено")
 
-    # TODO: Додайте тут логіку перевірки, чи користувач купив цей товар
+    if not await _user_can_download(db, current_user, product):
+        raise HTTPException(status_code=403, detail="Немає доступу до цього товару")
 
     file_path = os.path.join("/app", product.file_url.lstrip('/'))
     if not os.path.exists(file_path):
@@ -415,14 +442,15 @@ async def download_product_archive(
             language=language
         )
         if success:
-            product.downloads_count += 1
-            db.commit()
+            counter_service.increment(product.id, "downloads_count")
             return {"success": True, "message": f"Архів '{product.get_title(language)}' було відправлено вам в особисті повідомлення."}
         else:
             raise HTTPException(status_code=500, detail="Не вдалося відправити архів. Можливо, ви не запустили бота або заблокували його.")
 
-    product.downloads_count += 1
-    db.commit()
-    filename = os.path.basename(file_path)
-    headers = {"Content-Disposition": f"attachment; filename=\"{filename}\""}
-    return FileResponse(path=file_path, media_type='application/octet-stream', headers=headers)
\ No newline at end of file
+    # Докачка не рахується як нове завантаження
+    if download_service.is_initial_request(request):
+        counter_service.increment(product.id, "downloads_count")
+
+    extension = os.path.splitext(file_path)[1]
+    filename = f"{product.sku}{extension}"
+    return download_service.build_response(request, product.file_url, file_path, filename)
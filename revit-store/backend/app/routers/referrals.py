@@ -2,15 +2,24 @@
 Роутер для реферальної системи
 """
 import os
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import Date, cast, func, select, text
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User
 from app.models.order import Order
-from app.routers.auth import get_current_active_user
+from app.routers.auth import (
+    get_current_active_user_async,
+    get_optional_current_user_async,
+    REFERRAL_REGISTRATION_BONUS
+)
+from app.services.identity_service import CurrentUser
+from app.services.leaderboard_service import leaderboard_service
+from app.utils.pagination import keyset_paginate_async, count_rows, cached_count, cursor_pagination_info
 
 # Створюємо роутер
 router = APIRouter(
@@ -18,27 +27,29 @@ router = APIRouter(
     tags=["Referrals"]
 )
 
-# Константи реферальної системи
-REFERRAL_REGISTRATION_BONUS = 30  # Бонусів за реєстрацію
-REFERRAL_PURCHASE_PERCENT = 5  # Відсоток від покупок
+# Константи реферальної системи (бонус за реєстрацію - REFERRAL_REGISTRATION_BONUS з auth,
+# де він і нараховується)
+REFERRAL_PURCHASE_PERCENT = int(os.getenv("REFERRAL_PURCHASE_PERCENT", "5"))  # Відсоток від покупок
 
 
 @router.get("/info")
 async def get_referral_info(
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати інформацію про реферальну програму користувача
     """
-    # Отримуємо рефералів
-    referrals = db.query(User).filter(
-        User.referred_by_id == current_user.id
-    ).all()
-
-    # Рахуємо статистику
-    total_referrals = len(referrals)
-    active_referrals = sum(1 for r in referrals if r.total_spent > 0)
+    # Рахуємо статистику одним агрегатом (без завантаження рефералів)
+    stats = (await db.execute(
+        select(
+            func.count(User.id).label('total'),
+            func.count(User.id).filter(User.total_spent > 0).label('active')
+        ).where(
+            User.referred_by_id == current_user.id
+        )
+    )).first()
+    current_user = await current_user.load()
 
     # Формуємо посилання
     bot_username = os.getenv("TELEGRAM_BOT_USERNAME", "OhMyRevitBot")
@@ -47,8 +58,8 @@ async def get_referral_info(
     return {
         "referral_code": current_user.referral_code,
         "referral_link": referral_link,
-        "total_referrals": total_referrals,
-        "active_referrals": active_referrals,
+        "total_referrals": stats.total,
+        "active_referrals": stats.active,
         "total_earned": current_user.referral_earnings,
         "registration_bonus": REFERRAL_REGISTRATION_BONUS,
         "purchase_percent": REFERRAL_PURCHASE_PERCENT
@@ -59,24 +70,37 @@ async def get_referral_info(
 async def get_referrals_list(
         page: int = 1,
         limit: int = 20,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = None,
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати список рефералів
+
+    cursor: курсор наступної сторінки (порожній рядок - перша сторінка курсорного режиму)
     """
-    offset = (page - 1) * limit
+    query = select(User).where(User.referred_by_id == current_user.id)
 
     # Отримуємо рефералів
-    referrals = db.query(User).filter(
-        User.referred_by_id == current_user.id
-    ).order_by(
-        User.created_at.desc()
-    ).offset(offset).limit(limit).all()
-
-    total = db.query(User).filter(
-        User.referred_by_id == current_user.id
-    ).count()
+    if cursor is not None:
+        referrals, next_cursor = await keyset_paginate_async(
+            db, query, "created_at", User.created_at, User.id, cursor, limit
+        )
+        total = await cached_count(lambda: count_rows(db, query), "referrals", {"user_id": current_user.id})
+        pagination = cursor_pagination_info(limit, next_cursor, total)
+    else:
+        offset = (page - 1) * limit
+        referrals = (await db.execute(
+            query.order_by(User.created_at.desc()).offset(offset).limit(limit)
+        )).scalars().all()
+
+        total = await count_rows(db, query)
+        pagination = {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "total_pages": (total + limit - 1) // limit
+        }
 
     # Формуємо список
     referrals_data = []
@@ -103,20 +127,15 @@ async def get_referrals_list(
 
     return {
         "referrals": referrals_data,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "total_pages": (total + limit - 1) // limit
-        }
+        "pagination": pagination
     }
 
 
 @router.get("/earnings")
 async def get_referral_earnings(
         period: str = "all",  # all, month, week
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати детальну статистику заробітку з рефералів
@@ -128,98 +147,99 @@ async def get_referral_earnings(
     elif period == "month":
         date_from = datetime.utcnow() - timedelta(days=30)
 
-    # Базовий запит для рефералів
-    query = db.query(User).filter(User.referred_by_id == current_user.id)
-
+    filters = [User.referred_by_id == current_user.id]
     if date_from:
-        query = query.filter(User.created_at >= date_from)
-
-    referrals = query.all()
+        filters.append(User.created_at >= date_from)
 
-    # Рахуємо заробіток
-    registration_bonuses = len(referrals) * REFERRAL_REGISTRATION_BONUS
+    purchase_earnings_expr = func.coalesce(
+        func.sum(func.coalesce(User.total_spent, 0) * REFERRAL_PURCHASE_PERCENT // 100), 0
+    )
 
-    # Заробіток з покупок
-    purchase_earnings = 0
-    for referral in referrals:
-        if referral.total_spent > 0:
-            purchase_earnings += int(referral.total_spent * REFERRAL_PURCHASE_PERCENT / 100)
-
-    # Статистика по днях (для графіка)
     daily_stats = []
     if period in ["week", "month"]:
         days = 7 if period == "week" else 30
-
-        for i in range(days):
-            date = (datetime.utcnow() - timedelta(days=days - i - 1)).date()
-
-            # Рахуємо реєстрації за день
-            day_registrations = sum(
-                1 for r in referrals
-                if r.created_at.date() == date
-            )
-
+        today = datetime.utcnow().date()
+
+        # Реєстрації та заробіток по днях, дні без реєстрацій - з generate_series,
+        # підсумки - віконними сумами в тому ж запиті
+        registration_day = cast(User.created_at, Date)
+        refs = select(
+            registration_day.label('day'),
+            func.count(User.id).label('registrations'),
+            purchase_earnings_expr.label('purchase_earnings')
+        ).where(*filters).group_by(registration_day).cte('refs')
+
+        series = select(
+            cast(func.generate_series(today - timedelta(days=days - 1), today, text("interval '1 day'")), Date).label('day')
+        ).cte('series')
+
+        rows = (await db.execute(
+            select(
+                series.c.day,
+                refs.c.registrations,
+                func.sum(refs.c.registrations).over().label('total_registrations'),
+                func.sum(refs.c.purchase_earnings).over().label('total_purchase_earnings')
+            ).select_from(series).join(
+                refs, refs.c.day == series.c.day, full=True
+            ).order_by(series.c.day)
+        )).all()
+
+        referrals_count = int(rows[0].total_registrations or 0) if rows else 0
+        purchase_earnings = int(rows[0].total_purchase_earnings or 0) if rows else 0
+
+        for row in rows:
+            # Реєстрації до початку графіка (частина першої доби періоду)
+            if row.day is None:
+                continue
+            day_registrations = row.registrations or 0
             daily_stats.append({
-                "date": date.isoformat(),
+                "date": row.day.isoformat(),
                 "registrations": day_registrations,
                 "earned": day_registrations * REFERRAL_REGISTRATION_BONUS
             })
+    else:
+        totals = (await db.execute(
+            select(
+                func.count(User.id).label('registrations'),
+                purchase_earnings_expr.label('purchase_earnings')
+            ).where(*filters)
+        )).first()
+
+        referrals_count = totals.registrations
+        purchase_earnings = int(totals.purchase_earnings)
+
+    registration_bonuses = referrals_count * REFERRAL_REGISTRATION_BONUS
 
     return {
         "period": period,
         "total_earned": registration_bonuses + purchase_earnings,
         "registration_bonuses": registration_bonuses,
         "purchase_earnings": purchase_earnings,
-        "referrals_count": len(referrals),
+        "referrals_count": referrals_count,
         "daily_stats": daily_stats
     }
 
 
 @router.get("/leaderboard")
 async def get_referral_leaderboard(
-        limit: int = 10,
-        db: Session = Depends(get_db)
+        limit: int = Query(10, ge=1, le=100),
+        current_user: Optional[CurrentUser] = Depends(get_optional_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
-    Отримати топ користувачів по рефералах
+    Отримати топ користувачів по кількості рефералів
+    (рейтинг leaderboard_service) та позицію поточного користувача
     """
-    # Запит з підрахунком рефералів
-    leaderboard = db.query(
-        User.id,
-        User.username,
-        User.first_name,
-        User.referral_earnings,
-        db.func.count(User.id).label('referrals_count')
-    ).outerjoin(
-        User, User.referred_by_id == User.id
-    ).group_by(
-        User.id, User.username, User.first_name, User.referral_earnings
-    ).order_by(
-        db.desc(User.referral_earnings)
-    ).limit(limit).all()
-
-    leaders = []
-    for idx, entry in enumerate(leaderboard, 1):
-        leaders.append({
-            "position": idx,
-            "user_id": entry.id,
-            "username": entry.username or f"User_{entry.id}",
-            "first_name": entry.first_name,
-            "total_earned": entry.referral_earnings,
-            "referrals_count": entry.referrals_count
-        })
-
-    return {
-        "leaderboard": leaders,
-        "updated_at": datetime.utcnow().isoformat()
-    }
+    result = await leaderboard_service.referrals(db, limit, current_user.id if current_user else None)
+    result["updated_at"] = datetime.utcnow().isoformat()
+    return result
 
 
 @router.post("/share")
 async def track_referral_share(
         platform: str,  # telegram, whatsapp, instagram, etc.
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        current_user: CurrentUser = Depends(get_current_active_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Відстежити поділення реферального посилання
@@ -237,7 +257,7 @@ async def track_referral_share(
 @router.post("/process-purchase-bonus")
 async def process_referral_purchase_bonus(
         order_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Нарахувати бонуси рефереру за покупку реферала
@@ -245,10 +265,12 @@ async def process_referral_purchase_bonus(
     Цей ендпоінт викликається автоматично після успішної оплати замовлення
     """
     # Знаходимо замовлення
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.status == "completed"
-    ).first()
+    order = (await db.execute(
+        select(Order).where(
+            Order.id == order_id,
+            Order.status == "completed"
+        ).options(selectinload(Order.user))
+    )).scalars().first()
 
     if not order:
         raise HTTPException(status_code=404, detail="Замовлення не знайдено")
@@ -259,7 +281,7 @@ async def process_referral_purchase_bonus(
         return {"success": False, "message": "Користувач не має реферера"}
 
     # Знаходимо реферера
-    referrer = db.query(User).filter(User.id == user.referred_by_id).first()
+    referrer = await db.get(User, user.referred_by_id)
 
     if not referrer:
         return {"success": False, "message": "Реферер не знайдений"}
@@ -273,7 +295,7 @@ async def process_referral_purchase_bonus(
 
         # TODO: Можна додати запис в історію транзакцій
 
-        db.commit()
+        await db.commit()
 
         return {
             "success": True,
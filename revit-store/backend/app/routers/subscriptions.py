@@ -3,17 +3,21 @@
 """
 
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db
 from app.models.user import User
 from app.models.subscription import Subscription, SubscriptionHistory
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user_async, get_current_user_for_update_async
+from app.services.entitlement_service import entitlement_service
+from app.services.identity_service import CurrentUser
 from app.services.payment_service import PaymentService
+from app.services.rollup_service import rollup_service
 from app.utils.security import generate_order_number
 
 load_dotenv()
@@ -66,7 +70,8 @@ SUBSCRIPTION_PLANS = {
 @router.get("/plans")
 async def get_subscription_plans(
     language: str = "en",
-    current_user: Optional[User] = Depends(get_current_active_user)
+    current_user: Optional[CurrentUser] = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати доступні плани підписок
@@ -91,15 +96,7 @@ async def get_subscription_plans(
     # Перевіряємо чи є активна підписка
     active_subscription = None
     if current_user:
-        for sub in current_user.subscriptions:
-            if sub.is_valid():
-                active_subscription = {
-                    "plan_type": sub.plan_type,
-                    "expires_at": sub.expires_at.isoformat(),
-                    "days_remaining": sub.days_remaining(),
-                    "auto_renew": sub.auto_renew
-                }
-                break
+        active_subscription = (await entitlement_service.get(db, current_user.id)).subscription_summary()
 
     return {
         "plans": plans,
@@ -120,8 +117,8 @@ async def create_subscription(
     payment_method: str = "crypto",
     currency: str = "USDT",
     background_tasks: BackgroundTasks = BackgroundTasks(),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_for_update_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Створити нову підписку
@@ -141,18 +138,17 @@ async def create_subscription(
     plan = SUBSCRIPTION_PLANS[plan_type]
 
     # Перевіряємо чи немає активної підписки
-    for sub in current_user.subscriptions:
-        if sub.is_valid():
-            raise HTTPException(
-                status_code=400,
-                detail="У вас вже є активна підписка"
-            )
+    if (await entitlement_service.get(db, current_user.id)).has_active_subscription():
+        raise HTTPException(
+            status_code=400,
+            detail="У вас вже є активна підписка"
+        )
 
     # Створюємо підписку
     subscription = Subscription.create_subscription(current_user.id, plan_type)
     db.add(subscription)
-    db.commit()
-    db.refresh(subscription)
+    await db.commit()
+    await db.refresh(subscription)
 
     # Обробка оплати
     if payment_method == "bonuses":
@@ -179,7 +175,9 @@ async def create_subscription(
             details={"method": "bonuses", "amount": plan["price_cents"]}
         )
         db.add(history)
-        db.commit()
+        await db.run_sync(rollup_service.record_subscription_paid, subscription)
+        await db.commit()
+        await entitlement_service.invalidate(current_user.id)
 
         return {
             "success": True,
@@ -192,7 +190,7 @@ async def create_subscription(
         # Створюємо платіж через Cryptomus
         order_id = generate_order_number()
 
-        payment_data = payment_service.create_payment(
+        payment_data = await payment_service.create_payment(
             amount=plan["price_usd"],
             currency=currency,
             order_id=order_id,
@@ -205,14 +203,13 @@ async def create_subscription(
             # Зберігаємо payment_id
             subscription.payment_id = payment_data["payment_id"]
             subscription.payment_method = f"crypto_{currency}"
-            db.commit()
+            await db.commit()
 
-            # Плануємо перевірку статусу через 5 хвилин
+            # Плануємо перевірку статусу через 5 хвилин (власна сесія - сесія запиту вже закрита)
             background_tasks.add_task(
                 check_payment_status,
                 subscription.id,
-                payment_data["payment_id"],
-                db
+                payment_data["payment_id"]
             )
 
             return {
@@ -237,16 +234,18 @@ async def create_subscription(
 @router.post("/cancel/{subscription_id}")
 async def cancel_subscription(
     subscription_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Скасувати підписку (вимкнути автопродовження)
     """
-    subscription = db.query(Subscription).filter(
-        Subscription.id == subscription_id,
-        Subscription.user_id == current_user.id
-    ).first()
+    subscription = (await db.execute(
+        select(Subscription).where(
+            Subscription.id == subscription_id,
+            Subscription.user_id == current_user.id
+        )
+    )).scalars().first()
 
     if not subscription:
         raise HTTPException(status_code=404, detail="Підписка не знайдена")
@@ -267,7 +266,8 @@ async def cancel_subscription(
         details={"reason": "user_request"}
     )
     db.add(history)
-    db.commit()
+    await db.commit()
+    await entitlement_service.invalidate(current_user.id)
 
     return {
         "success": True,
@@ -277,15 +277,17 @@ async def cancel_subscription(
 
 @router.get("/history")
 async def get_subscription_history(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати історію підписок користувача
     """
-    subscriptions = db.query(Subscription).filter(
-        Subscription.user_id == current_user.id
-    ).order_by(Subscription.created_at.desc()).all()
+    subscriptions = (await db.execute(
+        select(Subscription).where(
+            Subscription.user_id == current_user.id
+        ).order_by(Subscription.created_at.desc())
+    )).scalars().all()
 
     history = []
     for sub in subscriptions:
@@ -312,7 +314,7 @@ async def get_subscription_history(
 @router.post("/webhook/cryptomus")
 async def cryptomus_webhook(
     request_data: Dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Webhook для обробки callback від Cryptomus
@@ -325,15 +327,18 @@ async def cryptomus_webhook(
     status = request_data.get("status")
 
     # Знаходимо підписку
-    subscription = db.query(Subscription).filter(
-        Subscription.payment_id == payment_id
-    ).first()
+    subscription = (await db.execute(
+        select(Subscription).where(Subscription.payment_id == payment_id)
+    )).scalars().first()
 
     if not subscription:
         return {"success": False, "error": "Subscription not found"}
 
     # Оновлюємо статус
     if status == "paid" or status == "confirmed":
+        # Webhook може прийти кілька разів (paid, потім confirmed) - рахуємо оплату один раз
+        if subscription.payment_status != "completed":
+            await db.run_sync(rollup_service.record_subscription_paid, subscription)
         subscription.payment_status = "completed"
         subscription.is_active = True
 
@@ -358,57 +363,56 @@ async def cryptomus_webhook(
         )
         db.add(history)
 
-    db.commit()
+    await db.commit()
+    await entitlement_service.invalidate(subscription.user_id)
 
     return {"success": True}
 
 
-async def check_payment_status(subscription_id: int, payment_id: str, db: Session):
+async def check_payment_status(subscription_id: int, payment_id: str):
     """
     Фонова задача для перевірки статусу платежу
     """
-    subscription = db.query(Subscription).filter(
-        Subscription.id == subscription_id
-    ).first()
+    # Перевіряємо статус через API Cryptomus - до відкриття сесії
+    status = await payment_service.check_payment_status(payment_id)
+    if status != "paid":
+        return
 
-    if subscription and subscription.payment_status == "pending":
-        # Перевіряємо статус через API Cryptomus
-        status = payment_service.check_payment_status(payment_id)
+    async with AsyncSessionLocal() as db:
+        subscription = await db.get(Subscription, subscription_id)
 
-        if status == "paid":
+        if subscription and subscription.payment_status == "pending":
             subscription.payment_status = "completed"
             subscription.is_active = True
-            db.commit()
+            await db.run_sync(rollup_service.record_subscription_paid, subscription)
+            await db.commit()
+            await entitlement_service.invalidate(subscription.user_id)
 
 
 @router.get("/benefits")
 async def get_subscription_benefits(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict:
     """
     Отримати поточні привілеї підписки
     """
-    active_subscription = None
-    for sub in current_user.subscriptions:
-        if sub.is_valid():
-            active_subscription = sub
-            break
-
-    if not active_subscription:
+    entitlements = await entitlement_service.get(db, current_user.id)
+    if not entitlements.has_active_subscription():
         return {
             "has_subscription": False,
             "benefits": None
         }
 
+    active_subscription = entitlements.subscription
     return {
         "has_subscription": True,
-        "plan_type": active_subscription.plan_type,
-        "expires_at": active_subscription.expires_at.isoformat(),
-        "days_remaining": active_subscription.days_remaining(),
+        "plan_type": active_subscription["plan_type"],
+        "expires_at": active_subscription["expires_at"],
+        "days_remaining": entitlements.days_remaining(),
         "benefits": {
-            "daily_spins_bonus": active_subscription.daily_spins_bonus,
-            "cashback_percent": active_subscription.cashback_percent,
-            "accessible_products": len(active_subscription.accessible_products or [])
+            "daily_spins_bonus": active_subscription["daily_spins_bonus"],
+            "cashback_percent": active_subscription["cashback_percent"],
+            "accessible_products": active_subscription["accessible_products"]
         }
     }
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Сервіс обліку посилань на файли медіа-сховища
+Файли зберігаються за вмістом (SHA-256), тому один файл може належати кільком товарам.
+Файл видаляється лише тоді, коли на нього не посилається жоден товар:
+delete_files перевіряє це повторно під блокуванням рядка media_blobs, а нові
+посилання (add_refs) чекають на це блокування.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.media import MediaBlob
+from app.models.product import Product
+from app.services.local_file_service import local_file_service
+
+
+class BlobService:
+    """
+    Лічильники посилань Product.file_url / Product.preview_images -> media_blobs
+    """
+
+    def product_paths(self, product: Product) -> List[str]:
+        """
+        Усі файли товару (архів та превʼю)
+        """
+        paths = [product.file_url] if product.file_url else []
+        paths.extend(url for url in (product.preview_images or []) if url)
+        return paths
+
+    def add_refs(self, db: Session, paths: Iterable[str], uploads: Optional[List[Dict]] = None) -> None:
+        """
+        Збільшити лічильники посилань (до commit)
+
+        Args:
+            db: Сесія БД
+            paths: Шляхи файлів, на які тепер посилається товар
+            uploads: Результати upload_file (щоб зберегти sha256 та розмір)
+        """
+        info = {u["file_url"]: u for u in uploads or [] if u.get("file_url")}
+        now = datetime.utcnow()
+
+        for path, count in Counter(paths).items():
+            upload = info.get(path, {})
+            db.execute(
+                insert(MediaBlob).values(
+                    path=path,
+                    sha256=upload.get("sha256"),
+                    size=upload.get("file_size"),
+                    ref_count=count,
+                    created_at=now,
+                    updated_at=now
+                ).on_conflict_do_update(
+                    index_elements=[MediaBlob.path],
+                    set_={"ref_count": MediaBlob.ref_count + count, "updated_at": now}
+                )
+            )
+
+    def release_refs(self, db: Session, paths: Iterable[str]) -> List[str]:
+        """
+        Зменшити лічильники посилань (до commit)
+
+        Returns:
+            Шляхи файлів, на які більше ніхто не посилається.
+            Їх потрібно передати в delete_files після commit.
+        """
+        counts = Counter(paths)
+        if not counts:
+            return []
+
+        for path, count in counts.items():
+            db.execute(
+                update(MediaBlob).where(MediaBlob.path == path).values(
+                    ref_count=MediaBlob.ref_count - count,
+                    updated_at=datetime.utcnow()
+                )
+            )
+
+        return self._collect_orphans(db, list(counts))
+
+    def replace_refs(self, db: Session, old_paths: Iterable[str], new_paths: Iterable[str],
+                     uploads: Optional[List[Dict]] = None) -> List[str]:
+        """
+        Перенести посилання товару зі старих файлів на нові
+
+        Returns:
+            Файли-сироти для delete_files
+        """
+        old_counts, new_counts = Counter(old_paths), Counter(new_paths)
+        self.add_refs(db, list((new_counts - old_counts).elements()), uploads)
+        return self.release_refs(db, list((old_counts - new_counts).elements()))
+
+    def _collect_orphans(self, db: Session, paths: List[str]) -> List[str]:
+        if not paths:
+            return []
+
+        referenced = set(db.execute(
+            select(MediaBlob.path).where(MediaBlob.path.in_(paths), MediaBlob.ref_count > 0)
+        ).scalars().all())
+        return [path for path in paths if path not in referenced]
+
+    def delete_files(self, db: Session, paths: Iterable[str]) -> int:
+        """
+        Видалити файли-сироти зі сховища (після commit, у власній транзакції).
+        Посилання перевіряються повторно під FOR UPDATE: якщо інший товар тим часом
+        послався на файл, він лишається. add_refs для того самого шляху чекає,
+        доки файл не видалено, і далі створює посилання заново (файл поверне publish_upload).
+
+        Returns:
+            Кількість видалених файлів
+        """
+        paths = sorted(set(paths))
+        if not paths:
+            return 0
+
+        # Рядок для кожного шляху, щоб було що блокувати (старі файли без обліку)
+        now = datetime.utcnow()
+        db.execute(insert(MediaBlob).values([
+            {"path": path, "ref_count": 0, "created_at": now, "updated_at": now} for path in paths
+        ]).on_conflict_do_nothing(index_elements=[MediaBlob.path]))
+
+        orphans = db.execute(
+            select(MediaBlob.path).where(
+                MediaBlob.path.in_(paths), MediaBlob.ref_count <= 0
+            ).order_by(MediaBlob.path).with_for_update()
+        ).scalars().all()
+
+        deleted = sum(1 for path in orphans if local_file_service.delete_file(path))
+        db.execute(delete(MediaBlob).where(MediaBlob.path.in_(orphans)))
+        db.commit()
+        return deleted
+
+
+# Створюємо глобальний екземпляр сервісу
+blob_service = BlobService()
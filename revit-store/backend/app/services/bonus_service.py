@@ -4,12 +4,14 @@
 
 import random
 from datetime import datetime, timedelta
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from app.models.user import User
 from app.models.subscription import DailyBonus, WheelSpin
+from app.services.leaderboard_service import leaderboard_service
 
 
 class BonusService:
@@ -95,13 +97,14 @@ class BonusService:
             return 1
 
     @classmethod
-    def claim_daily_bonus(cls, user: User, db: Session) -> Dict:
+    def claim_daily_bonus(cls, user: User, db: Session, has_subscription: bool = False) -> Dict:
         """
         Отримати щоденний бонус
 
         Args:
             user: Користувач
             db: Сесія БД
+            has_subscription: Чи є дійсна підписка (entitlement_service)
 
         Returns:
             Інформація про бонус
@@ -134,10 +137,8 @@ class BonusService:
         user.free_spins_today = 1  # Базовий 1 спін
 
         # Якщо є підписка - додаємо ще 2 спіни
-        for subscription in user.subscriptions:
-            if subscription.is_valid():
-                user.free_spins_today += 2
-                break
+        if has_subscription:
+            user.free_spins_today += 2
 
         db.commit()
 
@@ -284,41 +285,16 @@ class BonusService:
         }
 
     @staticmethod
-    def get_leaderboard(db: Session, limit: int = 10) -> list:
+    async def get_leaderboard(db: Union[Session, AsyncSession], limit: int = 10, user_id: Optional[int] = None) -> Dict:
         """
-        Отримати топ користувачів по виграшах
+        Отримати топ користувачів по виграшах (рейтинг leaderboard_service)
 
         Args:
             db: Сесія БД
             limit: Кількість користувачів
+            user_id: Поточний користувач (для його позиції)
 
         Returns:
-            Список лідерів
+            Список лідерів та позиція користувача
         """
-        # Запит з групуванням по користувачах
-        leaderboard = db.query(
-            WheelSpin.user_id,
-            func.sum(WheelSpin.prize).label('total_won'),
-            func.count(WheelSpin.id).label('total_spins')
-        ).filter(
-            WheelSpin.prize > 0
-        ).group_by(
-            WheelSpin.user_id
-        ).order_by(
-            db.desc('total_won')
-        ).limit(limit).all()
-
-        # Отримуємо інформацію про користувачів
-        result = []
-        for entry in leaderboard:
-            user = db.query(User).filter(User.id == entry.user_id).first()
-            if user:
-                result.append({
-                    "user_id": user.id,
-                    "username": user.username or f"User_{user.telegram_id}",
-                    "first_name": user.first_name,
-                    "total_won": entry.total_won,
-                    "total_spins": entry.total_spins
-                })
-
-        return result
\ No newline at end of file
+        return await leaderboard_service.wheel(db, limit, user_id)
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Сервіс масових розсилок через Telegram
+Паралельна відправка з обмеженням швидкості та збереженням прогресу в БД
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_, true, update
+
+from app.database import AsyncSessionLocal
+from app.models.broadcast import BroadcastJob
+
+# Глобальний ліміт Telegram - ~30 повідомлень/сек, залишаємо запас
+BROADCAST_RATE = float(os.getenv("TELEGRAM_BROADCAST_RATE", "25"))
+# Скільки запитів до Telegram може бути "в польоті" одночасно
+BROADCAST_CONCURRENCY = int(os.getenv("TELEGRAM_BROADCAST_CONCURRENCY", "10"))
+# Не частіше одного повідомлення в секунду в один чат
+PER_CHAT_INTERVAL = 1.0
+# Повторні спроби для 429, 5xx та мережевих помилок
+MAX_RETRIES = 3
+MAX_BACKOFF = 30
+# Як часто зберігати прогрес у БД (сек)
+PROGRESS_INTERVAL = 2.0
+# Задача без збереження прогресу довше цього (сек) вважається перерваною
+# (рестарт / деплой сервера посеред розсилки)
+BROADCAST_STALE_AFTER = int(os.getenv("BROADCAST_STALE_AFTER", "120"))
+UNFINISHED_STATUSES = ("pending", "running")
+INTERRUPTED_ERROR = "Розсилку перервано перезапуском сервера"
+
+
+class TokenBucket:
+    """
+    Token bucket для глобального ліміту швидкості.
+    pause() зупиняє видачу токенів (429 з retry_after від Telegram).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastEngine:
+    """
+    Відправка одного повідомлення списку користувачів
+    з обмеженою паралельністю та лімітами Telegram
+    """
+
+    def __init__(
+            self,
+            bot,
+            rate: float = BROADCAST_RATE,
+            concurrency: int = BROADCAST_CONCURRENCY,
+            max_retries: int = MAX_RETRIES,
+            on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.on_progress = on_progress
+        self.stats = {"total": 0, "sent": 0, "failed": 0, "retries": 0}
+        self._chat_next_at: Dict[int, float] = {}
+
+    async def _wait_chat(self, telegram_id: int) -> None:
+        delay = self._chat_next_at.get(telegram_id, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send_one(self, telegram_id: int, message: str, parse_mode: str) -> bool:
+        """
+        Відправити повідомлення в один чат з повторними спробами
+        """
+        attempt = 0
+        while True:
+            await self._wait_chat(telegram_id)
+            await self.bucket.acquire()
+            response = await self.bot.send_message_response(telegram_id, message, parse_mode)
+            self._chat_next_at[telegram_id] = time.monotonic() + PER_CHAT_INTERVAL
+
+            if response and response.get("ok"):
+                return True
+
+            error_code = response.get("error_code") if response else None
+            # 400/403 (чат не знайдено, бота заблоковано) - повторювати немає сенсу
+            retryable = response is None or error_code == 429 or (error_code or 0) >= 500
+            if not retryable or attempt >= self.max_retries:
+                return False
+
+            attempt += 1
+            self.stats["retries"] += 1
+
+            retry_after = ((response or {}).get("parameters") or {}).get("retry_after")
+            if error_code == 429 and retry_after:
+                # Ліміт перевищено для всього бота - зупиняємо всіх воркерів
+                self.bucket.pause(retry_after)
+                await asyncio.sleep(retry_after)
+            else:
+                await asyncio.sleep(min(2 ** attempt, MAX_BACKOFF))
+
+    async def _report_progress(self, done: asyncio.Event) -> None:
+        # Зупиняємось лише між збереженнями, щоб не перервати commit
+        while not done.is_set():
+            try:
+                await asyncio.wait_for(done.wait(), PROGRESS_INTERVAL)
+            except asyncio.TimeoutError:
+                await self.on_progress(dict(self.stats))
+
+    async def run(self, telegram_ids: List[int], message: str, parse_mode: str = "HTML") -> Dict:
+        """
+        Розіслати повідомлення
+
+        Args:
+            telegram_ids: Отримувачі (дублікати відкидаються)
+            message: Текст повідомлення
+            parse_mode: Режим форматування
+
+        Returns:
+            {"total", "sent", "failed", "retries"}
+        """
+        telegram_ids = list(dict.fromkeys(telegram_ids))
+        self.stats["total"] = len(telegram_ids)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for telegram_id in telegram_ids:
+            queue.put_nowait(telegram_id)
+
+        async def worker():
+            while True:
+                try:
+                    telegram_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if await self._send_one(telegram_id, message, parse_mode):
+                    self.stats["sent"] += 1
+                else:
+                    self.stats["failed"] += 1
+
+        done = asyncio.Event()
+        reporter = asyncio.create_task(self._report_progress(done)) if self.on_progress else None
+        try:
+            await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(telegram_ids)))])
+        finally:
+            done.set()
+            if reporter:
+                await reporter
+
+        return dict(self.stats)
+
+
+class BroadcastService:
+    """
+    Фонові задачі розсилки з прогресом у таблиці broadcast_jobs
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def start_job(self, job_id: int, telegram_ids: List[int]) -> None:
+        """
+        Запустити розсилку у фоні. Задача BroadcastJob вже повинна бути в БД.
+        """
+        task = asyncio.create_task(self._run_job(job_id, telegram_ids))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def is_running(self, job_id: int) -> bool:
+        """Чи виконується задача в цьому процесі"""
+        return job_id in self._tasks
+
+    def _stale_before(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=BROADCAST_STALE_AFTER)
+
+    def is_stale(self, job: BroadcastJob) -> bool:
+        """
+        Незавершена задача, яку ніхто не виконує: немає задачі в цьому процесі
+        і прогрес не зберігався довше BROADCAST_STALE_AFTER (інші воркери)
+        """
+        if job.status not in UNFINISHED_STATUSES or self.is_running(job.id):
+            return False
+        last_seen = job.heartbeat_at or job.started_at or job.created_at
+        return last_seen is None or last_seen < self._stale_before()
+
+    def mark_interrupted(self, job: BroadcastJob) -> None:
+        """
+        Позначити задачу перерваною (без commit). Відправлене не повторюється -
+        список отримувачів не зберігається, тож продовжити розсилку неможливо
+        """
+        job.status = "interrupted"
+        job.error = INTERRUPTED_ERROR
+        job.finished_at = datetime.utcnow()
+
+    async def fail_stale_jobs(self) -> int:
+        """
+        При старті: закрити незавершені задачі, перервані рестартом / деплоєм.
+        Задачі, які ще виконує інший воркер, мають свіжий heartbeat_at і не зачіпаються.
+
+        Returns:
+            Кількість перерваних задач
+        """
+        last_seen = func.coalesce(BroadcastJob.heartbeat_at, BroadcastJob.started_at, BroadcastJob.created_at)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(BroadcastJob).where(
+                    BroadcastJob.status.in_(UNFINISHED_STATUSES),
+                    or_(last_seen == None, last_seen < self._stale_before()),
+                    BroadcastJob.id.notin_(list(self._tasks)) if self._tasks else true()
+                ).values(
+                    status="interrupted",
+                    error=INTERRUPTED_ERROR,
+                    finished_at=datetime.utcnow()
+                )
+            )
+            await db.commit()
+        return result.rowcount
+
+    async def _run_job(self, job_id: int, telegram_ids: List[int]) -> None:
+        from app.services.telegram_bot import bot_service
+
+        async with AsyncSessionLocal() as db:
+            job = await db.get(BroadcastJob, job_id)
+            if job is None:
+                return
+
+            job.status = "running"
+            job.started_at = job.heartbeat_at = datetime.utcnow()
+            job.total = len(set(telegram_ids))
+            await db.commit()
+
+            async def save_progress(stats: Dict) -> None:
+                job.sent = stats["sent"]
+                job.failed = stats["failed"]
+                job.retries = stats["retries"]
+                job.heartbeat_at = datetime.utcnow()
+                await db.commit()
+
+            try:
+                engine = BroadcastEngine(bot_service, on_progress=save_progress)
+                stats = await engine.run(telegram_ids, job.message, job.parse_mode or "HTML")
+                job.sent = stats["sent"]
+                job.failed = stats["failed"]
+                job.retries = stats["retries"]
+                job.status = "completed"
+            except Exception as e:
+                print(f"❌ Помилка розсилки #{job_id}: {e}")
+                job.status = "failed"
+                job.error = str(e)
+
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+
+
+# Створюємо глобальний екземпляр сервісу
+broadcast_service = BroadcastService()
@@ -0,0 +1,364 @@
+"""
+Сервіс кешування для OhMyRevit
+Redis (з docker-compose) для дорогих, але рідко змінюваних даних,
+з in-process кешем як запасним варіантом, якщо Redis недоступний
+"""
+
+import asyncio
+import bisect
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - redis є в requirements.txt
+    aioredis = None
+    RedisError = Exception
+
+
+class LocalSortedSet:
+    """
+    Запасний sorted set у пам'яті процесу: член -> рахунок
+    плюс відсортований список для рангу за O(log n)
+    """
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self._order: List[Tuple[float, str]] = []  # (-score, member) - за спаданням рахунку
+
+    def incr(self, member: str, amount: float) -> float:
+        old = self.scores.get(member)
+        if old is not None:
+            del self._order[bisect.bisect_left(self._order, (-old, member))]
+        score = (old or 0) + amount
+        self.scores[member] = score
+        bisect.insort(self._order, (-score, member))
+        return score
+
+    def rank(self, member: str) -> Optional[int]:
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._order, (-score, member))
+
+    def top(self, start: int, stop: int) -> List[Tuple[str, float]]:
+        return [(member, -score) for score, member in self._order[start:stop + 1]]
+
+
+class CacheService:
+    """
+    Кеш з TTL: Redis, а при його недоступності - пам'ять процесу (LRU).
+    Значення повинні бути JSON-серіалізовані.
+    """
+
+    # Скільки секунд не звертатись до Redis після помилки з'єднання
+    REDIS_RETRY_INTERVAL = 30
+    # Час життя блокування перебудови значення (захист від stampede)
+    LOCK_TTL = 10
+    LOCK_POLL_INTERVAL = 0.05
+
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self._store: "OrderedDict[str, tuple]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._sorted_sets: Dict[str, LocalSortedSet] = {}
+
+        self.redis_host = os.getenv("REDIS_HOST")
+        self.redis_port = int(os.getenv("REDIS_PORT", "6379"))
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+    # ====== REDIS ======
+
+    def _get_redis(self):
+        """
+        Отримати клієнт Redis або None, якщо він не налаштований / недоступний
+        """
+        if aioredis is None or not self.redis_host:
+            return None
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.Redis(
+                host=self.redis_host,
+                port=self.redis_port,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        print(f"⚠️ Redis недоступний, використовуємо локальний кеш: {error}")
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
+
+    # ====== ЛОКАЛЬНИЙ КЕШ ======
+
+    def _local_get(self, key: str) -> Optional[Any]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._store.pop(key, None)
+            return None
+
+        self._store.move_to_end(key)
+        return value
+
+    def _local_set(self, key: str, value: Any, ttl: Optional[int]) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._store[key] = (value, expires_at)
+        self._store.move_to_end(key)
+
+        while len(self._store) > self.max_items:
+            self._store.popitem(last=False)
+
+    # ====== ПУБЛІЧНИЙ API ======
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Отримати значення з кешу
+
+        Args:
+            key: Ключ
+
+        Returns:
+            Значення або None якщо немає / прострочене
+        """
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(key)
+                return json.loads(raw) if raw is not None else None
+            except RedisError as e:
+                self._redis_failed(e)
+
+        return self._local_get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """
+        Зберегти значення в кеш
+
+        Args:
+            key: Ключ
+            value: Значення
+            ttl: Час життя в секундах (None - без обмеження)
+        """
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.set(key, json.dumps(value, default=str), ex=ttl or None)
+                return
+            except RedisError as e:
+                self._redis_failed(e)
+
+        self._local_set(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        """
+        Видалити ключі з кешу
+        """
+        for key in keys:
+            self._store.pop(key, None)
+
+        redis = self._get_redis()
+        if redis is not None and keys:
+            try:
+                await redis.delete(*keys)
+            except RedisError as e:
+                self._redis_failed(e)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        """
+        Видалити всі ключі, що починаються з prefix
+        """
+        for key in [k for k in self._store if k.startswith(prefix)]:
+            self._store.pop(key, None)
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                keys = [key async for key in redis.scan_iter(match=f"{prefix}*")]
+                if keys:
+                    await redis.delete(*keys)
+            except RedisError as e:
+                self._redis_failed(e)
+
+    async def get_or_set(
+            self,
+            key: str,
+            builder: Callable[[], Union[Any, Awaitable[Any]]],
+            ttl: Optional[int] = None
+    ) -> Any:
+        """
+        Отримати значення або побудувати його, якщо кеш порожній.
+        Одночасно перебудовує значення лише один запит: в межах процесу -
+        через asyncio.Lock, між воркерами - через блокування в Redis.
+        Решта чекають на готове значення.
+
+        Args:
+            key: Ключ
+            builder: Функція (sync або async), що будує значення
+            ttl: Час життя в секундах
+
+        Returns:
+            Значення з кешу або щойно побудоване
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                value = await self.get(key)
+                if value is not None:
+                    return value
+
+                lock_key = f"lock:{key}"
+                acquired = await self._acquire_lock(lock_key)
+                if not acquired:
+                    # Інший воркер вже будує значення - чекаємо на нього
+                    deadline = time.monotonic() + self.LOCK_TTL
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+                        value = await self.get(key)
+                        if value is not None:
+                            return value
+
+                try:
+                    value = builder()
+                    if inspect.isawaitable(value):
+                        value = await value
+                    await self.set(key, value, ttl)
+                finally:
+                    if acquired:
+                        await self.delete(lock_key)
+
+                return value
+        finally:
+            # Ключі бувають на користувача - блокування не повинні накопичуватись
+            # (ні після раннього повернення, ні після помилки builder)
+            if self._locks.get(key) is lock:
+                del self._locks[key]
+
+    # ====== SORTED SETS (рейтинги) ======
+
+    async def zincrby(self, key: str, member: Union[int, str], amount: float = 1) -> None:
+        """
+        Збільшити рахунок члена sorted set
+        """
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.zincrby(key, amount, str(member))
+                return
+            except RedisError as e:
+                self._redis_failed(e)
+
+        self._sorted_sets.setdefault(key, LocalSortedSet()).incr(str(member), amount)
+
+    async def zrevrange(self, key: str, start: int, stop: int) -> List[Tuple[str, float]]:
+        """
+        Члени з найбільшим рахунком (позиції start..stop включно)
+
+        Returns:
+            [(член, рахунок), ...]
+        """
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                rows = await redis.zrevrange(key, start, stop, withscores=True)
+                return [(member.decode(), score) for member, score in rows]
+            except RedisError as e:
+                self._redis_failed(e)
+
+        sorted_set = self._sorted_sets.get(key)
+        return sorted_set.top(start, stop) if sorted_set else []
+
+    async def zrevrank(self, key: str, member: Union[int, str]) -> Optional[Tuple[int, float]]:
+        """
+        Позиція (з 0, за спаданням) та рахунок члена, O(log n)
+
+        Returns:
+            (позиція, рахунок) або None, якщо члена немає
+        """
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                async with redis.pipeline(transaction=False) as pipe:
+                    rank, score = await pipe.zrevrank(key, str(member)).zscore(key, str(member)).execute()
+                return (rank, score) if rank is not None else None
+            except RedisError as e:
+                self._redis_failed(e)
+
+        sorted_set = self._sorted_sets.get(key)
+        rank = sorted_set.rank(str(member)) if sorted_set else None
+        return (rank, sorted_set.scores[str(member)]) if rank is not None else None
+
+    async def zscores(self, key: str, members: List[Union[int, str]]) -> List[Optional[float]]:
+        """
+        Рахунки кількох членів одним запитом
+        """
+        if not members:
+            return []
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                return await redis.zmscore(key, [str(member) for member in members])
+            except RedisError as e:
+                self._redis_failed(e)
+
+        sorted_set = self._sorted_sets.get(key)
+        return [sorted_set.scores.get(str(member)) if sorted_set else None for member in members]
+
+    async def zreplace(self, key: str, scores: Iterable[Tuple[Union[int, str], float]]) -> None:
+        """
+        Атомарно замінити весь sorted set (перебудова з БД)
+        """
+        scores = [(str(member), score) for member, score in scores]
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                temp_key = f"{key}:rebuild"
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.delete(temp_key)
+                    for i in range(0, len(scores), 1000):
+                        pipe.zadd(temp_key, dict(scores[i:i + 1000]))
+                    if scores:
+                        pipe.rename(temp_key, key)
+                    else:
+                        pipe.delete(key)
+                    await pipe.execute()
+                return
+            except RedisError as e:
+                self._redis_failed(e)
+
+        sorted_set = LocalSortedSet()
+        for member, score in scores:
+            sorted_set.incr(member, score)
+        self._sorted_sets[key] = sorted_set
+
+    async def _acquire_lock(self, lock_key: str) -> bool:
+        """
+        Взяти блокування в Redis. Без Redis достатньо локального asyncio.Lock.
+        """
+        redis = self._get_redis()
+        if redis is None:
+            return True
+        try:
+            return bool(await redis.set(lock_key, "1", nx=True, ex=self.LOCK_TTL))
+        except RedisError as e:
+            self._redis_failed(e)
+            return True
+
+
+# Створюємо глобальний екземпляр сервісу
+cache_service = CacheService()
@@ -0,0 +1,81 @@
+"""
+Сервіс для роботи з колекціями користувачів
+Швидке визначення іконки колекції для товарів у каталозі
+"""
+
+from typing import Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.collection import Collection, collection_products
+from app.services.cache_service import cache_service
+
+# Іконка для товарів, яких немає в жодній колекції
+DEFAULT_ICON = "🤍"
+
+# Час життя кешу членства для одного користувача
+MEMBERSHIP_CACHE_TTL = 300
+
+
+class CollectionService:
+    """
+    Сервіс членства товарів у колекціях.
+    Кеш на користувача: {product_id: icon або None}, доповнюється
+    лише тими товарами, які вже запитувались.
+    """
+
+    def _cache_key(self, user_id: int) -> str:
+        return f"collection_icons:{user_id}"
+
+    async def get_collection_icons(self, db: AsyncSession, user_id: int, product_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Отримати іконки колекцій для товарів поточної сторінки
+
+        Args:
+            db: Асинхронна сесія БД
+            user_id: ID користувача
+            product_ids: ID товарів на сторінці
+
+        Returns:
+            {product_id: icon} для кожного з product_ids
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return {}
+
+        cache_key = self._cache_key(user_id)
+        # Ключі - рядки, щоб значення залишалось JSON-серіалізованим
+        membership = dict(await cache_service.get(cache_key) or {})
+
+        missing = [pid for pid in product_ids if str(pid) not in membership]
+        if missing:
+            rows = (await db.execute(
+                select(collection_products.c.product_id, Collection.icon).join(
+                    Collection, Collection.id == collection_products.c.collection_id
+                ).where(
+                    Collection.user_id == user_id,
+                    collection_products.c.product_id.in_(missing)
+                ).order_by(Collection.id)
+            )).all()
+
+            for pid in missing:
+                membership[str(pid)] = None
+            # Перша (найстаріша) колекція має пріоритет
+            for product_id, icon in rows:
+                if membership[str(product_id)] is None:
+                    membership[str(product_id)] = icon or DEFAULT_ICON
+
+            await cache_service.set(cache_key, membership, MEMBERSHIP_CACHE_TTL)
+
+        return {pid: membership[str(pid)] or DEFAULT_ICON for pid in product_ids}
+
+    async def invalidate_user(self, user_id: int) -> None:
+        """
+        Скинути кеш членства після зміни колекцій користувача
+        """
+        await cache_service.delete(self._cache_key(user_id))
+
+
+# Створюємо глобальний екземпляр сервісу
+collection_service = CollectionService()
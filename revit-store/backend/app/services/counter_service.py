@@ -0,0 +1,123 @@
+"""
+Сервіс лічильників переглядів та завантажень товарів (write-behind)
+Інкременти накопичуються в пам'яті процесу та періодично записуються
+в БД пакетом атомарних UPDATE ... SET x = x + delta
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict
+
+from sqlalchemy import bindparam, update
+
+from app.database import async_engine
+from app.models.product import Product
+
+# Як часто записувати накопичені інкременти в БД (сек)
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "5"))
+
+# Лічильники, які можна збільшувати
+COUNTER_FIELDS = ("views_count", "downloads_count")
+
+
+class CounterService:
+    """
+    Лічильники Product.views_count / Product.downloads_count.
+    Кожен uvicorn worker накопичує власні інкременти; оскільки запис
+    у БД - це додавання delta, воркери не перезаписують один одного.
+    """
+
+    def __init__(self, flush_interval: float = COUNTER_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+        self._task = None
+        self._stop = None
+        self._flush_lock = asyncio.Lock()
+
+    def increment(self, product_id: int, field: str, amount: int = 1) -> None:
+        """
+        Збільшити лічильник товару (без звернення до БД)
+        """
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown counter: {field}")
+        self._pending[product_id][field] += amount
+
+    def pending(self, product_id: int, field: str) -> int:
+        """
+        Ще не записаний у БД інкремент - додається до значення з БД при відображенні
+        """
+        deltas = self._pending.get(product_id)
+        return deltas[field] if deltas else 0
+
+    def live(self, product: Product, field: str) -> int:
+        """
+        Поточне значення лічильника з урахуванням незаписаних інкрементів
+        """
+        return (getattr(product, field) or 0) + self.pending(product.id, field)
+
+    async def flush(self) -> int:
+        """
+        Записати накопичені інкременти в БД одним пакетом
+
+        Returns:
+            Кількість оновлених товарів
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+            # Сортування за id - однаковий порядок блокувань рядків у всіх воркерах
+            params = [
+                {"product_id": product_id, **{f"delta_{field}": deltas[field] for field in COUNTER_FIELDS}}
+                for product_id, deltas in sorted(pending.items())
+            ]
+
+            table = Product.__table__
+            statement = update(table).where(table.c.id == bindparam("product_id")).values(**{
+                field: table.c[field] + bindparam(f"delta_{field}") for field in COUNTER_FIELDS
+            })
+
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(statement, params)
+            except Exception as e:
+                print(f"❌ Не вдалося записати лічильники: {e}")
+                # Повертаємо інкременти, щоб записати їх наступного разу
+                for product_id, deltas in pending.items():
+                    for field, delta in deltas.items():
+                        self._pending[product_id][field] += delta
+                return 0
+
+            return len(params)
+
+    async def _run(self, stop: asyncio.Event) -> None:
+        # Зупиняємось лише між записами, щоб не перервати транзакцію
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def start(self) -> None:
+        """
+        Запустити періодичний запис (main.lifespan)
+        """
+        if self._task is None:
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._stop))
+
+    async def stop(self) -> None:
+        """
+        Зупинити періодичний запис та записати залишок
+        """
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+# Створюємо глобальний екземпляр сервісу
+counter_service = CounterService()
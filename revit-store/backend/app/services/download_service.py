@@ -0,0 +1,162 @@
+"""
+Сервіс видачі архівів для завантаження
+Докачка (Range / If-Range / ETag) та передача файлу nginx через X-Accel-Redirect,
+щоб байти архіву не проходили через Python worker
+"""
+
+import asyncio
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+# nginx - файл віддає nginx (internal location), python - потокова видача з бекенду
+ARCHIVE_DELIVERY = os.getenv("ARCHIVE_DELIVERY", "python").lower()
+# Internal location у nginx.conf, що вказує на корінь медіа-сховища
+ARCHIVE_ACCEL_PREFIX = os.getenv("ARCHIVE_ACCEL_PREFIX", "/protected-media/")
+# Розмір блоку при потоковій видачі з Python
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+_SHA256_NAME = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class DownloadService:
+    """
+    Формування відповіді на завантаження архіву
+    """
+
+    def _etag(self, file_path: str, stat: os.stat_result) -> str:
+        # Файли зберігаються за SHA-256 вмісту - ім'я файлу і є сильним ETag
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        if _SHA256_NAME.match(name):
+            return f'"{name}"'
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    def _parse_range(self, header: str, size: int) -> Optional[Tuple[int, int]]:
+        """
+        Один діапазон bytes=start-end. Кілька діапазонів не підтримуються -
+        у такому разі віддається весь файл (це дозволено RFC 9110).
+
+        Returns:
+            (start, end) включно або None
+        """
+        match = _RANGE.match(header.strip())
+        if not match:
+            return None
+
+        start, end = match.groups()
+        if not start and not end:
+            return None
+        if not start:
+            # bytes=-500 - останні 500 байт
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+
+        if start >= size or start > end:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+        return start, end
+
+    def _if_range_matches(self, if_range: str, etag: str, mtime: float) -> bool:
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        try:
+            return parsedate_to_datetime(if_range).timestamp() >= int(mtime)
+        except (TypeError, ValueError):
+            return False
+
+    async def _iter_file(self, file_path: str, start: int, length: int) -> AsyncIterator[bytes]:
+        file_object = await asyncio.to_thread(open, file_path, "rb")
+        try:
+            await asyncio.to_thread(file_object.seek, start)
+            remaining = length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(file_object.read, min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(file_object.close)
+
+    def build_response(self, request: Request, file_url: str, file_path: str, filename: str) -> Response:
+        """
+        Відповідь на завантаження архіву (перевірки доступу вже виконані)
+
+        Args:
+            request: Запит (заголовки Range / If-Range / If-None-Match)
+            file_url: Відносний шлях /media/... з Product.file_url
+            file_path: Шлях у файловій системі
+            filename: Ім'я файлу для Content-Disposition
+        """
+        headers = {
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "private, no-transform",
+        }
+
+        if ARCHIVE_DELIVERY == "nginx":
+            # nginx сам обробляє Range / If-Range та віддає файл через sendfile
+            relative = file_url.lstrip("/")
+            if relative.startswith("media/"):
+                relative = relative[len("media/"):]
+            headers["X-Accel-Redirect"] = f"{ARCHIVE_ACCEL_PREFIX}{quote(relative)}"
+            return Response(status_code=200, headers=headers, media_type="application/octet-stream")
+
+        stat = os.stat(file_path)
+        size = stat.st_size
+        etag = self._etag(file_path, stat)
+        headers["ETag"] = etag
+        headers["Last-Modified"] = formatdate(stat.st_mtime, usegmt=True)
+
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        byte_range = None
+        range_header = request.headers.get("range")
+        if range_header:
+            if_range = request.headers.get("if-range")
+            # Якщо файл змінився з моменту першого завантаження - віддаємо його повністю
+            if not if_range or self._if_range_matches(if_range, etag, stat.st_mtime):
+                byte_range = self._parse_range(range_header, size)
+
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            status_code = 206
+        else:
+            start, end = 0, size - 1
+            status_code = 200
+
+        length = end - start + 1
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            self._iter_file(file_path, start, length),
+            status_code=status_code,
+            headers=headers,
+            media_type="application/octet-stream"
+        )
+
+    def is_initial_request(self, request: Request) -> bool:
+        """
+        Чи це перший запит завантаження, а не докачка чи перевірка кешу.
+        Лічильник завантажень збільшується лише для таких запитів.
+        """
+        range_header = request.headers.get("range", "")
+        return not request.headers.get("if-none-match") and (
+            not range_header or re.match(r"^bytes=0-", range_header.strip()) is not None
+        )
+
+
+# Створюємо глобальний екземпляр сервісу
+download_service = DownloadService()
@@ -0,0 +1,188 @@
+"""
+Сервіс прав доступу користувача (entitlements)
+Один запис на користувача: поточна підписка та куплені товари.
+Запис будується двома запитами і кешується (cache_service); скидається після
+завершення замовлення, оплати / видачі / скасування підписки
+"""
+
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.order import Order, OrderItem
+from app.models.subscription import Subscription
+from app.services.cache_service import cache_service
+
+# Час життя запису в кеші (сек). Закінчення підписки перевіряється при читанні,
+# тож TTL впливає лише на зміни, для яких забули викликати invalidate
+ENTITLEMENT_CACHE_TTL = int(os.getenv("ENTITLEMENT_CACHE_TTL", "300"))
+
+
+class Entitlements:
+    """
+    Права доступу користувача з кешованого запису
+    """
+
+    __slots__ = ("user_id", "version", "subscription", "products")
+
+    def __init__(self, record: Dict):
+        self.user_id: int = record["user_id"]
+        # Нова при кожній побудові запису - ключ для залежних кешів (бібліотека)
+        self.version: str = record.get("version", "")
+        self.subscription: Optional[Dict] = record["subscription"]
+        self.products: Set[int] = set(record["products"])
+
+    def _expires_at(self) -> Optional[datetime]:
+        if not self.subscription:
+            return None
+        return datetime.fromisoformat(self.subscription["expires_at"])
+
+    def has_active_subscription(self) -> bool:
+        """Чи є дійсна підписка (закінчення перевіряється на момент виклику)"""
+        expires_at = self._expires_at()
+        return expires_at is not None and expires_at > datetime.utcnow()
+
+    def subscription_window(self) -> Optional[Tuple[datetime, datetime]]:
+        """Початок та кінець дійсної підписки або None"""
+        if not self.has_active_subscription():
+            return None
+        return datetime.fromisoformat(self.subscription["started_at"]), self._expires_at()
+
+    def days_remaining(self) -> int:
+        """Скільки днів залишилось до кінця підписки"""
+        if not self.has_active_subscription():
+            return 0
+        return max(0, (self._expires_at() - datetime.utcnow()).days)
+
+    def subscription_summary(self) -> Optional[Dict]:
+        """Дійсна підписка для відповіді API (/auth/me) або None"""
+        if not self.has_active_subscription():
+            return None
+        return {
+            "plan_type": self.subscription["plan_type"],
+            "expires_at": self.subscription["expires_at"],
+            "days_remaining": self.days_remaining(),
+            "auto_renew": self.subscription["auto_renew"]
+        }
+
+    def owns(self, product_id: int) -> bool:
+        """Чи куплений товар (завершене замовлення)"""
+        return product_id in self.products
+
+    def owned(self, product_ids: Iterable[int]) -> Set[int]:
+        """Які з товарів сторінки куплені - одна перевірка на всю сторінку"""
+        return self.products.intersection(product_ids)
+
+    def covers(self, product) -> bool:
+        """
+        Чи доступний товар за підпискою: requires_subscription і реліз
+        у межах дійсної підписки (доступ до нових архівів з дати підписки)
+        """
+        if not product.requires_subscription or product.released_at is None:
+            return False
+        window = self.subscription_window()
+        if window is None:
+            return False
+        started_at, expires_at = window
+        return started_at <= product.released_at < expires_at
+
+    def can_download(self, product) -> bool:
+        """Безкоштовний, куплений або за підпискою"""
+        if product.is_free() or self.owns(product.id):
+            return True
+        return self.covers(product)
+
+
+class EntitlementService:
+    """
+    Побудова, кешування та інвалідація записів прав доступу
+    """
+
+    def _cache_key(self, user_id: int) -> str:
+        return f"entitlements:{user_id}"
+
+    def _queries(self, user_id: int):
+        now = datetime.utcnow()
+        subscription_query = select(
+            Subscription.id, Subscription.plan_type, Subscription.started_at, Subscription.expires_at,
+            Subscription.auto_renew, Subscription.daily_spins_bonus, Subscription.cashback_percent,
+            Subscription.accessible_products
+        ).where(
+            Subscription.user_id == user_id,
+            Subscription.is_active == True,
+            Subscription.is_cancelled == False,
+            Subscription.payment_status == 'completed',
+            Subscription.expires_at > now
+        ).order_by(Subscription.expires_at.desc()).limit(1)
+
+        products_query = select(OrderItem.product_id).join(
+            Order, Order.id == OrderItem.order_id
+        ).where(
+            Order.user_id == user_id,
+            Order.status == 'completed'
+        ).distinct()
+
+        return subscription_query, products_query
+
+    def _record(self, user_id: int, subscription, product_ids) -> Dict:
+        return {
+            "user_id": user_id,
+            "version": uuid.uuid4().hex,
+            "subscription": {
+                "id": subscription.id,
+                "plan_type": subscription.plan_type,
+                "started_at": subscription.started_at.isoformat(),
+                "expires_at": subscription.expires_at.isoformat(),
+                "auto_renew": subscription.auto_renew,
+                "daily_spins_bonus": subscription.daily_spins_bonus,
+                "cashback_percent": subscription.cashback_percent,
+                "accessible_products": len(subscription.accessible_products or [])
+            } if subscription else None,
+            "products": sorted(product_ids)
+        }
+
+    async def build(self, db: Union[Session, AsyncSession], user_id: int) -> Dict:
+        """
+        Побудувати запис з БД (без кешу)
+        """
+        subscription_query, products_query = self._queries(user_id)
+        if isinstance(db, AsyncSession):
+            subscription = (await db.execute(subscription_query)).first()
+            product_ids = (await db.execute(products_query)).scalars().all()
+        else:
+            subscription = db.execute(subscription_query).first()
+            product_ids = db.execute(products_query).scalars().all()
+        return self._record(user_id, subscription, product_ids)
+
+    async def get(self, db: Union[Session, AsyncSession], user_id: int) -> Entitlements:
+        """
+        Права доступу користувача (з кешу або щойно побудовані)
+
+        Args:
+            db: Сесія БД (sync або async)
+            user_id: ID користувача
+
+        Returns:
+            Entitlements
+        """
+        record = await cache_service.get_or_set(
+            self._cache_key(user_id),
+            lambda: self.build(db, user_id),
+            ENTITLEMENT_CACHE_TTL
+        )
+        return Entitlements(record)
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        Скинути запис (після commit): завершене замовлення, оплачена / видана / скасована підписка
+        """
+        await cache_service.delete(self._cache_key(user_id))
+
+
+# Створюємо глобальний екземпляр сервісу
+entitlement_service = EntitlementService()
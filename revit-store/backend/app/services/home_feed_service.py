@@ -0,0 +1,101 @@
+"""
+Сервіс стрічки головної сторінки
+Попередньо зібрана стрічка (новинки, популярні, товар тижня) для кожної мови
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.services.cache_service import cache_service
+from app.services.search_service import search_service
+
+# Префікс ключів кешу стрічки
+HOME_FEED_PREFIX = "home_feed:"
+
+# Як часто стрічка перебудовується без явної інвалідації
+HOME_FEED_TTL = 60
+
+
+class HomeFeedService:
+    """
+    Сервіс для побудови та кешування стрічки головної сторінки
+    """
+
+    def _format_product_short(self, p: Optional[Product], language: str) -> Optional[Dict]:
+        if not p:
+            return None
+        return {
+            "id": p.id,
+            "sku": p.sku,
+            "title": p.get_title(language),
+            "price": p.price,
+            "current_price": p.get_current_price(),
+            "discount_percent": p.discount_percent if p.discount_ends_at and p.discount_ends_at > datetime.utcnow() else 0,
+            "preview_images": p.preview_images or [],
+            "rating": p.rating,
+            "is_free": p.is_free()
+        }
+
+    async def build_home_feed(self, db: AsyncSession, language: str) -> Dict:
+        """
+        Зібрати стрічку головної сторінки з БД
+
+        Args:
+            db: Асинхронна сесія БД
+            language: Мова назв
+
+        Returns:
+            Стрічка головної сторінки
+        """
+        new_products = (await db.execute(
+            select(Product).where(
+                Product.is_active == True, Product.is_approved == True, Product.is_new == True
+            ).order_by(desc(Product.created_at)).limit(8)
+        )).scalars().all()
+
+        featured_products = (await db.execute(
+            select(Product).where(
+                Product.is_active == True, Product.is_approved == True, Product.is_featured == True
+            ).order_by(desc(Product.downloads_count)).limit(8)
+        )).scalars().all()
+
+        product_of_week = (await db.execute(
+            select(Product).where(
+                Product.is_active == True, Product.is_approved == True,
+                Product.discount_percent > 0,
+                Product.discount_ends_at > datetime.utcnow()
+            ).order_by(desc(Product.discount_percent)).limit(1)
+        )).scalars().first()
+
+        return {
+            "new_products": [self._format_product_short(p, language) for p in new_products],
+            "featured_products": [self._format_product_short(p, language) for p in featured_products],
+            "product_of_week": self._format_product_short(product_of_week, language)
+        }
+
+    async def get_home_feed(self, db: AsyncSession, language: str) -> Dict:
+        """
+        Отримати стрічку з кешу, перебудувавши її за потреби.
+        Перебудову виконує лише один запит (захист від stampede).
+        Невідома мова замінюється на en - ключі кешу лише для підтримуваних мов.
+        """
+        language = search_service.normalize_language(language)
+        return await cache_service.get_or_set(
+            f"{HOME_FEED_PREFIX}{language}",
+            lambda: self.build_home_feed(db, language),
+            HOME_FEED_TTL
+        )
+
+    async def invalidate(self) -> None:
+        """
+        Скинути стрічку для всіх мов (після схвалення / зміни товару)
+        """
+        await cache_service.delete_prefix(HOME_FEED_PREFIX)
+
+
+# Створюємо глобальний екземпляр сервісу
+home_feed_service = HomeFeedService()
@@ -0,0 +1,118 @@
+"""
+Спільні HTTP клієнти для зовнішніх API (Telegram, Cryptomus)
+Один пул з'єднань на upstream на весь час життя застосунку:
+keep-alive, HTTP/2 (якщо встановлено h2) та метрики повторного використання з'єднань
+"""
+
+from typing import Dict
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Налаштування кожного upstream: таймаути та розмір пулу
+UPSTREAMS = {
+    "telegram": {
+        # Завантаження архівів через sendDocument перевизначають таймаут на рівні запиту
+        "timeout": httpx.Timeout(15.0, connect=5.0),
+        "limits": httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+    },
+    "cryptomus": {
+        "timeout": httpx.Timeout(20.0, connect=5.0),
+        "limits": httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60),
+    },
+}
+
+
+class HttpClients:
+    """
+    Реєстр пулених httpx.AsyncClient, створюється та закривається в main.lifespan
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._metrics: Dict[str, Dict[str, int]] = {
+            name: {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "errors": 0}
+            for name in UPSTREAMS
+        }
+
+    def _make_trace(self, name: str):
+        metrics = self._metrics[name]
+
+        async def trace(event_name: str, info: Dict) -> None:
+            # Нове TCP з'єднання / TLS handshake - значить keep-alive не спрацював
+            if event_name == "connection.connect_tcp.complete":
+                metrics["connections_opened"] += 1
+            elif event_name == "connection.start_tls.complete":
+                metrics["tls_handshakes"] += 1
+
+        return trace
+
+    def _create_client(self, name: str) -> httpx.AsyncClient:
+        config = UPSTREAMS[name]
+        metrics = self._metrics[name]
+        trace = self._make_trace(name)
+
+        async def on_request(request: httpx.Request) -> None:
+            metrics["requests"] += 1
+            request.extensions["trace"] = trace
+
+        async def on_response(response: httpx.Response) -> None:
+            if response.status_code >= 500:
+                metrics["errors"] += 1
+
+        return httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=config["timeout"],
+            limits=config["limits"],
+            event_hooks={"request": [on_request], "response": [on_response]}
+        )
+
+    async def startup(self) -> None:
+        """
+        Створити клієнти для всіх upstream
+        """
+        for name in UPSTREAMS:
+            if name not in self._clients:
+                self._clients[name] = self._create_client(name)
+
+    async def shutdown(self) -> None:
+        """
+        Закрити всі клієнти та їхні з'єднання
+        """
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Отримати клієнт upstream. Якщо lifespan не запускався
+        (скрипти, тести) - клієнт створюється при першому зверненні.
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create_client(name)
+        return client
+
+    def get_metrics(self) -> Dict:
+        """
+        Метрики повторного використання з'єднань по кожному upstream
+        """
+        result = {}
+        for name, metrics in self._metrics.items():
+            requests = metrics["requests"]
+            result[name] = {
+                **metrics,
+                "http2": HTTP2_AVAILABLE,
+                "reuse_ratio": round(1 - metrics["connections_opened"] / requests, 3) if requests else None
+            }
+        return result
+
+
+# Створюємо глобальний екземпляр сервісу
+http_clients = HttpClients()
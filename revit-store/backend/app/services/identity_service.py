@@ -0,0 +1,143 @@
+"""
+Кеш ідентичності користувача для автентифікації запитів
+telegram_id з токена -> легкий знімок користувача (id, ролі, блокування)
+без SELECT users на кожен запит
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+from app.services.cache_service import cache_service
+
+# Час життя знімка в Redis (сек)
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", "60"))
+# Час життя знімка в пам'яті процесу - короткий, бо інвалідація
+# з іншого воркера скидає лише Redis
+IDENTITY_LOCAL_TTL = float(os.getenv("IDENTITY_LOCAL_TTL", "5"))
+IDENTITY_LOCAL_MAX_ITEMS = 10000
+
+# Поля, доступні без звернення до БД
+SNAPSHOT_FIELDS = (
+    "id", "telegram_id", "username", "first_name", "last_name", "language",
+    "is_admin", "is_creator", "is_blocked", "creator_verified"
+)
+
+
+class CurrentUser:
+    """
+    Користувач поточного запиту.
+    Поля знімка читаються без БД; будь-яке інше поле чи запис
+    завантажує ORM User у сесію ендпоінта при першому зверненні.
+    З AsyncSession ліниве завантаження неможливе: поля поза SNAPSHOT_FIELDS
+    доступні лише після await load(), інакше RuntimeError.
+
+    Знімок може бути застарілим: invalidate() скидає Redis і пам'ять лише
+    поточного воркера, інші воркери бачать старі ролі / блокування
+    до IDENTITY_LOCAL_TTL секунд (і до IDENTITY_CACHE_TTL, якщо Redis недоступний).
+    """
+
+    __slots__ = ("_snapshot", "_db", "_user")
+
+    def __init__(self, snapshot: Dict, db: Union[Session, AsyncSession], user: Optional[User] = None):
+        object.__setattr__(self, "_snapshot", snapshot)
+        object.__setattr__(self, "_db", db)
+        object.__setattr__(self, "_user", user)
+
+    def orm(self) -> User:
+        """
+        ORM User у сесії ендпоінта (для змін та db.refresh)
+        """
+        if self._user is None:
+            if isinstance(self._db, AsyncSession):
+                raise RuntimeError("Use 'await current_user.load()' with AsyncSession")
+            object.__setattr__(self, "_user", self._db.get(User, self._snapshot["id"]))
+        return self._user
+
+    async def load(self) -> User:
+        """
+        Те саме, що orm(), для роутерів на AsyncSession
+        """
+        if self._user is None:
+            object.__setattr__(self, "_user", await self._db.get(User, self._snapshot["id"]))
+        return self._user
+
+    def __getattr__(self, name: str):
+        if self._user is None and name in self._snapshot:
+            return self._snapshot[name]
+        return getattr(self.orm(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.orm(), name, value)
+
+    def __repr__(self):
+        return f"<CurrentUser {self._snapshot['telegram_id']}>"
+
+
+class IdentityService:
+    """
+    Двохрівневий кеш знімків: LRU у пам'яті процесу + Redis (через cache_service)
+    """
+
+    def __init__(self, max_items: int = IDENTITY_LOCAL_MAX_ITEMS):
+        self.max_items = max_items
+        self._local: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def _cache_key(self, telegram_id: int) -> str:
+        return f"identity:{telegram_id}"
+
+    def snapshot(self, user: User) -> Dict:
+        return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+    def _local_set(self, telegram_id: int, snapshot: Dict) -> None:
+        self._local[telegram_id] = (snapshot, time.monotonic() + IDENTITY_LOCAL_TTL)
+        self._local.move_to_end(telegram_id)
+        while len(self._local) > self.max_items:
+            self._local.popitem(last=False)
+
+    async def get(self, telegram_id: int) -> Optional[Dict]:
+        """
+        Знімок користувача з кешу або None
+        """
+        entry = self._local.get(telegram_id)
+        if entry is not None:
+            snapshot, expires_at = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(telegram_id)
+                return snapshot
+            self._local.pop(telegram_id, None)
+
+        snapshot = await cache_service.get(self._cache_key(telegram_id))
+        if snapshot is not None:
+            self._local_set(telegram_id, snapshot)
+        return snapshot
+
+    async def set(self, user: User) -> Dict:
+        """
+        Закешувати знімок користувача
+        """
+        return await self.set_snapshot(self.snapshot(user))
+
+    async def set_snapshot(self, snapshot: Dict) -> Dict:
+        """
+        Закешувати вже знятий знімок (наприклад, зроблений до commit)
+        """
+        self._local_set(snapshot["telegram_id"], snapshot)
+        await cache_service.set(self._cache_key(snapshot["telegram_id"]), snapshot, IDENTITY_CACHE_TTL)
+        return snapshot
+
+    async def invalidate(self, telegram_id: int) -> None:
+        """
+        Скинути знімок (блокування, зміна ролей, видалення користувача)
+        """
+        self._local.pop(telegram_id, None)
+        await cache_service.delete(self._cache_key(telegram_id))
+
+
+# Створюємо глобальний екземпляр сервісу
+identity_service = IdentityService()
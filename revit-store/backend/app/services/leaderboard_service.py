@@ -0,0 +1,216 @@
+"""
+Сервіс рейтингів (колесо фортуни, реферали)
+Рейтинги зберігаються в sorted set (Redis або пам'ять процесу через cache_service),
+оновлюються в момент події та періодично перебудовуються з БД
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.subscription import WheelSpin
+from app.models.user import User
+from app.services.cache_service import cache_service
+
+# Як часто перебудовувати рейтинги з БД (сек)
+LEADERBOARD_REBUILD_INTERVAL = int(os.getenv("LEADERBOARD_REBUILD_INTERVAL", "3600"))
+
+WHEEL_WON_KEY = "leaderboard:wheel:won"
+WHEEL_SPINS_KEY = "leaderboard:wheel:spins"  # Кількість виграшних спінів
+REFERRALS_KEY = "leaderboard:referrals"
+# Позначка останньої перебудови - одна перебудова на інтервал для всіх воркерів
+REBUILT_KEY = "leaderboard:rebuilt"
+
+
+class LeaderboardService:
+    """
+    Рейтинги користувачів. Позиція користувача - ZREVRANK, O(log n);
+    відповідь з топом потребує одного пакетного запиту users.
+    """
+
+    def __init__(self, rebuild_interval: int = LEADERBOARD_REBUILD_INTERVAL):
+        self.rebuild_interval = rebuild_interval
+        self._task = None
+        self._stop = None
+
+    # ====== ОНОВЛЕННЯ ======
+
+    async def record_wheel_win(self, user_id: int, prize: int) -> None:
+        """
+        Виграш у колесі фортуни (після commit)
+        """
+        if prize > 0:
+            await cache_service.zincrby(WHEEL_WON_KEY, user_id, prize)
+            await cache_service.zincrby(WHEEL_SPINS_KEY, user_id, 1)
+
+    async def record_referral(self, referrer_id: int) -> None:
+        """
+        Новий зареєстрований реферал (після commit)
+        """
+        await cache_service.zincrby(REFERRALS_KEY, referrer_id, 1)
+
+    # ====== ЧИТАННЯ ======
+
+    async def _users(self, db: Union[Session, AsyncSession], user_ids: List[int]) -> Dict[int, User]:
+        if not user_ids:
+            return {}
+        query = select(User).where(User.id.in_(user_ids))
+        if isinstance(db, AsyncSession):
+            users = (await db.execute(query)).scalars().all()
+        else:
+            users = db.execute(query).scalars().all()
+        return {user.id: user for user in users}
+
+    async def _me(self, key: str, user_id: Optional[int]) -> Optional[Dict]:
+        if user_id is None:
+            return None
+        entry = await cache_service.zrevrank(key, user_id)
+        if entry is None:
+            return None
+        rank, score = entry
+        return {"position": rank + 1, "score": int(score)}
+
+    async def wheel(self, db: Union[Session, AsyncSession], limit: int = 10, user_id: Optional[int] = None) -> Dict:
+        """
+        Топ користувачів по виграшах у колесі фортуни
+
+        Args:
+            db: Сесія БД
+            limit: Кількість користувачів
+            user_id: Поточний користувач (для його позиції)
+
+        Returns:
+            Лідери та позиція поточного користувача
+        """
+        top = await cache_service.zrevrange(WHEEL_WON_KEY, 0, limit - 1)
+        user_ids = [int(member) for member, _ in top]
+        spins = await cache_service.zscores(WHEEL_SPINS_KEY, user_ids)
+        users = await self._users(db, user_ids)
+
+        leaders = []
+        for (member, total_won), total_spins in zip(top, spins):
+            user = users.get(int(member))
+            if user:
+                leaders.append({
+                    "position": len(leaders) + 1,
+                    "user_id": user.id,
+                    "username": user.username or f"User_{user.telegram_id}",
+                    "first_name": user.first_name,
+                    "total_won": int(total_won),
+                    "total_spins": int(total_spins or 0)
+                })
+
+        return {
+            "leaderboard": leaders,
+            "me": await self._me(WHEEL_WON_KEY, user_id)
+        }
+
+    async def referrals(self, db: Union[Session, AsyncSession], limit: int = 10, user_id: Optional[int] = None) -> Dict:
+        """
+        Топ користувачів по кількості рефералів
+
+        Args:
+            db: Сесія БД
+            limit: Кількість користувачів
+            user_id: Поточний користувач (для його позиції)
+
+        Returns:
+            Лідери та позиція поточного користувача
+        """
+        top = await cache_service.zrevrange(REFERRALS_KEY, 0, limit - 1)
+        users = await self._users(db, [int(member) for member, _ in top])
+
+        leaders = []
+        for member, referrals_count in top:
+            user = users.get(int(member))
+            if user:
+                leaders.append({
+                    "position": len(leaders) + 1,
+                    "user_id": user.id,
+                    "username": user.username or f"User_{user.telegram_id}",
+                    "first_name": user.first_name,
+                    "total_earned": user.referral_earnings,
+                    "referrals_count": int(referrals_count)
+                })
+
+        return {
+            "leaderboard": leaders,
+            "me": await self._me(REFERRALS_KEY, user_id)
+        }
+
+    # ====== ПЕРЕБУДОВА ======
+
+    def _load_from_db(self) -> Dict[str, list]:
+        db = SessionLocal()
+        try:
+            wheel = db.query(
+                WheelSpin.user_id,
+                func.sum(WheelSpin.prize),
+                func.count(WheelSpin.id)
+            ).filter(
+                WheelSpin.prize > 0
+            ).group_by(WheelSpin.user_id).all()
+
+            referrals = db.query(
+                User.referred_by_id,
+                func.count(User.id)
+            ).filter(
+                User.referred_by_id != None
+            ).group_by(User.referred_by_id).all()
+        finally:
+            db.close()
+
+        return {
+            WHEEL_WON_KEY: [(user_id, won) for user_id, won, _ in wheel],
+            WHEEL_SPINS_KEY: [(user_id, spins) for user_id, _, spins in wheel],
+            REFERRALS_KEY: list(referrals)
+        }
+
+    async def rebuild(self) -> None:
+        """
+        Перебудувати всі рейтинги з БД (виправлення розбіжностей).
+        Інкременти, що прийшли під час перебудови, можуть загубитись до наступної.
+        """
+        scores = await asyncio.to_thread(self._load_from_db)
+        for key, rows in scores.items():
+            await cache_service.zreplace(key, rows)
+        await cache_service.set(REBUILT_KEY, True, self.rebuild_interval)
+
+    async def _run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            # Інший воркер вже перебудував рейтинги в цьому інтервалі
+            if not await cache_service.get(REBUILT_KEY):
+                try:
+                    await self.rebuild()
+                except Exception as e:
+                    print(f"❌ Не вдалося перебудувати рейтинги: {e}")
+            try:
+                await asyncio.wait_for(stop.wait(), self.rebuild_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """
+        Запустити періодичну перебудову (main.lifespan)
+        """
+        if self._task is None:
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._stop))
+
+    async def stop(self) -> None:
+        """
+        Зупинити періодичну перебудову
+        """
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+
+
+# Створюємо глобальний екземпляр сервісу
+leaderboard_service = LeaderboardService()
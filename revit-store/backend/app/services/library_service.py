@@ -0,0 +1,181 @@
+"""
+Сервіс бібліотеки користувача ("Мої завантаження")
+Безкоштовні, куплені та доступні по підписці товари - один запит (UNION ALL)
+з курсорною пагінацією; сторінки кешуються до зміни прав доступу користувача
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import false, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.services.cache_service import cache_service
+from app.services.entitlement_service import Entitlements
+from app.utils.pagination import keyset_paginate_async, count_rows, cached_count, cursor_pagination_info
+
+# Час життя сторінки бібліотеки в кеші (сек). Зміна прав доступу скидає кеш одразу
+# (нова версія запису entitlements), TTL обмежує лише появу нових безкоштовних товарів
+LIBRARY_CACHE_TTL = int(os.getenv("LIBRARY_CACHE_TTL", "300"))
+
+LIBRARY_SOURCES = ("free", "purchased", "subscription")
+
+
+class LibraryService:
+    """
+    Бібліотека товарів, доступних користувачу для завантаження
+    """
+
+    def _library_subquery(self, user_id: int, entitlements: Entitlements, source: Optional[str]):
+        """
+        (product_id, source, acquired_at) для вибраних джерел.
+        Куплені - з завершених замовлень (ix_orders_user_id_created_at), каталог -
+        по ix_products_catalog; товар, який вже куплено, в каталожних гілках не повторюється.
+        """
+        purchases = select(
+            OrderItem.product_id.label("product_id"),
+            func.max(func.coalesce(Order.completed_at, Order.created_at)).label("acquired_at")
+        ).join(
+            Order, Order.id == OrderItem.order_id
+        ).where(
+            Order.user_id == user_id,
+            Order.status == 'completed'
+        ).group_by(OrderItem.product_id).cte("purchases")
+
+        def catalog_branch(name: str, condition):
+            return select(
+                Product.id.label("product_id"),
+                literal(name).label("source"),
+                Product.created_at.label("acquired_at")
+            ).where(
+                Product.is_active == True,
+                Product.is_approved == True,
+                condition,
+                Product.id.notin_(select(purchases.c.product_id))
+            )
+
+        branches = []
+        if source in (None, "purchased"):
+            branches.append(select(
+                purchases.c.product_id,
+                literal("purchased").label("source"),
+                purchases.c.acquired_at
+            ))
+        if source in (None, "free"):
+            branches.append(catalog_branch("free", Product.price == 0))
+        if source in (None, "subscription"):
+            # Як Entitlements.covers: лише релізи в межах дійсної підписки
+            window = entitlements.subscription_window()
+            if window is None:
+                condition = false()
+            else:
+                started_at, expires_at = window
+                condition = (
+                    (Product.requires_subscription == True) & (Product.price > 0)
+                    & (Product.released_at >= started_at) & (Product.released_at < expires_at)
+                )
+            branches.append(catalog_branch("subscription", condition))
+
+        query = branches[0] if len(branches) == 1 else union_all(*branches)
+        return query.subquery("library")
+
+    def _format_item(self, product: Product, source: str, acquired_at, language: str) -> Dict:
+        return {
+            "id": product.id,
+            "sku": product.sku,
+            "title": product.get_title(language),
+            "description": product.get_description(language),
+            "preview_image": product.preview_images[0] if product.preview_images else None,
+            "file_size": product.file_size,
+            "source": source,
+            "acquired_at": acquired_at.isoformat() if acquired_at else None
+        }
+
+    async def build_page(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            entitlements: Entitlements,
+            source: Optional[str],
+            cursor: Optional[str],
+            limit: int,
+            language: str
+    ) -> Dict:
+        """
+        Зібрати сторінку бібліотеки з БД (без кешу сторінки)
+        """
+        library = self._library_subquery(user_id, entitlements, source)
+        stmt = select(Product, library.c.source, library.c.acquired_at).join(
+            library, library.c.product_id == Product.id
+        )
+
+        rows, next_cursor = await keyset_paginate_async(
+            db, stmt, "acquired_at", library.c.acquired_at, library.c.product_id, cursor, limit,
+            value_getter=lambda row: row.acquired_at,
+            id_getter=lambda row: row.Product.id
+        )
+        total = await cached_count(lambda: count_rows(db, stmt), f"library:{user_id}", {
+            "source": source,
+            "version": entitlements.version,
+            "has_subscription": entitlements.has_active_subscription()
+        }, LIBRARY_CACHE_TTL)
+
+        items = [self._format_item(row.Product, row.source, row.acquired_at, language) for row in rows]
+
+        page = {source_name: [] for source_name in LIBRARY_SOURCES}
+        for item in items:
+            page[item["source"]].append(item)
+
+        return {
+            "items": items,
+            # Ті самі елементи сторінки, згруповані за джерелом
+            **page,
+            "pagination": cursor_pagination_info(limit, next_cursor, total)
+        }
+
+    async def get_page(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            entitlements: Entitlements,
+            source: Optional[str] = None,
+            cursor: Optional[str] = None,
+            limit: int = 20,
+            language: str = "uk"
+    ) -> Dict:
+        """
+        Сторінка бібліотеки користувача
+
+        Args:
+            db: Асинхронна сесія БД
+            user_id: ID користувача
+            entitlements: Права доступу (entitlement_service.get)
+            source: free / purchased / subscription або None - всі
+            cursor: Курсор наступної сторінки (None або "" - перша сторінка)
+            limit: Розмір сторінки
+            language: Мова назв
+
+        Returns:
+            Елементи сторінки (також згруповані за джерелом) та pagination
+        """
+        # Версія запису entitlements змінюється після кожної інвалідації -
+        # старі сторінки більше не читаються і зникають за TTL
+        params = json.dumps({
+            "source": source, "cursor": cursor or "", "limit": limit, "language": language,
+            "has_subscription": entitlements.has_active_subscription()
+        }, sort_keys=True)
+        digest = hashlib.md5(params.encode()).hexdigest()
+
+        return await cache_service.get_or_set(
+            f"library:{user_id}:{entitlements.version}:{digest}",
+            lambda: self.build_page(db, user_id, entitlements, source, cursor, limit, language),
+            LIBRARY_CACHE_TTL
+        )
+
+
+# Створюємо глобальний екземпляр сервісу
+library_service = LibraryService()
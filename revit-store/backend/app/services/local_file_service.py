@@ -1,11 +1,14 @@
 # backend/app/services/local_file_service.py
 import os
-import shutil
+import asyncio
+import hashlib
 import uuid
 from fastapi import UploadFile, HTTPException
 from datetime import datetime
+from typing import Dict
 
 MEDIA_ROOT = "/app/media"  # Папка для зберігання файлів всередині Docker контейнера
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Розмір блоку при записі завантажень (1MB)
 
 class LocalFileService:
     def __init__(self):
@@ -22,33 +25,105 @@ class LocalFileService:
         extension = os.path.splitext(original_filename)[1].lower()
         return f"{uuid.uuid4()}{extension}"
 
+    def content_addressed_path(self, folder_type: str, sha256: str, original_filename: str) -> str:
+        """
+        Відносний шлях файлу за його вмістом: /media/archives/ab/ab12...ef.zip
+        Однаковий вміст - однаковий шлях, тому дублікати не зберігаються.
+        """
+        extension = os.path.splitext(original_filename)[1].lower()
+        return f"/media/{self.folders[folder_type]}{sha256[:2]}/{sha256}{extension}"
+
+    def full_path(self, file_key: str) -> str:
+        """
+        Шлях у файловій системі для відносного шляху /media/...
+        """
+        return os.path.join("/app", file_key.lstrip('/'))
+
+    def _write_chunk(self, file_object, hasher, chunk: bytes) -> None:
+        # Виконується в потоці, щоб запис та хешування не блокували event loop
+        file_object.write(chunk)
+        hasher.update(chunk)
+
     async def upload_file(self, file: UploadFile, folder_type: str, **kwargs):
         folder_path = os.path.join(MEDIA_ROOT, self.folders.get(folder_type))
         if not os.path.exists(folder_path):
             raise HTTPException(status_code=500, detail=f"Directory for {folder_type} does not exist.")
 
-        filename = self._generate_unique_filename(file.filename)
-        file_location = os.path.join(folder_path, filename)
+        # Пишемо в тимчасовий файл, щоб недописаний файл ніколи не з'явився під /app/media.
+        # Остаточне ім'я - SHA-256 вмісту, відоме лише після запису. На місце файл
+        # переносить publish_upload - лише після commit посилання на нього (blob_service.add_refs),
+        # інакше одночасне видалення іншого товару з тим самим вмістом могло б його прибрати.
+        temp_location = os.path.join(folder_path, f".{self._generate_unique_filename(file.filename)}.part")
 
         try:
-            with open(file_location, "wb+") as file_object:
-                shutil.copyfileobj(file.file, file_object)
+            hasher = hashlib.sha256()
+            file_size = 0
 
-            file_size = os.path.getsize(file_location)
+            file_object = await asyncio.to_thread(open, temp_location, "wb")
+            try:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await asyncio.to_thread(self._write_chunk, file_object, hasher, chunk)
+                    file_size += len(chunk)
+                await asyncio.to_thread(os.fsync, file_object.fileno())
+            finally:
+                await asyncio.to_thread(file_object.close)
+
+            sha256 = hasher.hexdigest()
             # Повертаємо відносний шлях, який буде використовуватися для URL
-            relative_path = os.path.join('/media', self.folders.get(folder_type), filename).replace("\\", "/")
+            relative_path = self.content_addressed_path(folder_type, sha256, file.filename)
+            file_location = self.full_path(relative_path)
+
+            # Лише підказка: остаточно вирішує publish_upload
+            deduplicated = await asyncio.to_thread(os.path.exists, file_location)
 
             return {
                 "success": True,
                 "file_url": relative_path,  # Повертаємо URL-шлях
                 "s3_key": relative_path,    # Використовуємо той самий шлях як ключ
                 "file_size": file_size,
+                "sha256": sha256,
+                "deduplicated": deduplicated,
+                "staged_path": temp_location,  # Тимчасовий файл до publish_upload / discard_upload
                 "original_filename": file.filename,
                 "uploaded_at": datetime.utcnow().isoformat()
             }
         except Exception as e:
+            if os.path.exists(temp_location):
+                os.remove(temp_location)
             raise HTTPException(status_code=500, detail=f"Could not upload file: {e}")
 
+    def publish_upload(self, upload: Dict) -> bool:
+        """
+        Перенести завантажений файл на його місце (після commit посилань на нього).
+        Якщо файл з таким вмістом вже є - тимчасова копія видаляється.
+
+        Returns:
+            True якщо такий файл вже існував (дублікат)
+        """
+        staged_path = upload.get("staged_path")
+        if not staged_path or not os.path.exists(staged_path):
+            return True
+
+        file_location = self.full_path(upload["file_url"])
+        if os.path.exists(file_location):
+            os.remove(staged_path)
+            return True
+
+        os.makedirs(os.path.dirname(file_location), exist_ok=True)
+        os.replace(staged_path, file_location)
+        return False
+
+    def discard_upload(self, upload: Dict) -> None:
+        """
+        Видалити тимчасовий файл завантаження, яке не знадобилось (помилка створення товару)
+        """
+        staged_path = upload.get("staged_path")
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
+
     def generate_presigned_url(self, file_key: str, **kwargs):
         # Для локального сховища URL вже є публічним
         return file_key
@@ -56,7 +131,7 @@ class LocalFileService:
     def delete_file(self, file_key: str):
         # file_key тепер - це відносний шлях, наприклад /media/archives/file.zip
         # Нам потрібно отримати повний шлях у файловій системі
-        full_path = os.path.join("/app", file_key.lstrip('/'))
+        full_path = self.full_path(file_key)
         if os.path.exists(full_path):
             os.remove(full_path)
             return True
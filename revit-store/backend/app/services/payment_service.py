@@ -7,10 +7,12 @@ import hmac
 import json
 import os
 import uuid
+from datetime import datetime
 from typing import Dict, Optional
-import httpx
 from dotenv import load_dotenv
 
+from app.services.http_clients import http_clients
+
 load_dotenv()
 
 
@@ -31,7 +33,7 @@ class PaymentService:
         if not all([self.api_key, self.merchant_id, self.secret_key]):
             print("⚠️ Cryptomus credentials not configured!")
 
-    def create_payment(
+    async def create_payment(
         self,
         amount: float,
         currency: str = "USDT",
@@ -86,12 +88,12 @@ class PaymentService:
 
         try:
             # Робимо запит до API
-            with httpx.Client() as client:
-                response = client.post(
-                    f"{self.base_url}/payment",
-                    json=payload,
-                    headers=headers
-                )
+            client = http_clients.get("cryptomus")
+            response = await client.post(
+                f"{self.base_url}/payment",
+                json=payload,
+                headers=headers
+            )
 
             if response.status_code == 200:
                 data = response.json()
@@ -124,7 +126,7 @@ class PaymentService:
                 "error": str(e)
             }
 
-    def check_payment_status(self, payment_id: str) -> str:
+    async def check_payment_status(self, payment_id: str) -> str:
         """
         Перевірити статус платежу
 
@@ -147,12 +149,12 @@ class PaymentService:
         }
 
         try:
-            with httpx.Client() as client:
-                response = client.post(
-                    f"{self.base_url}/payment/info",
-                    json=payload,
-                    headers=headers
-                )
+            client = http_clients.get("cryptomus")
+            response = await client.post(
+                f"{self.base_url}/payment/info",
+                json=payload,
+                headers=headers
+            )
 
             if response.status_code == 200:
                 data = response.json()
@@ -229,7 +231,7 @@ class PaymentService:
         }
         return networks.get(currency.upper(), "ethereum")
 
-    def create_withdrawal(
+    async def create_withdrawal(
         self,
         amount: float,
         address: str,
@@ -269,12 +271,12 @@ class PaymentService:
         }
 
         try:
-            with httpx.Client() as client:
-                response = client.post(
-                    f"{self.base_url}/payout",
-                    json=payload,
-                    headers=headers
-                )
+            client = http_clients.get("cryptomus")
+            response = await client.post(
+                f"{self.base_url}/payout",
+                json=payload,
+                headers=headers
+            )
 
             if response.status_code == 200:
                 data = response.json()
@@ -305,7 +307,7 @@ class PaymentService:
                 "error": str(e)
             }
 
-    def get_exchange_rates(self) -> Dict:
+    async def get_exchange_rates(self) -> Dict:
         """
         Отримати поточні курси криптовалют
 
@@ -313,8 +315,8 @@ class PaymentService:
             Курси валют відносно USD
         """
         try:
-            with httpx.Client() as client:
-                response = client.get(f"{self.base_url}/exchange-rate/list")
+            client = http_clients.get("cryptomus")
+            response = await client.get(f"{self.base_url}/exchange-rate/list")
 
             if response.status_code == 200:
                 data = response.json()
@@ -367,26 +369,51 @@ class PromoCodeService:
         }
 
     @staticmethod
-    def apply_promo_code(promo_id: int, db) -> bool:
+    def claim_promo_code(code: str, order_amount: int, db) -> Optional[Dict]:
         """
-        Застосувати промокод (збільшити лічильник використань)
+        Перевірити промокод та зарахувати використання одним умовним UPDATE
+        (без commit - у транзакції замовлення). Рядок промокода блокується до
+        commit, тож одночасні замовлення не перевищать max_uses.
 
         Args:
-            promo_id: ID промокода
+            code: Промокод
+            order_amount: Сума замовлення (для min_order_amount)
             db: Сесія БД
 
         Returns:
-            True якщо успішно
+            Інформація про промокод або None, якщо він недійсний / вичерпаний
         """
+        from sqlalchemy import func, or_, update
         from app.models.order import PromoCode
 
-        promo = db.query(PromoCode).filter(
-            PromoCode.id == promo_id
+        now = datetime.utcnow()
+        promo = db.execute(
+            update(PromoCode).where(
+                PromoCode.code == code.upper(),
+                PromoCode.is_active == True,
+                or_(PromoCode.valid_from == None, PromoCode.valid_from <= now),
+                or_(PromoCode.valid_until == None, PromoCode.valid_until >= now),
+                # max_uses 0 / NULL - без обмеження (як у PromoCode.is_valid)
+                or_(
+                    func.coalesce(PromoCode.max_uses, 0) == 0,
+                    func.coalesce(PromoCode.uses_count, 0) < PromoCode.max_uses
+                ),
+                func.coalesce(PromoCode.min_order_amount, 0) <= order_amount
+            ).values(
+                uses_count=func.coalesce(PromoCode.uses_count, 0) + 1
+            ).returning(
+                PromoCode.id, PromoCode.code, PromoCode.discount_type,
+                PromoCode.discount_value, PromoCode.min_order_amount
+            ).execution_options(synchronize_session=False)
         ).first()
-        
-        if promo:
-            promo.uses_count += 1
-            db.commit()
-            return True
 
-        return False
\ No newline at end of file
+        if not promo:
+            return None
+
+        return {
+            "id": promo.id,
+            "code": promo.code,
+            "discount_type": promo.discount_type,
+            "discount_value": promo.discount_value,
+            "min_order_amount": promo.min_order_amount
+        }
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Сервіс щоденних агрегатів (rollups) для адмін-дашборду
+Агрегати оновлюються інкрементально в тій самій транзакції, що й подія
+(нове / завершене замовлення, оплачена підписка, вхід користувача),
+а rebuild перераховує діапазон днів з сирих таблиць (backfill)
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.order import Order
+from app.models.product import Product
+from app.models.stats import DailyStats, DailyProductSales
+from app.models.subscription import Subscription
+
+# Поля DailyStats, які можна збільшувати
+DAILY_COUNTERS = (
+    "orders_created", "orders_completed", "revenue",
+    "new_users", "active_users", "subscriptions_paid", "subscription_revenue"
+)
+
+# Продажі товарів по днях з сирих замовлень (дата завершення; для старих
+# замовлень без completed_at - дата створення). Основа rebuild та reconcile.
+RAW_PRODUCT_SALES_SQL = """
+    SELECT COALESCE(o.completed_at, o.created_at)::date AS day, oi.product_id, p.creator_id,
+           count(*) AS sales, COALESCE(sum(oi.final_price), 0) AS revenue
+    FROM order_items oi
+    JOIN orders o ON o.id = oi.order_id
+    JOIN products p ON p.id = oi.product_id
+    WHERE o.status = 'completed'
+      AND COALESCE(o.completed_at, o.created_at) >= :date_from
+      AND COALESCE(o.completed_at, o.created_at) < :date_next
+    GROUP BY 1, 2, 3
+"""
+
+
+class RollupService:
+    """
+    Інкрементальне оновлення daily_stats / daily_product_sales / daily_active_users
+    """
+
+    def __init__(self):
+        # Хто вже входив сьогодні в цьому процесі - повторний вхід не пишемо в БД
+        self._active_day: Optional[date] = None
+        self._active_seen: Set[int] = set()
+
+    def _bump(self, db: Session, day: date, **deltas: int) -> None:
+        """
+        Атомарно додати значення до лічильників дня (рядок створюється за потреби)
+        """
+        table = DailyStats.__table__
+        stmt = insert(table).values(date=day, updated_at=datetime.utcnow(), **deltas)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.date],
+            set_={
+                **{field: table.c[field] + stmt.excluded[field] for field in deltas},
+                "updated_at": stmt.excluded.updated_at
+            }
+        ))
+
+    def record_order_created(self, db: Session, order: Order) -> None:
+        """
+        Нове замовлення (до commit)
+        """
+        self._bump(db, (order.created_at or datetime.utcnow()).date(), orders_created=1)
+
+    def record_order_completed(self, db: Session, order: Order) -> None:
+        """
+        Замовлення завершене (до commit). Викликається рівно один раз на замовлення -
+        у місці, де статус змінюється на completed.
+        """
+        day = (order.completed_at or datetime.utcnow()).date()
+        self._bump(db, day, orders_completed=1, revenue=order.total or 0)
+
+        sales: Dict[int, Tuple[int, int]] = {}
+        for item in order.items:
+            count, revenue = sales.get(item.product_id, (0, 0))
+            sales[item.product_id] = (count + 1, revenue + (item.final_price or 0))
+
+        table = DailyProductSales.__table__
+        for product_id, (count, revenue) in sorted(sales.items()):
+            creator_id = select(Product.creator_id).where(Product.id == product_id).scalar_subquery()
+            stmt = insert(table).values(
+                date=day, product_id=product_id, creator_id=creator_id, sales=count, revenue=revenue
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.date, table.c.product_id],
+                set_={
+                    "sales": table.c.sales + stmt.excluded.sales,
+                    "revenue": table.c.revenue + stmt.excluded.revenue
+                }
+            ))
+
+    def record_subscription_paid(self, db: Session, subscription: Subscription) -> None:
+        """
+        Підписка оплачена / видана (до commit).
+        Дата - created_at підписки, як у rebuild (інакше оплата наступного дня
+        потрапляє в різні дні при інкременті та перерахунку)
+        """
+        self._bump(
+            db, (subscription.created_at or datetime.utcnow()).date(),
+            subscriptions_paid=1, subscription_revenue=subscription.plan_price or 0
+        )
+
+    def record_login(self, db: Session, user_id: int, is_new: bool = False) -> None:
+        """
+        Вхід користувача (до commit): новий користувач та унікальний активний за день.
+        Перший вхід за день - один запит; повторні входи в цьому процесі не пишуться.
+        """
+        today = datetime.utcnow().date()
+        if self._active_day != today:
+            self._active_day, self._active_seen = today, set()
+
+        if is_new:
+            self._bump(db, today, new_users=1)
+        if user_id in self._active_seen:
+            return
+
+        # active_users збільшується лише якщо рядок daily_active_users справді вставлено
+        db.execute(text("""
+            WITH inserted AS (
+                INSERT INTO daily_active_users (date, user_id) VALUES (:day, :user_id)
+                ON CONFLICT DO NOTHING
+                RETURNING 1
+            )
+            INSERT INTO daily_stats (date, active_users, orders_created, orders_completed, revenue,
+                                     new_users, subscriptions_paid, subscription_revenue, updated_at)
+            SELECT :day, count(*), 0, 0, 0, 0, 0, 0, now() FROM inserted HAVING count(*) > 0
+            ON CONFLICT (date) DO UPDATE SET
+                active_users = daily_stats.active_users + EXCLUDED.active_users,
+                updated_at = EXCLUDED.updated_at
+        """), {"day": today, "user_id": user_id})
+        self._active_seen.add(user_id)
+
+    def rebuild(self, db: Session, date_from: date, date_to: date) -> Dict:
+        """
+        Перерахувати агрегати за дні [date_from, date_to] з сирих таблиць (до commit).
+        Активні користувачі за минулі дні відомі лише з users.last_login.
+
+        Returns:
+            Кількість перерахованих днів та рядків продажів товарів
+        """
+        params = {"date_from": date_from, "date_to": date_to, "date_next": date_to + timedelta(days=1)}
+
+        db.execute(text("""
+            INSERT INTO daily_stats (date, orders_created, orders_completed, revenue, new_users,
+                                     active_users, subscriptions_paid, subscription_revenue, updated_at)
+            SELECT d::date, 0, 0, 0, 0, 0, 0, 0, now()
+            FROM generate_series(CAST(:date_from AS date), CAST(:date_to AS date), interval '1 day') AS d
+            ON CONFLICT (date) DO UPDATE SET
+                orders_created = 0, orders_completed = 0, revenue = 0, new_users = 0,
+                active_users = 0, subscriptions_paid = 0, subscription_revenue = 0, updated_at = now()
+        """), params)
+
+        db.execute(text("""
+            UPDATE daily_stats s SET orders_created = x.n
+            FROM (
+                SELECT created_at::date AS day, count(*) AS n FROM orders
+                WHERE created_at >= :date_from AND created_at < :date_next
+                GROUP BY 1
+            ) x
+            WHERE s.date = x.day
+        """), params)
+
+        # Дата завершення; для старих замовлень без completed_at - дата створення
+        db.execute(text("""
+            UPDATE daily_stats s SET orders_completed = x.n, revenue = x.revenue
+            FROM (
+                SELECT COALESCE(completed_at, created_at)::date AS day, count(*) AS n,
+                       COALESCE(sum(total), 0) AS revenue
+                FROM orders
+                WHERE status = 'completed'
+                  AND COALESCE(completed_at, created_at) >= :date_from
+                  AND COALESCE(completed_at, created_at) < :date_next
+                GROUP BY 1
+            ) x
+            WHERE s.date = x.day
+        """), params)
+
+        db.execute(text("""
+            UPDATE daily_stats s SET new_users = x.n
+            FROM (
+                SELECT created_at::date AS day, count(*) AS n FROM users
+                WHERE created_at >= :date_from AND created_at < :date_next
+                GROUP BY 1
+            ) x
+            WHERE s.date = x.day
+        """), params)
+
+        db.execute(text("""
+            INSERT INTO daily_active_users (date, user_id)
+            SELECT last_login::date, id FROM users
+            WHERE last_login >= :date_from AND last_login < :date_next
+            ON CONFLICT DO NOTHING
+        """), params)
+        db.execute(text("""
+            UPDATE daily_stats s SET active_users = x.n
+            FROM (
+                SELECT date AS day, count(*) AS n FROM daily_active_users
+                WHERE date BETWEEN :date_from AND :date_to
+                GROUP BY 1
+            ) x
+            WHERE s.date = x.day
+        """), params)
+
+        db.execute(text("""
+            UPDATE daily_stats s SET subscriptions_paid = x.n, subscription_revenue = x.revenue
+            FROM (
+                SELECT created_at::date AS day, count(*) AS n, COALESCE(sum(plan_price), 0) AS revenue
+                FROM subscriptions
+                WHERE payment_status = 'completed'
+                  AND created_at >= :date_from AND created_at < :date_next
+                GROUP BY 1
+            ) x
+            WHERE s.date = x.day
+        """), params)
+
+        db.execute(text("DELETE FROM daily_product_sales WHERE date BETWEEN :date_from AND :date_to"), params)
+        product_rows = db.execute(text("""
+            INSERT INTO daily_product_sales (date, product_id, creator_id, sales, revenue)
+            SELECT day, product_id, creator_id, sales, revenue FROM ({raw}) raw
+        """.format(raw=RAW_PRODUCT_SALES_SQL)), params).rowcount
+
+        return {
+            "days": (date_to - date_from).days + 1,
+            "product_rows": product_rows
+        }
+
+    def product_sales_drift(self, db: Session, date_from: date, date_to: date) -> List[Dict]:
+        """
+        Порівняти daily_product_sales з сирими замовленнями за дні [date_from, date_to]
+
+        Returns:
+            Рядки (день, товар), де агрегат розходиться з замовленнями
+        """
+        params = {"date_from": date_from, "date_to": date_to, "date_next": date_to + timedelta(days=1)}
+        rows = db.execute(text("""
+            SELECT COALESCE(r.day, s.date) AS day, COALESCE(r.product_id, s.product_id) AS product_id,
+                   COALESCE(r.creator_id, s.creator_id) AS creator_id,
+                   COALESCE(s.sales, 0) AS rollup_sales, COALESCE(r.sales, 0) AS raw_sales,
+                   COALESCE(s.revenue, 0) AS rollup_revenue, COALESCE(r.revenue, 0) AS raw_revenue
+            FROM ({raw}) r
+            FULL OUTER JOIN (
+                SELECT * FROM daily_product_sales WHERE date BETWEEN :date_from AND :date_to
+            ) s ON s.date = r.day AND s.product_id = r.product_id
+            WHERE s.date IS NULL OR r.day IS NULL
+               OR s.sales <> r.sales OR s.revenue <> r.revenue
+               OR s.creator_id IS DISTINCT FROM r.creator_id
+            ORDER BY 1, 2
+        """.format(raw=RAW_PRODUCT_SALES_SQL)), params).mappings().all()
+        return [dict(row) for row in rows]
+
+
+# Створюємо глобальний екземпляр сервісу
+rollup_service = RollupService()
@@ -4,10 +4,12 @@
 """
 
 import os
+import asyncio
 import boto3
 import hashlib
 import mimetypes
-from typing import Optional, Dict, List, BinaryIO
+import uuid
+from typing import Optional, Dict, List, BinaryIO, Tuple
 from datetime import datetime, timedelta
 from botocore.exceptions import ClientError
 from fastapi import UploadFile, HTTPException
@@ -15,6 +17,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Розмір частини multipart upload (мінімум S3 - 5MB для всіх частин, крім останньої)
+MULTIPART_PART_SIZE = int(os.getenv("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024)))
+# Скільки частин завантажується паралельно.
+# Пам'ять на одне завантаження: MULTIPART_PART_SIZE * (MULTIPART_CONCURRENCY + 2)
+MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", "4"))
+
 
 class S3Service:
     """
@@ -27,6 +35,8 @@ class S3Service:
         self.aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
         self.bucket_name = os.getenv("AWS_S3_BUCKET", "ohmyrevit-storage")
         self.region = os.getenv("AWS_REGION", "eu-central-1")
+        # Для MinIO / moto server: http://localhost:9000
+        self.endpoint_url = os.getenv("AWS_S3_ENDPOINT_URL") or None
 
         if not self.aws_access_key or not self.aws_secret_key:
             raise ValueError("AWS credentials not found in environment variables")
@@ -36,7 +46,8 @@ class S3Service:
             's3',
             aws_access_key_id=self.aws_access_key,
             aws_secret_access_key=self.aws_secret_key,
-            region_name=self.region
+            region_name=self.region,
+            endpoint_url=self.endpoint_url
         )
 
         # Структура папок в S3
@@ -62,16 +73,43 @@ class S3Service:
         # Отримуємо розширення
         extension = os.path.splitext(original_filename)[1].lower()
 
-        # Генеруємо унікальний ідентифікатор
+        # Генеруємо унікальний ідентифікатор: uuid4, а не хеш імені та часу -
+        # однакові імена в ту саму секунду не повинні ділити тимчасовий ключ
         timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        random_hash = hashlib.md5(f"{original_filename}{timestamp}".encode()).hexdigest()[:8]
 
         # Формуємо нове ім'я
-        new_filename = f"{timestamp}_{random_hash}{extension}"
+        new_filename = f"{timestamp}_{uuid.uuid4().hex}{extension}"
 
         # Повертаємо повний шлях
         return f"{folder}{new_filename}"
 
+    def content_addressed_key(self, folder_type: str, sha256: str, original_filename: str) -> str:
+        """
+        Ключ файлу за його вмістом: archives/ab/ab12...ef.zip
+        Однаковий вміст - однаковий ключ, тому дублікати не зберігаються.
+        """
+        extension = os.path.splitext(original_filename)[1].lower()
+        return f"{self.folders[folder_type]}{sha256[:2]}/{sha256}{extension}"
+
+    def _promote_upload(self, temp_key: str, s3_key: str, acl: str) -> bool:
+        """
+        Перенести тимчасовий обʼєкт під ключ вмісту
+
+        Returns:
+            True якщо такий вміст вже був у бакеті (дублікат)
+        """
+        deduplicated = self.get_file_info(s3_key) is not None
+        if not deduplicated:
+            # Метадані копіюються разом з обʼєктом, ACL - ні
+            self.s3_client.copy_object(
+                CopySource={'Bucket': self.bucket_name, 'Key': temp_key},
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                ACL=acl
+            )
+        self.delete_file(temp_key)
+        return deduplicated
+
     async def upload_file(
             self,
             file: UploadFile,
@@ -123,21 +161,10 @@ class S3Service:
             else:
                 max_size = 100 * 1024 * 1024  # 100MB за замовчуванням
 
-            # Читаємо файл
-            file_content = await file.read()
-            file_size = len(file_content)
-
-            # Перевіряємо розмір
-            if file_size > max_size:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"File too large. Maximum size: {max_size // (1024 * 1024)}MB"
-                )
-
-            # Генеруємо унікальне ім'я
-            s3_key = self._generate_unique_filename(
+            # Спочатку пишемо в тимчасовий ключ - SHA-256 вмісту відомий лише після завантаження
+            temp_key = self._generate_unique_filename(
                 file.filename,
-                self.folders[folder_type]
+                self.folders['temp']
             )
 
             # Визначаємо MIME тип
@@ -146,8 +173,7 @@ class S3Service:
             # Підготовка метаданих
             s3_metadata = {
                 'original-filename': file.filename,
-                'upload-date': datetime.utcnow().isoformat(),
-                'file-size': str(file_size)
+                'upload-date': datetime.utcnow().isoformat()
             }
 
             if metadata:
@@ -156,16 +182,15 @@ class S3Service:
             # Налаштування доступу
             acl = 'public-read' if public else 'private'
 
-            # Завантажуємо на S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=file_content,
-                ContentType=content_type,
-                ACL=acl,
-                Metadata=s3_metadata
+            # Потокове завантаження на S3 (файл не читається в пам'ять повністю)
+            file_size, sha256 = await self._stream_upload(
+                file, temp_key, max_size, content_type, acl, s3_metadata
             )
 
+            # Остаточний ключ - за вмістом; дублікат не зберігається вдруге
+            s3_key = self.content_addressed_key(folder_type, sha256, file.filename)
+            deduplicated = await asyncio.to_thread(self._promote_upload, temp_key, s3_key, acl)
+
             # Формуємо URL
             if public:
                 file_url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{s3_key}"
@@ -178,11 +203,15 @@ class S3Service:
                 "file_url": file_url,
                 "s3_key": s3_key,
                 "file_size": file_size,
+                "sha256": sha256,
+                "deduplicated": deduplicated,
                 "content_type": content_type,
                 "original_filename": file.filename,
                 "uploaded_at": datetime.utcnow().isoformat()
             }
 
+        except HTTPException:
+            raise
         except ClientError as e:
             print(f"AWS S3 Error: {e}")
             raise HTTPException(
@@ -196,6 +225,140 @@ class S3Service:
                 detail=f"Upload failed: {str(e)}"
             )
 
+    async def _read_part(self, file: UploadFile, size: int) -> bytes:
+        """
+        Прочитати з UploadFile рівно size байт (менше - лише в кінці файлу)
+        """
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = await file.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    async def _stream_upload(
+            self,
+            file: UploadFile,
+            s3_key: str,
+            max_size: int,
+            content_type: str,
+            acl: str,
+            s3_metadata: Dict
+    ) -> Tuple[int, str]:
+        """
+        Завантажити файл на S3 частинами, не тримаючи його в пам'яті.
+        Ліміт розміру перевіряється після кожної частини, SHA-256 рахується на льоту.
+        Файл в одну частину відправляється звичайним put_object.
+
+        Returns:
+            (розмір файлу, sha256 hex)
+        """
+        hasher = hashlib.sha256()
+        file_size = 0
+
+        def too_large() -> HTTPException:
+            return HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size: {max_size // (1024 * 1024)}MB"
+            )
+
+        part = await self._read_part(file, MULTIPART_PART_SIZE)
+        hasher.update(part)
+        file_size += len(part)
+        if file_size > max_size:
+            raise too_large()
+
+        next_part = await self._read_part(file, MULTIPART_PART_SIZE)
+        if not next_part:
+            # Маленький файл - одна операція put_object
+            await asyncio.to_thread(
+                self.s3_client.put_object,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Body=part,
+                ContentType=content_type,
+                ACL=acl,
+                Metadata={**s3_metadata, 'file-size': str(file_size), 'sha256': hasher.hexdigest()}
+            )
+            return file_size, hasher.hexdigest()
+
+        upload = await asyncio.to_thread(
+            self.s3_client.create_multipart_upload,
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            ContentType=content_type,
+            ACL=acl,
+            Metadata=s3_metadata
+        )
+        upload_id = upload['UploadId']
+
+        # Семафор обмежує кількість частин у пам'яті
+        semaphore = asyncio.Semaphore(MULTIPART_CONCURRENCY)
+        completed_parts: List[Dict] = []
+        tasks: List[asyncio.Task] = []
+
+        async def upload_part(part_number: int, body: bytes) -> None:
+            try:
+                response = await asyncio.to_thread(
+                    self.s3_client.upload_part,
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+                completed_parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+            finally:
+                semaphore.release()
+
+        try:
+            part_number = 1
+            while part:
+                await semaphore.acquire()
+                # Якщо якась частина вже впала - далі не читаємо
+                failed = next((t for t in tasks if t.done() and t.exception()), None)
+                if failed:
+                    semaphore.release()
+                    raise failed.exception()
+
+                tasks.append(asyncio.create_task(upload_part(part_number, part)))
+                part_number += 1
+
+                part, next_part = next_part, None
+                if part:
+                    hasher.update(part)
+                    file_size += len(part)
+                    if file_size > max_size:
+                        raise too_large()
+                    next_part = await self._read_part(file, MULTIPART_PART_SIZE)
+
+            await asyncio.gather(*tasks)
+
+            completed_parts.sort(key=lambda p: p['PartNumber'])
+            await asyncio.to_thread(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': completed_parts}
+            )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.to_thread(
+                self.s3_client.abort_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id
+            )
+            raise
+
+        return file_size, hasher.hexdigest()
+
     def generate_presigned_url(
             self,
             s3_key: str,
@@ -0,0 +1,144 @@
+"""
+Сервіс повнотекстового пошуку по каталогу товарів
+Підтримує окремий tsvector для кожної мови та GIN індекси
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Double, cast, false, func, literal, or_, text
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+
+
+class SearchService:
+    """
+    Сервіс для роботи з пошуковим індексом товарів
+    """
+
+    # Мова товару -> конфігурація PostgreSQL full-text search
+    # Для української немає вбудованого словника, тому використовуємо 'simple'
+    SEARCH_CONFIGS = {
+        "en": "english",
+        "ua": "simple",
+        "ru": "russian",
+    }
+
+    # Фронтенд інколи передає 'uk' замість 'ua'
+    LANGUAGE_ALIASES = {
+        "uk": "ua",
+    }
+
+    # Обмеження кількості слів у запиті, щоб не будувати гігантські tsquery
+    MAX_QUERY_TERMS = 8
+
+    def normalize_language(self, language: Optional[str]) -> str:
+        """
+        Привести код мови до ключа, що використовується в мультимовних полях
+
+        Args:
+            language: Код мови з запиту (en, ua, uk, ru)
+
+        Returns:
+            Ключ мови з SEARCH_CONFIGS
+        """
+        language = self.LANGUAGE_ALIASES.get(language, language)
+        return language if language in self.SEARCH_CONFIGS else "en"
+
+    def _vector_sql(self, language: str) -> str:
+        """
+        SQL-вираз для побудови tsvector однієї мови з title/description/sku
+        """
+        config = self.SEARCH_CONFIGS[language]
+        return (
+            f"setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+            f"setweight(to_tsvector('{config}', coalesce(title->>'{language}', title->>'en', '')), 'A') || "
+            f"setweight(to_tsvector('{config}', coalesce(description->>'{language}', description->>'en', '')), 'B')"
+        )
+
+    def _refresh_sql(self, where_clause: str = "") -> str:
+        """
+        UPDATE, що перераховує всі мовні вектори
+        """
+        assignments = ",\n    ".join(
+            f"search_vector_{language} = {self._vector_sql(language)}"
+            for language in self.SEARCH_CONFIGS
+        )
+        return f"UPDATE products SET\n    {assignments}\n{where_clause}"
+
+    def refresh_product_search(self, db: Session, product_id: int) -> None:
+        """
+        Синхронно оновити пошуковий індекс одного товару.
+        Викликається після створення або редагування товару (до commit).
+
+        Args:
+            db: Сесія БД
+            product_id: ID товару
+        """
+        db.execute(
+            text(self._refresh_sql("WHERE id = :product_id")),
+            {"product_id": product_id}
+        )
+
+    def rebuild_search_index(self, db: Session) -> int:
+        """
+        Перебудувати пошукові вектори для всього каталогу
+
+        Args:
+            db: Сесія БД
+
+        Returns:
+            Кількість оновлених товарів
+        """
+        result = db.execute(text(self._refresh_sql()))
+        db.commit()
+        return result.rowcount
+
+    def _tokenize(self, search: str) -> List[str]:
+        """
+        Розбити пошуковий рядок на слова, безпечні для to_tsquery
+        """
+        terms = re.findall(r"\w+", search.lower())
+        return terms[:self.MAX_QUERY_TERMS]
+
+    def build_search_clause(self, search: str) -> Optional[Tuple]:
+        """
+        Побудувати фільтр та вираз релевантності для пошуку
+
+        Кожне слово шукається як префікс (term:*), щоб пошук працював
+        під час набору тексту. Збіг шукається у всіх мовних векторах,
+        релевантність - найкраща серед мов.
+
+        Args:
+            search: Пошуковий рядок користувача
+
+        Returns:
+            (filter_clause, rank_expression) або None, якщо запит порожній.
+            Запит без жодного слова (напр. "!!!") нічого не знаходить,
+            а не повертає весь каталог
+        """
+        if not search or not search.strip():
+            return None
+
+        terms = self._tokenize(search)
+        if not terms:
+            return false(), literal(0.0)
+
+        query_string = " & ".join(f"{term}:*" for term in terms)
+
+        matches = []
+        ranks = []
+        for language, config in self.SEARCH_CONFIGS.items():
+            vector = getattr(Product, f"search_vector_{language}")
+            ts_query = func.to_tsquery(config, query_string)
+            matches.append(vector.op("@@")(ts_query))
+            ranks.append(func.ts_rank_cd(vector, ts_query))
+
+        # ts_rank_cd повертає float4; курсор передає значення як float8,
+        # тому порівнюємо та сортуємо вже приведений до float8 вираз
+        return or_(*matches), cast(func.greatest(*ranks), Double)
+
+
+# Створюємо глобальний екземпляр сервісу
+search_service = SearchService()
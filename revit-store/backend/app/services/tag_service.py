@@ -0,0 +1,139 @@
+"""
+Сервіс для роботи з тегами товарів
+Таблиці tags та product_tags - основне сховище тегів,
+JSON-поле Product.tags лише дублює їх для відображення
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, exists, false, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.product import Product, Tag, product_tags
+
+
+class TagService:
+    """
+    Сервіс для синхронізації та фільтрації тегів
+    """
+
+    MAX_SLUG_LENGTH = 50
+
+    def make_slug(self, tag: str) -> str:
+        """
+        Перетворити назву тегу на slug (modern, classic, ...)
+        """
+        return tag.strip().lower()[:self.MAX_SLUG_LENGTH]
+
+    def normalize_tags(self, tags: Optional[List[str]]) -> List[str]:
+        """
+        Прибрати порожні теги та дублікати, зберігаючи порядок
+
+        Args:
+            tags: Список тегів від творця/адміна
+
+        Returns:
+            Очищений список тегів
+        """
+        result = []
+        seen = set()
+        for tag in tags or []:
+            if not isinstance(tag, str):
+                continue
+            tag = tag.strip()
+            slug = self.make_slug(tag)
+            if slug and slug not in seen:
+                seen.add(slug)
+                result.append(tag)
+        return result
+
+    def parse_tags_param(self, tags: Optional[str]) -> List[str]:
+        """
+        Розібрати параметр запиту "modern,classic" у список slug-ів
+        """
+        if not tags:
+            return []
+        return [self.make_slug(tag) for tag in self.normalize_tags(tags.split(','))]
+
+    def sync_product_tags(self, db: Session, product: Product, tags: Optional[List[str]]) -> List[str]:
+        """
+        Записати теги товару в product_tags та оновити Product.tags.
+        Викликається до commit, товар повинен мати ID (після flush).
+
+        Args:
+            db: Сесія БД
+            product: Товар
+            tags: Новий список тегів
+
+        Returns:
+            Збережений список тегів
+        """
+        tags = self.normalize_tags(tags)
+        product.tags = tags
+
+        if product.id is None:
+            db.flush()
+
+        slugs = [self.make_slug(tag) for tag in tags]
+
+        if slugs:
+            # Створюємо відсутні теги (безпечно при паралельних запитах)
+            db.execute(
+                insert(Tag).values([
+                    {"slug": self.make_slug(tag), "name": {"en": tag}, "created_at": datetime.utcnow()}
+                    for tag in tags
+                ]).on_conflict_do_nothing(index_elements=["slug"])
+            )
+
+        db.execute(delete(product_tags).where(product_tags.c.product_id == product.id))
+
+        if slugs:
+            tag_ids = db.execute(select(Tag.id).where(Tag.slug.in_(slugs))).scalars().all()
+            db.execute(
+                insert(product_tags).values([
+                    {"product_id": product.id, "tag_id": tag_id} for tag_id in tag_ids
+                ]).on_conflict_do_nothing()
+            )
+
+        return tags
+
+    async def build_tag_filter(self, db: AsyncSession, slugs: List[str], mode: str = "all"):
+        """
+        Побудувати індексований фільтр товарів по тегах
+
+        Args:
+            db: Асинхронна сесія БД
+            slugs: Список slug-ів
+            mode: all - товар має всі теги (AND), any - хоча б один (OR)
+
+        Returns:
+            SQLAlchemy умова для Product
+        """
+        tag_ids = (await db.execute(select(Tag.id).where(Tag.slug.in_(slugs)))).scalars().all()
+
+        if mode == "any":
+            if not tag_ids:
+                return false()
+            return Product.id.in_(
+                select(product_tags.c.product_id).where(product_tags.c.tag_id.in_(tag_ids))
+            )
+
+        # AND: якщо хоча б одного тегу не існує - результатів немає
+        if len(tag_ids) < len(set(slugs)):
+            return false()
+
+        # Кожна умова - пошук по первинному ключу (product_id, tag_id)
+        return and_(*[
+            exists().where(
+                product_tags.c.product_id == Product.id,
+                product_tags.c.tag_id == tag_id
+            )
+            for tag_id in tag_ids
+        ])
+
+
+# Створюємо глобальний екземпляр сервісу
+tag_service = TagService()
@@ -35,6 +35,14 @@ class TelegramAuth:
         if not self.bot_token:
             raise ValueError("TELEGRAM_BOT_TOKEN не встановлений в .env файлі!")
 
+        # Секретні ключі залежать лише від токена - обчислюємо один раз на процес
+        self._webapp_secret_key = hmac.new(
+            b"WebAppData",
+            self.bot_token.encode(),
+            hashlib.sha256
+        ).digest()
+        self._widget_secret_key = hashlib.sha256(self.bot_token.encode()).digest()
+
     def validate_init_data(self, init_data: str) -> bool:
         """
         Перевіряє підпис даних від Telegram Web App
@@ -65,16 +73,9 @@ class TelegramAuth:
                 f"{key}={unquote(value)}" for key, value in sorted(parsed_data.items())
             )
 
-            # Створюємо секретний ключ
-            secret_key = hmac.new(
-                b"WebAppData",
-                self.bot_token.encode(),
-                hashlib.sha256
-            ).digest()
-
             # Обчислюємо очікуваний hash
             expected_hash = hmac.new(
-                secret_key,
+                self._webapp_secret_key,
                 data_check_string.encode(),
                 hashlib.sha256
             ).hexdigest()
@@ -100,9 +101,8 @@ class TelegramAuth:
             data_check_list.sort()
             data_check_string = "\n".join(data_check_list)
 
-            secret_key = hashlib.sha256(self.bot_token.encode()).digest()
             expected_hash = hmac.new(
-                secret_key, data_check_string.encode(), hashlib.sha256
+                self._widget_secret_key, data_check_string.encode(), hashlib.sha256
             ).hexdigest()
 
             return hmac.compare_digest(received_hash, expected_hash)
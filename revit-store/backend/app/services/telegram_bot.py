@@ -9,9 +9,24 @@ from typing import Optional, List, Dict
 import httpx
 from dotenv import load_dotenv
 
+from app.services.http_clients import http_clients
+from app.services.telegram_file_cache import telegram_file_cache
+
 # Завантажуємо змінні оточення
 load_dotenv()
 
+# Фрагменти description помилки 400, що означають недійсний file_id.
+# Інші 400 (chat not found, bot was blocked, помилки caption) - не привід завантажувати файл заново
+STALE_FILE_ID_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference expired",
+    "file_reference_expired",
+    "wrong file_id",
+    "invalid file_id",
+    "type of file mismatch",
+)
+
 class TelegramBotService:
     """
     Сервіс для взаємодії з Telegram Bot API
@@ -22,7 +37,9 @@ class TelegramBotService:
         if not self.bot_token or self.bot_token == "your_telegram_bot_token":
             print("⚠️ TELEGRAM_BOT_TOKEN не встановлений. Сервіс буде працювати в режимі логування.")
             self.bot_token = None
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}"
+        # TELEGRAM_API_URL дозволяє підставити локальний фейковий Telegram API (тести, навантаження)
+        self.api_base_url = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+        self.api_url = f"{self.api_base_url}/bot{self.bot_token}"
 
     async def _make_request(self, method: str, data: Dict, files: Optional[Dict] = None) -> Optional[Dict]:
         """
@@ -43,17 +60,22 @@ class TelegramBotService:
             "json": data if not is_multipart else None,
         }
 
-        async with httpx.AsyncClient() as client:
+        client = http_clients.get("telegram")
+        try:
+            response = await client.post(f"{self.api_url}/{method}", **request_kwargs)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            print(f"❌ Помилка HTTP запиту до Telegram API: {e.response.status_code} - {e.response.text}")
+            # Telegram повертає {"ok": false, "error_code": ..., "parameters": {"retry_after": ...}}
             try:
-                response = await client.post(f"{self.api_url}/{method}", **request_kwargs)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                print(f"❌ Помилка HTTP запиту до Telegram API: {e.response.status_code} - {e.response.text}")
-            except httpx.RequestError as e:
-                print(f"❌ Помилка запиту до Telegram API: {e}")
-            except Exception as e:
-                print(f"❌ Невідома помилка при роботі з Telegram API: {e}")
+                return e.response.json()
+            except ValueError:
+                pass
+        except httpx.RequestError as e:
+            print(f"❌ Помилка запиту до Telegram API: {e}")
+        except Exception as e:
+            print(f"❌ Невідома помилка при роботі з Telegram API: {e}")
         return None
 
     async def send_message(
@@ -66,6 +88,21 @@ class TelegramBotService:
         """
         Відправити текстове повідомлення користувачу.
         """
+        response = await self.send_message_response(telegram_id, message, parse_mode, reply_markup)
+        return bool(response and response.get("ok", False))
+
+    async def send_message_response(
+            self,
+            telegram_id: int,
+            message: str,
+            parse_mode: str = "HTML",
+            reply_markup: Optional[Dict] = None
+    ) -> Optional[Dict]:
+        """
+        Відправити текстове повідомлення та повернути повну відповідь Telegram API
+        (потрібно розсилкам, щоб обробляти error_code та retry_after).
+        None - мережева помилка.
+        """
         payload = {
             "chat_id": telegram_id,
             "text": message,
@@ -75,8 +112,7 @@ class TelegramBotService:
             # Використовуємо json.dumps для коректної серіалізації клавіатури
             payload["reply_markup"] = json.dumps(reply_markup)
 
-        response = await self._make_request("sendMessage", data=payload)
-        return response and response.get("ok", False)
+        return await self._make_request("sendMessage", data=payload)
 
     async def send_photo(
             self,
@@ -135,6 +171,78 @@ class TelegramBotService:
             print(f"❌ Не вдалося відкрити файл документа: {e}")
             return False
 
+    def _extract_file_id(self, response: Optional[Dict], field: str) -> Optional[str]:
+        result = (response or {}).get("result")
+        if not isinstance(result, dict):
+            return None
+        media = result.get(field)
+        # Для фото Telegram повертає список розмірів - беремо найбільший
+        if isinstance(media, list):
+            media = media[-1] if media else None
+        return media.get("file_id") if isinstance(media, dict) else None
+
+    async def _send_cached_file(
+        self,
+        method: str,
+        field: str,
+        telegram_id: int,
+        product_id: int,
+        kind: str,
+        file_url: str,
+        file_path: str,
+        filename: str,
+        caption: Optional[str] = None,
+        parse_mode: str = "HTML"
+    ) -> bool:
+        """
+        Відправити файл товару за кешованим file_id, а якщо його немає
+        або Telegram його відхилив - завантажити файл і запамʼятати новий file_id.
+        """
+        payload = {"chat_id": telegram_id, "parse_mode": parse_mode}
+        if caption:
+            payload["caption"] = caption
+
+        file_id, is_own = await telegram_file_cache.get(product_id, kind, file_url)
+        if file_id:
+            response = await self._make_request(method, data={**payload, field: file_id})
+            if response and response.get("ok"):
+                if not is_own:
+                    # file_id іншого товару з тим самим вмістом - запамʼятовуємо для цього товару
+                    await self._remember_file_id(product_id, kind, file_url, file_id)
+                return True
+            if not self._is_stale_file_id(response):
+                return False
+            # file_id більше не дійсний - завантажуємо файл заново
+            await telegram_file_cache.forget(file_id)
+
+        try:
+            with open(file_path, "rb") as file_object:
+                response = await self._make_request(method, data=payload, files={field: (filename, file_object)})
+        except IOError as e:
+            print(f"❌ Не вдалося відкрити файл: {e}")
+            return False
+
+        if not (response and response.get("ok")):
+            return False
+
+        new_file_id = self._extract_file_id(response, field)
+        if new_file_id:
+            await self._remember_file_id(product_id, kind, file_url, new_file_id)
+        return True
+
+    def _is_stale_file_id(self, response: Optional[Dict]) -> bool:
+        if not response or response.get("error_code") != 400:
+            return False
+        description = (response.get("description") or "").lower()
+        return any(marker in description for marker in STALE_FILE_ID_ERRORS)
+
+    async def _remember_file_id(self, product_id: int, kind: str, file_url: str, file_id: str) -> None:
+        try:
+            await telegram_file_cache.set(product_id, kind, file_url, file_id)
+        except Exception as e:
+            # Файл вже доставлено - помилка кешу не повинна впливати на результат
+            print(f"⚠️ Не вдалося зберегти file_id: {e}")
+
     async def send_archive_message(
         self,
         telegram_id: int,
@@ -144,6 +252,7 @@ class TelegramBotService:
     ) -> bool:
         """
         Відправляє повідомлення з архівом, фото та описом.
+        Файли завантажуються в Telegram лише при першій відправці, далі - за file_id.
         """
         caption = (
             f"<b>{product.get_title(language)}</b>\n\n"
@@ -154,16 +263,19 @@ class TelegramBotService:
 
         try:
             if product.preview_images:
-                preview_path = os.path.join("/app", product.preview_images[0].lstrip('/'))
+                preview_url = product.preview_images[0]
+                preview_path = os.path.join("/app", preview_url.lstrip('/'))
                 if os.path.exists(preview_path):
-                    await self.send_photo(telegram_id, photo_path_or_url=preview_path)
+                    await self._send_cached_file(
+                        "sendPhoto", "photo", telegram_id, product.id, "preview",
+                        preview_url, preview_path, os.path.basename(preview_path)
+                    )
 
-            success = await self.send_document(
-                telegram_id,
-                file_path=file_path,
-                caption=caption
+            extension = os.path.splitext(file_path)[1]
+            return await self._send_cached_file(
+                "sendDocument", "document", telegram_id, product.id, "archive",
+                product.file_url, file_path, f"{product.sku}{extension}", caption=caption
             )
-            return success
         except Exception as e:
             print(f"❌ Помилка відправки архіву через бота: {e}")
             return False
@@ -201,16 +313,13 @@ class TelegramBotService:
             parse_mode: str = "HTML"
     ) -> Dict:
         """
-        Масова розсилка повідомлень.
+        Масова розсилка повідомлень з очікуванням результату.
+        Паралельно та з дотриманням лімітів Telegram (див. broadcast_service).
+        Для великих аудиторій використовуйте broadcast_service.start_job.
         """
-        sent = 0
-        failed = 0
-        for telegram_id in telegram_ids:
-            if await self.send_message(telegram_id, message, parse_mode):
-                sent += 1
-            else:
-                failed += 1
-        return {"total": len(telegram_ids), "sent": sent, "failed": failed}
+        from app.services.broadcast_service import BroadcastEngine
+
+        return await BroadcastEngine(self).run(telegram_ids, message, parse_mode)
 
     async def set_webhook(self, webhook_url: str) -> bool:
         """
@@ -0,0 +1,86 @@
+"""
+Кеш Telegram file_id для архівів та превʼю, що відправляються ботом
+Файл завантажується в Telegram один раз, далі відправляється за file_id
+"""
+
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import AsyncSessionLocal
+from app.models.media import TelegramFileCache
+
+
+class TelegramFileCacheService:
+    """
+    file_id зберігається для пари (товар, тип файлу) разом зі шляхом файлу.
+    Шлях формується з SHA-256 вмісту, тож заміна архіву чи превʼю змінює шлях
+    і старий file_id автоматично перестає використовуватись.
+    """
+
+    async def get(self, product_id: int, kind: str, path: str) -> Tuple[Optional[str], bool]:
+        """
+        file_id для поточного файлу товару
+
+        Args:
+            product_id: ID товару
+            kind: archive або preview
+            path: Поточний шлях файлу (/media/...)
+
+        Returns:
+            (file_id або None, якщо файл ще не надсилався;
+             True, якщо file_id збережено саме для цього товару)
+        """
+        async with AsyncSessionLocal() as db:
+            file_id = (await db.execute(
+                select(TelegramFileCache.file_id).where(
+                    TelegramFileCache.product_id == product_id,
+                    TelegramFileCache.kind == kind,
+                    TelegramFileCache.path == path
+                )
+            )).scalar_one_or_none()
+            if file_id:
+                return file_id, True
+
+            # Такий самий вміст вже надсилався для іншого товару
+            return (await db.execute(
+                select(TelegramFileCache.file_id).where(
+                    TelegramFileCache.path == path,
+                    TelegramFileCache.kind == kind
+                ).order_by(TelegramFileCache.updated_at.desc()).limit(1)
+            )).scalar_one_or_none(), False
+
+    async def set(self, product_id: int, kind: str, path: str, file_id: str) -> None:
+        """
+        Запамʼятати file_id (замінює запис для попереднього файлу товару)
+        """
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                insert(TelegramFileCache).values(
+                    product_id=product_id,
+                    kind=kind,
+                    path=path,
+                    file_id=file_id,
+                    created_at=now,
+                    updated_at=now
+                ).on_conflict_do_update(
+                    constraint="uq_telegram_file_cache_product_kind",
+                    set_={"path": path, "file_id": file_id, "updated_at": now}
+                )
+            )
+            await db.commit()
+
+    async def forget(self, file_id: str) -> None:
+        """
+        Видалити file_id, який Telegram більше не приймає
+        """
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(TelegramFileCache).where(TelegramFileCache.file_id == file_id))
+            await db.commit()
+
+
+# Створюємо глобальний екземпляр сервісу
+telegram_file_cache = TelegramFileCacheService()
@@ -0,0 +1,211 @@
+"""
+Допоміжні функції для пагінації
+Курсорна (keyset) пагінація та кешований підрахунок total
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.cache_service import cache_service
+
+# Час життя кешованого total для курсорного режиму
+COUNT_CACHE_TTL = 60
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort_by: str, value: Any, row_id: int) -> str:
+    """
+    Закодувати позицію в непрозорий курсор
+
+    Args:
+        sort_by: Назва поля сортування
+        value: Значення поля сортування останнього елемента
+        row_id: ID останнього елемента
+
+    Returns:
+        Курсор (base64url рядок)
+    """
+    payload = json.dumps({"s": sort_by, "v": _encode_value(value), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort_by: str) -> Optional[Dict]:
+    """
+    Розкодувати курсор. Порожній курсор означає першу сторінку.
+
+    Args:
+        cursor: Курсор з запиту
+        sort_by: Поточне поле сортування (повинно збігатися з курсором)
+
+    Returns:
+        {"value": ..., "id": ...} або None для першої сторінки
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if payload["s"] != sort_by:
+            raise ValueError("sort mismatch")
+        return {"value": _decode_value(payload["v"]), "id": int(payload["id"])}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Невалідний курсор пагінації")
+
+
+def _apply_keyset(query, sort_by: str, sort_expression, id_column, cursor: Optional[str], limit: int, descending: bool):
+    """
+    Додати до запиту (Query або select()) умову курсора, сортування та limit + 1
+    """
+    position = decode_cursor(cursor, sort_by)
+
+    if position is not None:
+        key = tuple_(sort_expression, id_column)
+        # Значення курсора з типом виразу сортування (напр. float8 для релевантності)
+        bound = tuple_(literal(position["value"], type_=sort_expression.type), position["id"])
+        query = query.filter(key < bound if descending else key > bound)
+
+    if descending:
+        query = query.order_by(sort_expression.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expression.asc(), id_column.asc())
+
+    return query.limit(limit + 1)
+
+
+def _page_and_cursor(
+        rows: List[Any],
+        sort_by: str,
+        sort_expression,
+        limit: int,
+        value_getter: Optional[Callable[[Any], Any]],
+        id_getter: Optional[Callable[[Any], int]]
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Обрізати зайвий рядок та сформувати курсор наступної сторінки
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = value_getter(last) if value_getter else getattr(last, sort_expression.key)
+        row_id = id_getter(last) if id_getter else last.id
+        next_cursor = encode_cursor(sort_by, value, row_id)
+
+    return rows, next_cursor
+
+
+def keyset_paginate(
+        query,
+        sort_by: str,
+        sort_expression,
+        id_column,
+        cursor: Optional[str],
+        limit: int,
+        descending: bool = True,
+        value_getter: Optional[Callable[[Any], Any]] = None,
+        id_getter: Optional[Callable[[Any], int]] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Отримати сторінку через keyset-пагінацію (без OFFSET)
+
+    Args:
+        query: SQLAlchemy запит без сортування
+        sort_by: Назва поля сортування (записується в курсор)
+        sort_expression: Колонка або вираз сортування
+        id_column: Колонка ID для стабільного порядку
+        cursor: Курсор з попередньої сторінки ("" - перша сторінка)
+        limit: Розмір сторінки
+        descending: Напрямок сортування
+        value_getter: Як отримати значення сортування з рядка
+        id_getter: Як отримати ID з рядка
+
+    Returns:
+        (рядки сторінки, курсор наступної сторінки або None)
+    """
+    rows = _apply_keyset(query, sort_by, sort_expression, id_column, cursor, limit, descending).all()
+    return _page_and_cursor(rows, sort_by, sort_expression, limit, value_getter, id_getter)
+
+
+async def keyset_paginate_async(
+        db: AsyncSession,
+        stmt: Select,
+        sort_by: str,
+        sort_expression,
+        id_column,
+        cursor: Optional[str],
+        limit: int,
+        descending: bool = True,
+        value_getter: Optional[Callable[[Any], Any]] = None,
+        id_getter: Optional[Callable[[Any], int]] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    keyset_paginate для AsyncSession та select().
+    Якщо select() містить одну сутність, повертаються об'єкти, інакше - рядки.
+    """
+    stmt = _apply_keyset(stmt, sort_by, sort_expression, id_column, cursor, limit, descending)
+    result = await db.execute(stmt)
+    rows = result.scalars().all() if len(stmt.column_descriptions) == 1 else result.all()
+    return _page_and_cursor(list(rows), sort_by, sort_expression, limit, value_getter, id_getter)
+
+
+async def count_rows(db: AsyncSession, stmt: Select) -> int:
+    """
+    Порахувати кількість рядків select() через AsyncSession
+    """
+    count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+    return (await db.execute(count_stmt)).scalar_one()
+
+
+async def cached_count(
+        counter: Callable[[], Union[int, Awaitable[int]]],
+        namespace: str,
+        filters: Dict,
+        ttl: int = COUNT_CACHE_TTL
+) -> int:
+    """
+    Порахувати кількість рядків з кешуванням на ttl секунд.
+    Використовується в курсорному режимі, де точний total не критичний.
+
+    Args:
+        counter: Функція підрахунку (sync або async), напр. lambda: query.count()
+        namespace: Префікс ключа (назва списку)
+        filters: Параметри фільтрації, що визначають результат
+
+    Returns:
+        Кількість рядків (можливо застаріла на ttl секунд)
+    """
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True, default=str).encode()).hexdigest()
+    return await cache_service.get_or_set(f"count:{namespace}:{digest}", counter, ttl)
+
+
+def cursor_pagination_info(limit: int, next_cursor: Optional[str], total: int) -> Dict:
+    """
+    Сформувати блок pagination для курсорного режиму
+    """
+    return {
+        "mode": "cursor",
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "has_next": next_cursor is not None,
+        "total": total,
+        "total_is_approximate": True
+    }
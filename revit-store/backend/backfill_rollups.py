@@ -0,0 +1,63 @@
+"""
+Перерахунок щоденних агрегатів (daily_stats, daily_product_sales, daily_active_users)
+з сирих таблиць. Запускається один раз після міграції, а також для виправлення
+розбіжностей за будь-який діапазон днів - перерахунок ідемпотентний.
+
+    python backfill_rollups.py                                  # від першого замовлення / користувача до сьогодні
+    python backfill_rollups.py --from 2026-09-01 --to 2026-09-30
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models.order import Order
+from app.models.user import User
+from app.services.rollup_service import rollup_service
+
+# Скільки днів перераховувати в одній транзакції
+CHUNK_DAYS = 31
+
+
+def earliest_date(db) -> date:
+    candidates = [
+        db.query(func.min(Order.created_at)).scalar(),
+        db.query(func.min(User.created_at)).scalar()
+    ]
+    candidates = [value.date() for value in candidates if value is not None]
+    return min(candidates) if candidates else datetime.utcnow().date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перерахунок щоденних агрегатів дашборду")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Перший день (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Останній день включно (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        date_from = args.date_from or earliest_date(db)
+        date_to = args.date_to or datetime.utcnow().date()
+        if date_from > date_to:
+            parser.error("--from must be before --to")
+
+        days = product_rows = 0
+        chunk_start = date_from
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), date_to)
+            result = rollup_service.rebuild(db, chunk_start, chunk_end)
+            db.commit()
+            days += result["days"]
+            product_rows += result["product_rows"]
+            print(f"✅ {chunk_start}..{chunk_end}: {result['product_rows']} рядків продажів")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        print(f"Готово: {days} днів, {product_rows} рядків продажів товарів")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Бенчмарк одночасного оформлення замовлень зі спільними промокодами
+Багато нових користувачів одночасно купують товар з промокодом, знижка якого
+покриває всю ціну. Нові користувачі не мають бонусів, тому замовлення
+проходить (200) лише якщо промокод вдалося застосувати - кількість успішних
+замовлень дорівнює кількості використань і не повинна перевищувати max_uses.
+
+    python bench_checkout.py --url http://localhost:8000 --bot-token <TOKEN> \\
+        --admin-token <JWT адміна> --product-id 42 --promo-codes 3 --max-uses 50 --users 500
+
+Промокоди BENCH<random>_<n> (fixed, discount_value = --discount) створюються
+через /api/admin/promocodes; --discount має бути не менше ціни товару.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+from bench_login import sign_init_data
+
+
+async def login(client: httpx.AsyncClient, bot_token: str, telegram_id: int) -> str:
+    response = await client.post("/api/auth/telegram", json={"init_data": sign_init_data(bot_token, telegram_id)})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def create_promo_codes(client: httpx.AsyncClient, admin_token: str, count: int, max_uses: int, discount: int) -> list:
+    prefix = f"BENCH{random.randint(10000, 99999)}"
+    codes = []
+    for n in range(count):
+        code = f"{prefix}_{n}"
+        response = await client.post(
+            "/api/admin/promocodes",
+            headers={"Authorization": f"Bearer {admin_token}"},
+            json={"code": code, "discount_type": "fixed", "discount_value": discount, "max_uses": max_uses}
+        )
+        response.raise_for_status()
+        codes.append(code)
+    return codes
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        codes = await create_promo_codes(client, args.admin_token, args.promo_codes, args.max_uses, args.discount)
+
+        base_id = random.randint(10 ** 9, 2 * 10 ** 9)
+
+        async def limited_login(i: int) -> str:
+            async with semaphore:
+                return await login(client, args.bot_token, base_id + i)
+
+        tokens = await asyncio.gather(*[limited_login(i) for i in range(args.users)])
+        print(f"Увійшло користувачів: {len(tokens)}, промокоди: {', '.join(codes)}")
+
+        latencies, statuses, used = [], Counter(), Counter()
+
+        async def checkout(token: str, code: str):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/api/orders/",
+                        headers={"Authorization": f"Bearer {token}"},
+                        json={
+                            "items": [{"product_id": args.product_id}],
+                            "payment_method": "bonuses",
+                            "promo_code": code
+                        }
+                    )
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    used[code] += 1
+
+        # Усі користувачі одночасно, кожен зі своїм із спільних промокодів
+        started = time.perf_counter()
+        await asyncio.gather(*[checkout(token, codes[i % len(codes)]) for i, token in enumerate(tokens)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"checkouts {len(latencies)}  {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms  "
+        f"p95 {p95 * 1000:7.1f} ms  statuses {dict(statuses)}"
+    )
+
+    oversubscribed = False
+    for code in codes:
+        mark = "✅" if used[code] <= args.max_uses else "❌"
+        oversubscribed |= used[code] > args.max_uses
+        print(f"{mark} {code}: використань {used[code]} / max_uses {args.max_uses}")
+
+    if oversubscribed:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк одночасного оформлення замовлень з промокодами")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--bot-token", required=True, help="TELEGRAM_BOT_TOKEN сервера")
+    parser.add_argument("--admin-token", required=True, help="JWT адміністратора (створення промокодів)")
+    parser.add_argument("--product-id", type=int, required=True)
+    parser.add_argument("--discount", type=int, default=100000, help="Фіксована знижка в центах (>= ціни товару)")
+    parser.add_argument("--promo-codes", type=int, default=3)
+    parser.add_argument("--max-uses", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Бенчмарк шару БД: requests/sec для каталогу, кошика, замовлень, бонусів та підписок
+Запустіть проти працюючого API до та після переходу на AsyncSession:
+
+    python bench_db.py --url http://localhost:8000 --token <JWT> --concurrency 50 --duration 20
+
+Один uvicorn worker, однакові дані в БД для обох запусків.
+checkout створює замовлення (оплата підпискою) - потрібен користувач з активною
+підпискою та товар --checkout-product, доступний по ній.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# Назва -> (метод, шлях)
+ENDPOINTS = {
+    "get_products": ("GET", "/api/products/?limit=20&sort_by=created_at"),
+    "get_cart": ("GET", "/api/orders/cart"),
+    "get_orders": ("GET", "/api/orders/?cursor="),
+    "daily_status": ("GET", "/api/bonuses/daily/status"),
+    "subscription_benefits": ("GET", "/api/subscriptions/benefits"),
+    "checkout": ("POST", "/api/orders/"),
+}
+
+
+async def worker(client: httpx.AsyncClient, method: str, path: str, body, deadline: float,
+                 latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url: str, token: str, name: str, concurrency: int, duration: float, checkout_product: int):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], []
+
+    method, path = ENDPOINTS[name]
+    body = {
+        "items": [{"product_id": checkout_product}],
+        "payment_method": "subscription"
+    } if name == "checkout" else None
+
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[
+            worker(client, method, path, body, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+
+    if not latencies:
+        print(f"{name:22} немає успішних запитів, помилки: {errors[:5]}")
+        return
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:22} {len(latencies) / duration:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95 {p95 * 1000:7.1f} ms  errors {len(errors)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк шару БД")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", default="", help="JWT токен (потрібен для всіх, крім get_products)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--only", choices=list(ENDPOINTS), default=None)
+    parser.add_argument("--checkout-product", type=int, default=3, help="ID товару для checkout")
+    args = parser.parse_args()
+
+    for name in [args.only] if args.only else ENDPOINTS:
+        asyncio.run(run(args.url, args.token, name, args.concurrency, args.duration, args.checkout_product))
+
+
+if __name__ == "__main__":
+    main()
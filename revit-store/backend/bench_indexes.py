@@ -0,0 +1,288 @@
+"""
+Перевірка індексів гарячих запитів через EXPLAIN
+Засіває реалістичний набір даних (користувачі, товари, замовлення, кошики,
+підписки, спіни, реферали), робить ANALYZE і перевіряє, що кожен гарячий
+запит роутерів використовує очікуваний індекс, а не Seq Scan.
+
+    alembic upgrade head
+    python bench_indexes.py                 # масштаб 1: ~50k користувачів, ~100k замовлень
+    python bench_indexes.py --scale 0.2 -v  # менший набір, з планами запитів
+
+Усе виконується в одній транзакції, яка в кінці відкочується - засіяні
+дані не лишаються в БД. Запускайте на staging / локальній копії, не на production.
+Код виходу 1, якщо хоча б один запит не використав індекс.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.database import SessionLocal
+from app.models.collection import Collection
+from app.models.order import Order, OrderItem, CartItem
+from app.models.product import Product
+from app.models.subscription import Subscription, DailyBonus, WheelSpin
+from app.models.user import User
+
+# Базові розміри набору даних (множаться на --scale)
+BASE_SIZES = {
+    "users": 50000,
+    "creators": 300,
+    "products": 20000,
+    "orders": 100000,
+    "items_per_order": 2,
+    "cart_items": 30000,
+    "subscriptions": 10000,
+    "wheel_spins": 200000,
+    "daily_bonuses": 100000,
+    "collections": 10000,
+}
+
+# Засіяні користувачі мають telegram_id від цього значення
+SEED_TELEGRAM_BASE = 9_000_000_000
+
+
+def seed(db, sizes: dict) -> dict:
+    """
+    Засіяти дані та повернути id, на яких перевіряються запити
+    """
+    params = dict(sizes, base=SEED_TELEGRAM_BASE, now=datetime.utcnow())
+
+    user_ids = db.execute(text("""
+        INSERT INTO users (telegram_id, username, first_name, language, balance, total_spent,
+                           is_creator, is_admin, is_blocked, referral_code, referred_by_id,
+                           referral_earnings, created_at, last_login)
+        SELECT :base + g, 'bench_' || g, 'Bench', 'uk', g % 100, (g % 7) * 1000,
+               g <= :creators, false, false, 'BENCH_' || g, NULL,
+               0, :now - make_interval(mins => g * 7), :now - make_interval(mins => g)
+        FROM generate_series(1, :users) AS g
+        RETURNING id
+    """), params).scalars().all()
+    user_ids.sort()
+    params["user_ids"] = user_ids
+
+    # Третина користувачів прийшла за посиланням одного з перших 500
+    db.execute(text("""
+        UPDATE users SET referred_by_id = (CAST(:user_ids AS integer[]))[1 + (id % 500)]
+        WHERE id = ANY(CAST(:user_ids AS integer[])) AND id % 3 = 0
+    """), params)
+
+    product_ids = db.execute(text("""
+        INSERT INTO products (sku, title, description, category, product_type, price, file_url,
+                              is_active, is_approved, creator_id, views_count, downloads_count,
+                              created_at, updated_at)
+        SELECT 'BENCH-' || g,
+               json_build_object('en', 'Bench ' || g, 'ua', 'Bench ' || g, 'ru', 'Bench ' || g),
+               json_build_object('en', '', 'ua', '', 'ru', ''),
+               CASE WHEN g % 5 = 0 THEN 'free' ELSE 'premium' END, 'furniture',
+               CASE WHEN g % 5 = 0 THEN 0 ELSE 100 + g % 900 END, '/media/archives/bench.zip',
+               g % 20 <> 0, g % 10 <> 0,
+               (CAST(:user_ids AS integer[]))[1 + (g % :creators)], 0, 0,
+               :now - make_interval(mins => g * 13), :now
+        FROM generate_series(1, :products) AS g
+        RETURNING id
+    """), params).scalars().all()
+    product_ids.sort()
+    params["product_ids"] = product_ids
+
+    order_ids = db.execute(text("""
+        INSERT INTO orders (order_number, user_id, subtotal, total, payment_method, payment_status,
+                            payment_id, status, created_at, completed_at)
+        SELECT 'BENCH-ORD-' || g,
+               (CAST(:user_ids AS integer[]))[1 + (g * 7919) % :users],
+               1000, 1000, 'crypto',
+               CASE WHEN g % 4 = 0 THEN 'pending' ELSE 'completed' END,
+               'bench-pay-' || g,
+               CASE WHEN g % 4 = 0 THEN 'pending' ELSE 'completed' END,
+               :now - make_interval(mins => g * 3),
+               CASE WHEN g % 4 = 0 THEN NULL ELSE :now - make_interval(mins => g * 3) END
+        FROM generate_series(1, :orders) AS g
+        RETURNING id
+    """), params).scalars().all()
+    order_ids.sort()
+    params["order_ids"] = order_ids
+
+    db.execute(text("""
+        INSERT INTO order_items (order_id, product_id, product_title, product_price, final_price, created_at)
+        SELECT (CAST(:order_ids AS integer[]))[o],
+               (CAST(:product_ids AS integer[]))[1 + (o * 31 + i * 17) % :products],
+               'Bench', 500, 500, :now
+        FROM generate_series(1, :orders) AS o, generate_series(1, :items_per_order) AS i
+    """), params)
+
+    db.execute(text("""
+        INSERT INTO cart_items (user_id, product_id, added_at)
+        SELECT (CAST(:user_ids AS integer[]))[1 + g % :users],
+               (CAST(:product_ids AS integer[]))[1 + (g * 13) % :products], :now
+        FROM generate_series(1, :cart_items) AS g
+        ON CONFLICT DO NOTHING
+    """), params)
+
+    db.execute(text("""
+        INSERT INTO subscriptions (user_id, plan_type, plan_price, started_at, expires_at,
+                                   payment_method, payment_id, payment_status, is_active, is_cancelled)
+        SELECT (CAST(:user_ids AS integer[]))[1 + (g * 11) % :users], 'monthly', 500,
+               :now - make_interval(days => g % 400), :now - make_interval(days => g % 400) + interval '30 days',
+               'crypto', 'bench-sub-' || g, 'completed', g % 400 < 30, false
+        FROM generate_series(1, :subscriptions) AS g
+    """), params)
+
+    db.execute(text("""
+        INSERT INTO wheel_spins (user_id, sector, prize, is_jackpot, is_free, cost, spun_at)
+        SELECT (CAST(:user_ids AS integer[]))[1 + (g * 3) % :users], g % 10, g % 6, false, true, 0,
+               :now - make_interval(mins => g)
+        FROM generate_series(1, :wheel_spins) AS g
+    """), params)
+
+    db.execute(text("""
+        INSERT INTO daily_bonuses (user_id, day_number, bonus_amount, claimed_at)
+        SELECT (CAST(:user_ids AS integer[]))[1 + (g * 5) % :users], 1 + g % 10, 1 + g % 10,
+               :now - make_interval(mins => g * 2)
+        FROM generate_series(1, :daily_bonuses) AS g
+    """), params)
+
+    db.execute(text("""
+        INSERT INTO collections (user_id, name, icon, is_public, created_at, updated_at)
+        SELECT (CAST(:user_ids AS integer[]))[1 + (g * 17) % :users], 'Bench ' || g, '🤍', false, :now, :now
+        FROM generate_series(1, :collections) AS g
+    """), params)
+
+    for table in ("users", "products", "orders", "order_items", "cart_items",
+                  "subscriptions", "wheel_spins", "daily_bonuses", "collections"):
+        db.execute(text(f"ANALYZE {table}"))
+
+    return {
+        "user_id": user_ids[1],
+        "referrer_id": user_ids[0],
+        "creator_id": user_ids[0],
+        "product_id": product_ids[1],
+        "order_ids": order_ids[:20],
+        "payment_id": "bench-pay-2",
+        "subscription_payment_id": "bench-sub-2",
+    }
+
+
+def hot_queries(ids: dict) -> list:
+    """
+    Гарячі запити роутерів: (назва, запит, таблиці без Seq Scan, допустимі індекси)
+    """
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return [
+        ("orders.get_cart",
+         select(CartItem).where(CartItem.user_id == ids["user_id"]),
+         {"cart_items"}, {"uq_cart_items_user_product"}),
+        ("orders.get_orders",
+         select(Order).where(Order.user_id == ids["user_id"]).order_by(Order.created_at.desc()).limit(20),
+         {"orders"}, {"ix_orders_user_id_created_at"}),
+        ("orders.order_items",
+         select(OrderItem).where(OrderItem.order_id.in_(ids["order_ids"])),
+         {"order_items"}, {"ix_order_items_order_id"}),
+        ("products.download_access",
+         select(OrderItem.id).join(Order, Order.id == OrderItem.order_id).where(
+             Order.user_id == ids["user_id"],
+             Order.status == 'completed',
+             OrderItem.product_id == ids["product_id"]
+         ).limit(1),
+         {"orders", "order_items"}, {"ix_orders_user_id_created_at", "ix_order_items_product_id"}),
+        ("orders.payment_webhook",
+         select(Order).where(Order.payment_id == ids["payment_id"]),
+         {"orders"}, {"ix_orders_payment_id"}),
+        ("subscriptions.payment_webhook",
+         select(Subscription).where(Subscription.payment_id == ids["subscription_payment_id"]),
+         {"subscriptions"}, {"ix_subscriptions_payment_id"}),
+        ("subscriptions.active",
+         select(Subscription.id).where(
+             Subscription.user_id == ids["user_id"],
+             Subscription.is_active == True,
+             Subscription.expires_at > now
+         ).limit(1),
+         {"subscriptions"}, {"ix_subscriptions_user_id_expires_at"}),
+        ("bonuses.wheel_status",
+         select(WheelSpin.id).where(WheelSpin.user_id == ids["user_id"], WheelSpin.spun_at >= today),
+         {"wheel_spins"}, {"ix_wheel_spins_user_id_spun_at"}),
+        ("bonuses.daily_status",
+         select(DailyBonus).where(DailyBonus.user_id == ids["user_id"]).order_by(DailyBonus.claimed_at.desc()).limit(1),
+         {"daily_bonuses"}, {"ix_daily_bonuses_user_id_claimed_at"}),
+        ("referrals.list",
+         select(User).where(User.referred_by_id == ids["referrer_id"]).order_by(User.created_at.desc()).limit(20),
+         {"users"}, {"ix_users_referred_by_id_created_at"}),
+        ("creators.products",
+         select(Product.id).where(Product.creator_id == ids["creator_id"]),
+         {"products"}, {"ix_products_creator_id"}),
+        ("products.catalog",
+         select(Product.id).where(Product.is_active == True, Product.is_approved == True)
+         .order_by(Product.created_at.desc()).limit(20),
+         {"products"}, {"ix_products_catalog"}),
+        ("collections.list",
+         select(Collection).where(Collection.user_id == ids["user_id"]),
+         {"collections"}, {"ix_collections_user_id"}),
+    ]
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(db, query) -> dict:
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перевірка індексів гарячих запитів через EXPLAIN")
+    parser.add_argument("--scale", type=float, default=1.0, help="Множник розміру набору даних")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Друкувати плани запитів")
+    args = parser.parse_args()
+
+    sizes = {
+        key: value if key == "items_per_order" else max(1, int(value * args.scale))
+        for key, value in BASE_SIZES.items()
+    }
+    sizes["creators"] = min(sizes["creators"], sizes["users"])
+
+    db = SessionLocal()
+    failed = 0
+    try:
+        started = time.perf_counter()
+        ids = seed(db, sizes)
+        print(f"Засіяно за {time.perf_counter() - started:.1f} s: {sizes}")
+
+        for name, query, tables, expected_indexes in hot_queries(ids):
+            plan = explain(db, query)
+            nodes = list(plan_nodes(plan))
+            seq_scans = {
+                node["Relation Name"] for node in nodes
+                if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in tables
+            }
+            used_indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+
+            ok = not seq_scans and bool(used_indexes & expected_indexes)
+            failed += not ok
+            details = f"Seq Scan: {', '.join(sorted(seq_scans))}" if seq_scans else \
+                f"індекси: {', '.join(sorted(used_indexes)) or '-'}"
+            print(f"{'✅' if ok else '❌'} {name:30} {details}")
+            if args.verbose or not ok:
+                print(json.dumps(plan, indent=2, ensure_ascii=False))
+    finally:
+        db.rollback()
+        db.close()
+
+    if failed:
+        print(f"Без очікуваного індексу: {failed} запитів")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
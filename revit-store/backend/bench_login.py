@@ -0,0 +1,101 @@
+"""
+Бенчмарк одночасних перших входів через /api/auth/telegram
+Імітує сплеск відкриттів mini-app: кожен запит - новий telegram_id
+з підписаним initData, частина - за реферальним посиланням.
+
+    python bench_login.py --url http://localhost:8000 --bot-token <TOKEN> --users 2000 --concurrency 200 --referral-code REF_1_ABCD
+
+Після запуску перевірте в БД, що referral_earnings реферера зросли рівно на
+(кількість успішних входів з кодом) * REFERRAL_REGISTRATION_BONUS.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import time
+from urllib.parse import quote
+
+import httpx
+
+
+def sign_init_data(bot_token: str, telegram_id: int, start_param: str = "") -> str:
+    """
+    initData у форматі Telegram Web App з коректним hash
+    """
+    user = json.dumps({"id": telegram_id, "first_name": f"Bench{telegram_id}", "language_code": "uk"})
+    params = {"auth_date": str(int(time.time())), "user": quote(user)}
+    if start_param:
+        params["start_param"] = start_param
+
+    data_check_string = "\n".join(
+        f"{key}={value if key != 'user' else user}" for key, value in sorted(params.items())
+    )
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    params["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return "&".join(f"{key}={value}" for key, value in params.items())
+
+
+async def run(url: str, bot_token: str, users: int, concurrency: int, referral_code: str, duplicates: int):
+    base_id = random.randint(10 ** 9, 2 * 10 ** 9)
+    # Кожен користувач входить duplicates разів одночасно (подвійний тап / кілька вкладок)
+    payloads = [
+        sign_init_data(bot_token, base_id + i, referral_code if i % 2 == 0 else "")
+        for i in range(users) for _ in range(duplicates)
+    ]
+    random.shuffle(payloads)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        async def login(init_data: str):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/api/auth/telegram", json={"init_data": init_data})
+                except httpx.HTTPError as e:
+                    errors.append(type(e).__name__)
+                    return
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[login(p) for p in payloads])
+        elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print(f"Немає успішних входів, помилки: {errors[:5]}")
+        return
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"logins {len(latencies)}/{len(payloads)}  {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95 {p95 * 1000:7.1f} ms  errors {len(errors)} {errors[:5]}"
+    )
+    print(f"telegram_id: {base_id}..{base_id + users - 1}, з реферальним кодом: {(users + 1) // 2 if referral_code else 0}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк одночасних перших входів")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--bot-token", required=True, help="TELEGRAM_BOT_TOKEN сервера")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=2, help="Скільки одночасних входів на користувача")
+    parser.add_argument("--referral-code", default="", help="Реферальний код існуючого користувача")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.bot_token, args.users, args.concurrency, args.referral_code, args.duplicates))
+
+
+if __name__ == "__main__":
+    main()
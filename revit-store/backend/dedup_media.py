@@ -0,0 +1,131 @@
+"""
+Одноразова міграція /app/media на content-addressed сховище
+Кожен файл архівів та превʼю отримує шлях за SHA-256 вмісту,
+дублікати видаляються, товари перенаправляються на спільну копію,
+а таблиця media_blobs перераховується з товарів.
+
+    python dedup_media.py --dry-run   # лише звіт
+    python dedup_media.py             # виконати міграцію
+
+Порядок безпечний для працюючого сервісу: спочатку створюються нові файли,
+потім оновлюються товари, і лише після commit видаляються старі файли.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete
+
+from app.database import SessionLocal
+from app.models.media import MediaBlob
+from app.models.product import Product
+from app.services.blob_service import blob_service
+from app.services.local_file_service import MEDIA_ROOT, local_file_service
+
+FOLDERS = ("archives", "previews")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def scan():
+    """
+    Знайти файли, які ще не лежать за своїм шляхом вмісту
+
+    Returns:
+        {старий відносний шлях: (новий відносний шлях, sha256, розмір)}
+    """
+    moves = {}
+    for folder_type in FOLDERS:
+        root = os.path.join(MEDIA_ROOT, local_file_service.folders[folder_type])
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                # Недописані завантаження пропускаємо
+                if filename.startswith(".") and filename.endswith(".part"):
+                    continue
+
+                full_path = os.path.join(dirpath, filename)
+                old_path = "/" + os.path.relpath(full_path, "/app").replace("\\", "/")
+                sha256 = file_sha256(full_path)
+                new_path = local_file_service.content_addressed_path(folder_type, sha256, filename)
+                moves[old_path] = (new_path, sha256, os.path.getsize(full_path))
+    return moves
+
+
+def main(dry_run: bool):
+    moves = scan()
+    renamed = {old: new for old, (new, _, _) in moves.items() if old != new}
+
+    total_bytes = sum(size for _, _, size in moves.values())
+    unique = {new: size for new, _, size in moves.values()}
+    reclaimed = total_bytes - sum(unique.values())
+    duplicates = len(moves) - len(unique)
+
+    print(f"Файлів: {len(moves)}, унікальних: {len(unique)}, дублікатів: {duplicates}")
+    print(f"Буде звільнено: {reclaimed / 1024 / 1024:.2f} MB ({reclaimed} bytes)")
+
+    if dry_run:
+        for old, new in sorted(renamed.items()):
+            print(f"  {old} -> {new}")
+        return
+
+    # 1. Нові файли поруч зі старими (жорстке посилання, якщо можливо)
+    for old, new in renamed.items():
+        source, target = local_file_service.full_path(old), local_file_service.full_path(new)
+        if os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    # 2. Товари на нові шляхи та перерахунок лічильників посилань
+    db = SessionLocal()
+    try:
+        refs = Counter()
+        for product in db.query(Product).all():
+            if product.file_url in renamed:
+                product.file_url = renamed[product.file_url]
+            if product.preview_images:
+                product.preview_images = [renamed.get(url, url) for url in product.preview_images]
+            refs.update(blob_service.product_paths(product))
+
+        info = {new: (sha256, size) for new, sha256, size in moves.values()}
+        now = datetime.utcnow()
+        db.execute(delete(MediaBlob))
+        for path, count in refs.items():
+            sha256, size = info.get(path, (None, None))
+            db.add(MediaBlob(
+                path=path, sha256=sha256, size=size, ref_count=count,
+                created_at=now, updated_at=now
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+    # 3. Старі копії більше ніхто не використовує
+    removed = defaultdict(int)
+    for old in renamed:
+        if local_file_service.delete_file(old):
+            removed[old.split("/")[2]] += 1
+
+    print(f"Видалено старих файлів: {dict(removed)}")
+    print(f"Звільнено: {reclaimed / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Дедуплікація /app/media за вмістом")
+    parser.add_argument("--dry-run", action="store_true", help="Лише показати звіт, нічого не змінювати")
+    args = parser.parse_args()
+    main(args.dry_run)
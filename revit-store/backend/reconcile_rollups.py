@@ -0,0 +1,71 @@
+"""
+Звірка щоденних агрегатів продажів (daily_product_sales) з сирими замовленнями.
+Показує розбіжності по днях / товарах / творцях і перераховує дні з розбіжностями
+через rollup_service.rebuild. Розрахований на запуск з cron, наприклад щоночі:
+
+    python reconcile_rollups.py --dry-run                        # лише звіт за останні 35 днів
+    python reconcile_rollups.py                                  # звіт та перерахунок
+    python reconcile_rollups.py --from 2026-01-01 --to 2026-09-30
+
+Код виходу 1, якщо розбіжності знайдено (зручно для моніторингу).
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from app.database import SessionLocal
+from app.services.rollup_service import rollup_service
+
+DEFAULT_WINDOW_DAYS = 35
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Звірка агрегатів продажів із замовленнями")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Перший день (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Останній день включно (YYYY-MM-DD)")
+    parser.add_argument("--dry-run", action="store_true", help="Лише показати розбіжності")
+    args = parser.parse_args()
+
+    date_to = args.date_to or datetime.utcnow().date()
+    date_from = args.date_from or date_to - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    if date_from > date_to:
+        parser.error("--from must be before --to")
+
+    db = SessionLocal()
+    try:
+        drift = rollup_service.product_sales_drift(db, date_from, date_to)
+        if not drift:
+            print(f"✅ {date_from}..{date_to}: агрегати збігаються із замовленнями")
+            return
+
+        by_creator = defaultdict(lambda: [0, 0])
+        for row in drift:
+            print(
+                f"⚠️ {row['day']} product={row['product_id']} creator={row['creator_id']}: "
+                f"sales {row['rollup_sales']} -> {row['raw_sales']}, "
+                f"revenue {row['rollup_revenue']} -> {row['raw_revenue']}"
+            )
+            by_creator[row['creator_id']][0] += row['raw_sales'] - row['rollup_sales']
+            by_creator[row['creator_id']][1] += row['raw_revenue'] - row['rollup_revenue']
+
+        for creator_id, (sales, revenue) in sorted(by_creator.items(), key=lambda item: item[0] or 0):
+            print(f"   creator={creator_id}: sales {sales:+d}, revenue {revenue:+d}")
+
+        days = sorted({row['day'] for row in drift})
+        print(f"Розбіжностей: {len(drift)} рядків у {len(days)} днях")
+
+        if not args.dry_run:
+            for day in days:
+                rollup_service.rebuild(db, day, day)
+                db.commit()
+            print(f"✅ Перераховано днів: {len(days)}")
+    finally:
+        db.close()
+
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
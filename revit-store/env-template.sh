@@ -8,26 +8,75 @@ DB_PORT=5432
 # Для локальної розробки без Docker:
 # DB_HOST=localhost
 
+# Пул з'єднань на кожен uvicorn worker - спільний бюджет для sync та async движків.
+# Максимум з'єднань до Postgres/PgBouncer = workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+DB_POOL_SIZE=10
+DB_MAX_OVERFLOW=20
+# Частка бюджету для async движка (за замовчуванням 3/4), sync (адмінка, автори) отримує решту
+DB_ASYNC_POOL_SIZE=7
+DB_ASYNC_MAX_OVERFLOW=15
+DB_POOL_TIMEOUT=10
+DB_POOL_RECYCLE=1800
+DB_POOL_PRE_PING=true
+
+# true - якщо застосунок підключається через PgBouncer (transaction pooling)
+DB_PGBOUNCER=false
+
 # ====== Redis Settings ======
 REDIS_HOST=redis
 REDIS_PORT=6379
 
+# Як часто (сек) записувати в БД накопичені перегляди / завантаження товарів
+COUNTER_FLUSH_INTERVAL=5
+
+# Як часто (сек) перебудовувати рейтинги (колесо, реферали) з БД
+LEADERBOARD_REBUILD_INTERVAL=3600
+
+# Кеш прав доступу користувача (підписка, куплені товари), сек
+ENTITLEMENT_CACHE_TTL=300
+# Кеш сторінок "Мої завантаження" (сек); зміна прав доступу скидає його одразу
+LIBRARY_CACHE_TTL=300
+
 # ====== JWT Settings ======
 # Згенеруйте секретний ключ командою:
 # python -c "import secrets; print(secrets.token_urlsafe(32))"
 JWT_SECRET=your_super_secret_jwt_key_here
 
+# Кеш ідентичності користувача (сек): Redis та пам'ять процесу
+IDENTITY_CACHE_TTL=60
+IDENTITY_LOCAL_TTL=5
+
 # ====== Telegram Bot Settings ======
 # Отримайте від @BotFather в Telegram
 TELEGRAM_BOT_TOKEN=1234567890:ABCdefGHIjklMNOpqrsTUVwxyz
 TELEGRAM_BOT_USERNAME=OhMyRevitBot
 
+# Розсилки: повідомлень на секунду (ліміт Telegram ~30) та паралельних запитів
+TELEGRAM_BROADCAST_RATE=25
+TELEGRAM_BROADCAST_CONCURRENCY=10
+# Розсилка без збереження прогресу довше N сек вважається перерваною (рестарт / деплой)
+BROADCAST_STALE_AFTER=120
+
+# Адреса Bot API (для тестів можна вказати локальний фейковий сервер)
+# TELEGRAM_API_URL=http://localhost:8081
+
+# ====== Archive Downloads ======
+# nginx - архів віддає nginx через X-Accel-Redirect (докачка, sendfile)
+# python - потокова видача з бекенду (без nginx, наприклад локально)
+ARCHIVE_DELIVERY=nginx
+ARCHIVE_ACCEL_PREFIX=/protected-media/
+
 # ====== AWS S3 Settings ======
 # Для зберігання файлів архівів
 AWS_ACCESS_KEY_ID=your_aws_access_key
 AWS_SECRET_ACCESS_KEY=your_aws_secret_key
 AWS_S3_BUCKET=ohmyrevit-archives
 AWS_REGION=eu-central-1
+# Локальний S3 (MinIO / moto server), порожньо - AWS
+# AWS_S3_ENDPOINT_URL=http://localhost:9000
+# Потокові multipart-завантаження: розмір частини (байт) та паралельність
+S3_MULTIPART_PART_SIZE=8388608
+S3_MULTIPART_CONCURRENCY=4
 
 # ====== Cryptomus Payment Settings ======
 # Реєстрація: https://cryptomus.com/
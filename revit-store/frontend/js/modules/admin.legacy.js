@@ -1495,7 +1495,7 @@ class AdminModule {
         try {
             Utils.showLoader(true);
             const response = await api.post('/admin/broadcast', { message, target });
-            Utils.showNotification(`Розсилку відправлено: ${response.stats.sent}/${response.stats.total}`, 'success');
+            Utils.showNotification(`Розсилку запущено: ${response.stats.total} отримувачів`, 'success');
             document.getElementById('broadcast-message').value = '';
         } catch (error) {
             console.error('Broadcast error:', error);